@@ -0,0 +1,110 @@
+"""
+Benchmark serial vs. process-pool PDF text extraction.
+
+Generates a synthetic multi-hundred-page PDF with pymupdf and times
+src.pdf_extractor.extract_pages for several worker counts, and reading the
+same pages back from the compressed page text cache.
+
+Run from the backend directory:
+
+    python -m benchmarks.extraction_benchmark --pages 400 --workers 1 2 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+import pymupdf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.page_text_cache import PageTextCache  # noqa: E402
+from src.pdf_extractor import extract_pages, shutdown_extraction_pool  # noqa: E402
+
+PARAGRAPH = (
+    "Section {section}. The authority shall publish guidelines on the responsible "
+    "use of automated decision systems, including obligations on transparency, "
+    "record keeping, human oversight and grievance redressal. Entities processing "
+    "personal data shall notify the board within seventy-two hours of a breach. "
+)
+
+
+def make_pdf(path: str, pages: int, paragraphs_per_page: int = 12) -> None:
+    doc = pymupdf.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = "".join(
+            PARAGRAPH.format(section=f"{page_num + 1}.{i + 1}")
+            for i in range(paragraphs_per_page)
+        )
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def time_extraction(path: str, workers: int, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        pages = extract_pages(path, workers=workers, min_pages=1)
+        best = min(best, time.perf_counter() - start)
+    assert pages, "extraction returned no pages"
+    return best
+
+
+def time_cache_read(cache: PageTextCache, file_hash: str, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        pages = cache.read_all(file_hash)
+        best = min(best, time.perf_counter() - start)
+    assert pages, "text cache returned no pages"
+    return best
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pdf")
+        make_pdf(path, args.pages)
+        print(f"Synthetic PDF: {args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        # Warm up the pool so process start-up is not counted.
+        extract_pages(path, workers=max(args.workers), min_pages=1)
+
+        baseline = None
+        for workers in args.workers:
+            elapsed = time_extraction(path, workers, args.repeats)
+            baseline = baseline or elapsed
+            print(
+                f"workers={workers:<3} {elapsed:7.3f}s "
+                f"{args.pages / elapsed:8.1f} pages/s  speedup {baseline / elapsed:.2f}x"
+            )
+
+        pages = extract_pages(path, workers=1)
+        cache = PageTextCache(os.path.join(tmp, "text"))
+        cache.write("synthetic", pages)
+        raw_size = sum(len(text.encode("utf-8")) for text in pages)
+        elapsed = time_cache_read(cache, "synthetic", args.repeats)
+        print(
+            f"text cache  {elapsed:7.3f}s {args.pages / elapsed:8.1f} pages/s  "
+            f"speedup {baseline / elapsed:.2f}x  "
+            f"({os.path.getsize(cache.path('synthetic')) / 1e3:.0f} kB for "
+            f"{raw_size / 1e3:.0f} kB of text)"
+        )
+        shutdown_extraction_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,3 +23,117 @@ CREATE TABLE IF NOT EXISTS overall_summaries (
 
 -- Indices for OverallSummary
 CREATE UNIQUE INDEX IF NOT EXISTS ix_overall_summaries_pdf_set_hash ON overall_summaries (pdf_set_hash);
+
+-- Table for ChatHistoryMessage (append-only chat history)
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id BIGSERIAL PRIMARY KEY,
+    session_id VARCHAR NOT NULL,
+    role VARCHAR NOT NULL,
+    content TEXT NOT NULL,
+    chunk_ids TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Indices for ChatHistoryMessage
+CREATE INDEX IF NOT EXISTS ix_chat_messages_session_id_id ON chat_messages (session_id, id);
+
+-- Table for ChatSessionSummary (rolling summary of older chat turns)
+CREATE TABLE IF NOT EXISTS chat_session_summaries (
+    session_id VARCHAR PRIMARY KEY,
+    summary TEXT NOT NULL,
+    last_message_id BIGINT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Table for IngestionJob (queue of PDF ingestion work, claimed by workers)
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    file_name VARCHAR NOT NULL,
+    kind VARCHAR NOT NULL DEFAULT 'process',
+    staged_path VARCHAR,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    progress TEXT,
+    error TEXT,
+    worker_id VARCHAR,
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    available_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Indices for IngestionJob
+CREATE INDEX IF NOT EXISTS ix_ingestion_jobs_status_available_at ON ingestion_jobs (status, available_at, id);
+-- At most one queued or running job per file
+CREATE UNIQUE INDEX IF NOT EXISTS ux_ingestion_jobs_active_file_name ON ingestion_jobs (file_name) WHERE status IN ('queued', 'running');
+
+-- Table for IngestionJobEvent (status messages of a job, streamed by the API)
+CREATE TABLE IF NOT EXISTS ingestion_job_events (
+    id BIGSERIAL PRIMARY KEY,
+    job_id BIGINT NOT NULL REFERENCES ingestion_jobs (id) ON DELETE CASCADE,
+    message TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Indices for IngestionJobEvent
+CREATE INDEX IF NOT EXISTS ix_ingestion_job_events_job_id_id ON ingestion_job_events (job_id, id);
+
+-- Table for IngestedDocument (manifest of what is indexed for each PDF)
+CREATE TABLE IF NOT EXISTS ingested_documents (
+    file_name VARCHAR PRIMARY KEY,
+    file_hash VARCHAR,
+    page_count INTEGER,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    embedding_model VARCHAR,
+    index_version INTEGER,
+    embedding_status VARCHAR NOT NULL DEFAULT 'pending',
+    summary_status VARCHAR NOT NULL DEFAULT 'pending',
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    indexed_at TIMESTAMP WITH TIME ZONE,
+    summarized_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Indices for IngestedDocument
+CREATE INDEX IF NOT EXISTS ix_ingested_documents_file_hash ON ingested_documents (file_hash);
+CREATE INDEX IF NOT EXISTS ix_ingested_documents_updated_at ON ingested_documents (updated_at);
+
+-- Table for ChunkText (chunk texts by Qdrant point id, kept out of the point payloads)
+CREATE TABLE IF NOT EXISTS chunk_texts (
+    point_id VARCHAR PRIMARY KEY,
+    source VARCHAR NOT NULL,
+    text TEXT NOT NULL,
+    token_count INTEGER,
+    minhash BYTEA
+);
+
+-- Indices for ChunkText
+CREATE INDEX IF NOT EXISTS ix_chunk_texts_source ON chunk_texts (source);
+
+-- Table for ChunkBand (LSH buckets of chunk MinHash signatures)
+CREATE TABLE IF NOT EXISTS chunk_lsh_bands (
+    band SMALLINT NOT NULL,
+    bucket BIGINT NOT NULL,
+    point_id VARCHAR NOT NULL REFERENCES chunk_texts (point_id) ON DELETE CASCADE,
+    PRIMARY KEY (band, bucket, point_id)
+);
+
+-- Indices for ChunkBand
+CREATE INDEX IF NOT EXISTS ix_chunk_lsh_bands_point_id ON chunk_lsh_bands (point_id);
+
+-- Table for ChunkRef (chunks of other documents served by a shared point)
+CREATE TABLE IF NOT EXISTS chunk_refs (
+    point_id VARCHAR NOT NULL REFERENCES chunk_texts (point_id) ON DELETE CASCADE,
+    source VARCHAR NOT NULL,
+    file_hash VARCHAR,
+    page_number INTEGER,
+    page_start INTEGER,
+    page_end INTEGER,
+    PRIMARY KEY (point_id, source)
+);
+
+-- Indices for ChunkRef
+CREATE INDEX IF NOT EXISTS ix_chunk_refs_source ON chunk_refs (source);
@@ -0,0 +1,323 @@
+"""
+Offline bulk indexer: index a whole directory of PDFs without the API.
+
+    python -m src.bulk_index /path/to/pdfs --concurrency 4
+
+PDFs outside DATA_DIR are copied into it first, so they show up in the app
+like uploaded files. Files whose content is already fully indexed under the
+same name are skipped, files identical to another indexed file reuse its
+vectors, and an interrupted run resumes from the ingestion checkpoints when
+it is started again.
+
+Documents are indexed concurrently, each through its own streaming
+ingestion pipeline, sharing one loaded embedding model, one Qdrant client
+and the text extraction process pool.
+
+Indexed documents are recorded in the ingested_documents manifest.
+`--qdrant-location :memory:` together with `--no-db` runs the whole thing
+without any external service.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from qdrant_client import AsyncQdrantClient
+
+from src.config import cfg
+from src.logger import logger
+from src.pdf_extractor import shutdown_extraction_pool
+from src.rag import PDFProcessor
+from src.rag.chunk_store import chunk_text_store
+from src.rag.content_ids import record_file_hash, sha256_file
+from src.rag.ingestion_checkpoint import IngestionCheckpoint
+from src.schema.db import AsyncSessionLocal
+from src.schema.ingested_documents import DOC_INDEXED, SUMMARY_DONE
+from src.schema.ingested_documents_crud import get_document
+from src.util import free_embedding_model, load_embedding_model
+
+
+@dataclass
+class DocumentResult:
+    file_name: str
+    # indexed | copied | skipped | failed
+    status: str
+    pages: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    # Boilerplate lines and near-duplicate chunks left out of the index
+    removed_lines: int = 0
+    removed_chunks: int = 0
+    removed_bytes: int = 0
+    error: Optional[str] = None
+
+
+class StubLLMInterface:
+    """Stands in for LLM_Interface when no LLM should be called."""
+
+    SUMMARY = "Summary not generated (bulk indexed without an LLM)."
+
+    def __init__(self) -> None:
+        from langchain_core.language_models.fake import FakeListLLM
+
+        self.llm = FakeListLLM(responses=[self.SUMMARY])
+
+
+class BulkIndexer:
+    def __init__(
+        self,
+        concurrency: int = cfg.BULK_INDEX_CONCURRENCY,
+        qdrant_client: Optional[AsyncQdrantClient] = None,
+        interface: Optional[Any] = None,
+        summarize: bool = True,
+        use_db: bool = True,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.qdrant_client = qdrant_client
+        self.interface = interface
+        # Summaries are stored in Postgres, so they need the database too.
+        self.use_db = use_db
+        self.summarize = summarize and use_db
+        self._embedder: Optional[Tuple[Any, str]] = None
+        self._embedder_lock = asyncio.Lock()
+        # Files with the same content are indexed one after the other, so the
+        # later ones copy the vectors of the first instead of re-embedding.
+        self._content_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    @staticmethod
+    def scan(directory: str) -> List[Path]:
+        return sorted(
+            path
+            for path in Path(directory).rglob("*")
+            if path.is_file() and path.suffix.lower() == ".pdf"
+        )
+
+    @staticmethod
+    def _import(path: Path) -> Tuple[Optional[str], str]:
+        """
+        Make `path` available in DATA_DIR and record its hash. Returns the file
+        name to index (None on a name clash with different content) and the hash.
+        """
+        file_hash = sha256_file(str(path))
+        target = Path(cfg.DATA_DIR) / path.name
+        if target.resolve() != path.resolve():
+            if target.exists():
+                if sha256_file(str(target)) != file_hash:
+                    return None, file_hash
+            else:
+                os.makedirs(cfg.DATA_DIR, exist_ok=True)
+                tmp_path = target.with_name(f".{uuid.uuid4().hex}.tmp")
+                shutil.copy2(path, tmp_path)
+                os.replace(tmp_path, target)
+        record_file_hash(path.name, file_hash)
+        return path.name, file_hash
+
+    async def _is_indexed(self, processor: PDFProcessor, file_name: str, file_hash: str) -> bool:
+        if await asyncio.to_thread(IngestionCheckpoint(file_name).exists):
+            return False
+        if not self.use_db:
+            return await processor.has_content_indexed(file_name, file_hash)
+        async with AsyncSessionLocal() as db:
+            document = await get_document(db, file_name)
+        return (
+            document is not None
+            and document.file_hash == file_hash
+            and document.embedding_status == DOC_INDEXED
+            and (not self.summarize or document.summary_status == SUMMARY_DONE)
+        )
+
+    async def _get_embedder(self) -> Tuple[Any, str]:
+        async with self._embedder_lock:
+            if self._embedder is None:
+                self._embedder = await asyncio.to_thread(load_embedding_model)
+            return self._embedder
+
+    async def _index(self, path: Path) -> DocumentResult:
+        started = time.perf_counter()
+        try:
+            file_name, file_hash = await asyncio.to_thread(self._import, path)
+        except Exception as e:
+            return DocumentResult(path.name, "failed", error=f"Could not import: {e}")
+        if file_name is None:
+            return DocumentResult(
+                path.name, "failed", error="A different file with this name already exists."
+            )
+
+        async with self._content_locks[file_hash]:
+            return await self._process(file_name, file_hash, started)
+
+    async def _process(self, file_name: str, file_hash: str, started: float) -> DocumentResult:
+        # Without the database, chunk texts stay in the Qdrant payloads.
+        processor = PDFProcessor(
+            interface=self.interface,
+            qdrant_client=self.qdrant_client,
+            chunk_store=chunk_text_store if self.use_db else None,
+        )
+        if await self._is_indexed(processor, file_name, file_hash):
+            return DocumentResult(file_name, "skipped")
+
+        processor.embedder = await self._get_embedder()
+        error = None
+        if self.use_db:
+            async with AsyncSessionLocal() as db:
+                async for update in processor.process_pdf(
+                    file_name, db=db, summarize=self.summarize
+                ):
+                    error = error or (update if update.startswith("Error:") else None)
+        else:
+            async for update in processor.process_pdf(file_name, summarize=False):
+                error = error or (update if update.startswith("Error:") else None)
+
+        result = processor.last_result
+        removed = result.get("removed", {})
+        return DocumentResult(
+            file_name,
+            "failed" if error else ("copied" if result.get("duplicate_of") else "indexed"),
+            pages=result.get("pages", 0),
+            chunks=result.get("chunks", 0),
+            seconds=time.perf_counter() - started,
+            removed_lines=removed.get("boilerplate_lines", 0),
+            removed_chunks=removed.get("duplicate_chunks", 0),
+            removed_bytes=removed.get("boilerplate_bytes", 0) + removed.get("duplicate_bytes", 0),
+            error=error,
+        )
+
+    async def run(self, directory: str) -> List[DocumentResult]:
+        paths = await asyncio.to_thread(self.scan, directory)
+        print(f"Found {len(paths)} PDFs in {directory} (concurrency {self.concurrency})")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results: List[DocumentResult] = []
+        started = time.perf_counter()
+
+        async def index_one(path: Path) -> None:
+            async with semaphore:
+                result = await self._index(path)
+            results.append(result)
+            line = f"[{len(results)}/{len(paths)}] {result.status:<8} {result.file_name}"
+            if result.pages or result.chunks:
+                rate = result.pages / result.seconds if result.seconds else 0.0
+                line += (
+                    f": {result.pages} pages, {result.chunks} chunks "
+                    f"in {result.seconds:.1f}s ({rate:.1f} pages/s)"
+                )
+            if result.error:
+                line += f" - {result.error}"
+            print(line, flush=True)
+
+        try:
+            await asyncio.gather(*(index_one(path) for path in paths))
+        finally:
+            if self._embedder is not None:
+                free_embedding_model(*self._embedder)
+            elapsed = time.perf_counter() - started
+            self.print_summary(results, elapsed)
+        return results
+
+    @staticmethod
+    def print_summary(results: List[DocumentResult], elapsed: float) -> None:
+        counts = {
+            status: sum(1 for result in results if result.status == status)
+            for status in ("indexed", "copied", "skipped", "failed")
+        }
+        pages = sum(result.pages for result in results)
+        chunks = sum(result.chunks for result in results)
+        print(
+            f"\n{counts['indexed']} indexed, {counts['copied']} copied from duplicates, "
+            f"{counts['skipped']} already indexed, {counts['failed']} failed "
+            f"in {elapsed:.1f}s"
+        )
+        if elapsed > 0:
+            print(
+                f"Throughput: {pages / elapsed:.1f} pages/s, {chunks / elapsed:.1f} chunks/s "
+                f"({pages} pages, {chunks} chunks)"
+            )
+        removed_bytes = sum(result.removed_bytes for result in results)
+        if removed_bytes:
+            print(
+                f"Removed {sum(result.removed_lines for result in results)} boilerplate lines and "
+                f"{sum(result.removed_chunks for result in results)} near-duplicate chunks "
+                f"({removed_bytes / 1024:.1f} KiB of text)"
+            )
+
+
+def _qdrant_client(location: Optional[str]) -> AsyncQdrantClient:
+    if not location:
+        return AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
+    if location == ":memory:":
+        return AsyncQdrantClient(location=":memory:")
+    return AsyncQdrantClient(url=location)
+
+
+async def bulk_index(args: argparse.Namespace) -> int:
+    client = _qdrant_client(args.qdrant_location)
+    # A placeholder summary would be stored as done and never replaced.
+    summarize = not (args.no_summaries or args.no_db or args.stub_llm)
+    interface = StubLLMInterface() if not summarize else None
+    indexer = BulkIndexer(
+        concurrency=args.concurrency,
+        qdrant_client=client,
+        interface=interface,
+        summarize=summarize,
+        use_db=not args.no_db,
+    )
+    try:
+        results = await indexer.run(args.directory)
+    finally:
+        await client.close()
+        shutdown_extraction_pool()
+    return 1 if any(result.status == "failed" for result in results) else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Index a directory of PDFs.")
+    parser.add_argument("directory", help="Directory to scan (recursively) for PDFs")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=cfg.BULK_INDEX_CONCURRENCY,
+        help="Documents indexed at the same time",
+    )
+    parser.add_argument(
+        "--qdrant-location",
+        default=None,
+        help='Qdrant URL, or ":memory:" for an in-memory instance (default: configured host)',
+    )
+    parser.add_argument(
+        "--no-summaries",
+        action="store_true",
+        help="Only create embeddings; do not generate or store summaries",
+    )
+    parser.add_argument(
+        "--no-db",
+        action="store_true",
+        help="Do not use Postgres: no summaries and no manifest entries (implies --no-summaries)",
+    )
+    parser.add_argument(
+        "--stub-llm",
+        action="store_true",
+        help=(
+            "Do not call an LLM (implies --no-summaries); summaries stay pending "
+            "and are generated by a later run without it"
+        ),
+    )
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.directory):
+        parser.error(f"Not a directory: {args.directory}")
+    try:
+        return asyncio.run(bulk_index(args))
+    except KeyboardInterrupt:
+        logger.warning("Bulk indexing interrupted")
+        print("\nInterrupted. Run the same command again to resume.")
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
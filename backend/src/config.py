@@ -13,6 +13,29 @@ class Config:
 
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     DATA_DIR = os.path.join(BASE_DIR, "data")
+    # Ingestion checkpoints and other per-document index state
+    INDEX_STATE_DIR = os.path.join(DATA_DIR, ".index")
+    # Uploads are staged here before they replace a file in DATA_DIR
+    UPLOAD_TMP_DIR = os.path.join(DATA_DIR, ".tmp")
+    # Uploads are streamed to disk in chunks of this size; larger files are
+    # rejected with 413 (keep in line with client_max_body_size in nginx.conf).
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 200 * 1024 * 1024))
+    # /api/pdf/list page size (default and maximum `limit`)
+    PDF_LIST_PAGE_SIZE = int(os.getenv("PDF_LIST_PAGE_SIZE", 500))
+    PDF_LIST_MAX_PAGE_SIZE = 2000
+    # Single-page rendering for citation previews (/api/pdf/page). Rendered
+    # images are kept in an on-disk LRU cache bounded by PAGE_CACHE_MAX_BYTES.
+    PAGE_RENDER_DEFAULT_DPI = 110
+    PAGE_RENDER_MIN_DPI = 36
+    PAGE_RENDER_MAX_DPI = 300
+    PAGE_RENDER_JPEG_QUALITY = 80
+    PAGE_CACHE_DIR = os.path.join(DATA_DIR, ".cache", "pages")
+    PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+    # Extracted page texts, written once at ingestion (zstd, one file per
+    # content hash) and read by summaries, re-indexing and the page endpoint.
+    TEXT_CACHE_DIR = os.path.join(DATA_DIR, ".cache", "text")
+    TEXT_CACHE_ZSTD_LEVEL = 6
 
     # Do not create a global synchronous DB session in async app.
     # Routes and services should use the async dependency `get_db` from src.schema.db.
@@ -23,6 +46,16 @@ class Config:
     IN_DOCKER = os.getenv("IN_DOCKER", "0") == "1"
     QDRANT_HOST = os.getenv("QDRANT_HOST", "qdrant" if IN_DOCKER else "localhost")
     QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+    # Batched upserts: batch size, batches in flight, retries with exponential
+    # backoff, and how long to wait for the final read-back barrier.
+    QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", 128))
+    QDRANT_UPSERT_CONCURRENCY = int(os.getenv("QDRANT_UPSERT_CONCURRENCY", 4))
+    QDRANT_UPSERT_RETRIES = 4
+    QDRANT_RETRY_BACKOFF_SECONDS = 0.5
+    QDRANT_BARRIER_TIMEOUT_SECONDS = 30.0
+    # Chunk texts live in Postgres (chunk_texts), not in the Qdrant payloads;
+    # rows per insert statement.
+    CHUNK_TEXT_WRITE_BATCH_SIZE = 1000
 
     # Database config
     DB_HOST = os.getenv("POSTGRES_HOST", "postgres")
@@ -39,11 +72,149 @@ class Config:
     ENCODE_KWARGS = {"normalize_embeddings": True}
     BREAKPOINT_THRESHOLD_TYPE = "standard_deviation"
     BREAKPOINT_THRESHOLD_AMOUNT = 1.0
+    # Sentences embedded with this many neighbours on each side when chunking
+    CHUNK_SENTENCE_BUFFER = 1
+    # "mean": chunk vector is the normalised mean of its sentence vectors;
+    # "embed": chunk text is embedded once after chunking.
+    CHUNK_VECTOR_MODE = os.getenv("CHUNK_VECTOR_MODE", "mean")
+    # Version of the chunk and point layout written to Qdrant, recorded in the
+    # ingested_documents manifest; bump it when that layout changes so
+    # documents indexed with the old one can be found and re-indexed.
+    INDEX_VERSION = 1
+    # Ingestion embedding batches: texts are length-sorted and grouped so that
+    # longest-text-tokens x batch-size stays under the budget.
+    EMBED_BATCH_TOKEN_BUDGET = int(os.getenv("EMBED_BATCH_TOKEN_BUDGET", 16384))
+    EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", 32))
+    # Streaming ingestion: pages per extraction batch and the capacity of each
+    # bounded queue between the extract/chunk/embed/store stages.
+    INGEST_PAGE_BATCH_SIZE = int(os.getenv("INGEST_PAGE_BATCH_SIZE", 16))
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 4))
+    # Generate the document summary while chunks are embedded and stored,
+    # starting as soon as all pages are extracted. Turn off when the LLM and
+    # the embedding model compete for the same GPU.
+    INGEST_CONCURRENT_SUMMARY = os.getenv("INGEST_CONCURRENT_SUMMARY", "1") == "1"
+    # Incremental re-index of a replaced PDF regenerates the document summary
+    # only when at least this fraction of its pages had to be re-chunked.
+    REINDEX_RESUMMARIZE_FRACTION = 0.2
+    # Parallel text extraction: PDFs with at least EXTRACT_PARALLEL_MIN_PAGES
+    # pages are split into page ranges across EXTRACT_WORKERS processes.
+    EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+    EXTRACT_PARALLEL_MIN_PAGES = int(os.getenv("EXTRACT_PARALLEL_MIN_PAGES", 64))
+    # Ingestion job queue (ingestion_jobs table) worked by `python -m src.worker`.
+    # Each worker runs up to WORKER_CONCURRENCY jobs and heartbeats them; a
+    # running job without a heartbeat for WORKER_STALE_AFTER_SECONDS is
+    # requeued, up to INGEST_JOB_MAX_ATTEMPTS attempts in total.
+    WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 2))
+    WORKER_POLL_INTERVAL_SECONDS = float(os.getenv("WORKER_POLL_INTERVAL_SECONDS", 2.0))
+    WORKER_HEARTBEAT_SECONDS = 10.0
+    WORKER_STALE_AFTER_SECONDS = 60.0
+    INGEST_JOB_MAX_ATTEMPTS = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", 3))
+    INGEST_JOB_RETRY_DELAY_SECONDS = 30.0
+    # How often the API polls a job's status for its event stream
+    JOB_STATUS_POLL_SECONDS = 0.5
+    # Documents indexed concurrently by `python -m src.bulk_index`
+    BULK_INDEX_CONCURRENCY = int(os.getenv("BULK_INDEX_CONCURRENCY", 2))
+    # Recent turns (question and answer) kept verbatim in the chat history;
+    # older ones are folded into the rolling summary below.
     MAX_HISTORY_MESSAGES = 3
+    # In-memory chat session cache in front of the chat_messages table
+    SESSION_CACHE_TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL_SECONDS", 1800))
+    SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    SESSION_CACHE_MAX_MESSAGES = 50
+    # Rolling history compaction: once the messages older than the recent
+    # turns exceed the token threshold, they are folded into a running summary.
+    # Until then they are sent to the LLM verbatim, so nothing is left out.
+    HISTORY_SUMMARY_TRIGGER_TOKENS = int(os.getenv("HISTORY_SUMMARY_TRIGGER_TOKENS", 1500))
+    HISTORY_SUMMARY_MAX_WORDS = 200
+    # Attempts at generating the summary before compaction gives up for a turn
+    HISTORY_SUMMARY_ATTEMPTS = int(os.getenv("HISTORY_SUMMARY_ATTEMPTS", 3))
+    # Hard cap on the history tokens in a prompt, for when compaction falls
+    # behind: the summary and as many of the latest turns as fit are sent.
+    HISTORY_PROMPT_MAX_TOKENS = int(os.getenv("HISTORY_PROMPT_MAX_TOKENS", 4000))
     MODEL_NAME: str = "gemma3n:e4b"
     TEMPERATURE = 0.1
     MAX_CONTEXT_TOKENS = 32000
 
+    # Context packing: prompt token budget for retrieved chunks and
+    # near-duplicate detection (MinHash over word shingles).
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000))
+    DEDUP_SIMILARITY_THRESHOLD = 0.8
+    # Signatures are persisted at ingestion (chunk_texts.minhash); changing
+    # these needs a re-index before near-duplicates are found again.
+    MINHASH_PERMUTATIONS = 64
+    SHINGLE_SIZE = 5
+    # LSH over the signatures: 8 bands of 8 rows find pairs above ~0.77
+    # similarity as candidates.
+    LSH_BANDS = 8
+
+    # Ingestion clean-up. Header/footer lines (the first and last few lines
+    # of a page) repeated on at least this fraction of a sample of the pages
+    # are stripped before chunking. A chunk whose MinHash similarity to an
+    # indexed chunk is above the threshold is not stored again: another
+    # document's chunk gets a reference to this one.
+    BOILERPLATE_ENABLED = os.getenv("BOILERPLATE_ENABLED", "1") == "1"
+    BOILERPLATE_SAMPLE_PAGES = 40
+    BOILERPLATE_EDGE_LINES = 3
+    BOILERPLATE_MIN_PAGE_FRACTION = 0.5
+    BOILERPLATE_MIN_PAGES = 3
+    INGEST_DEDUP_ENABLED = os.getenv("INGEST_DEDUP_ENABLED", "1") == "1"
+    INGEST_DEDUP_THRESHOLD = 0.9
+
+    # Optional query-focused extractive compression of reranked chunks
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "0") == "1"
+    COMPRESSION_TOP_SENTENCES = 3
+    COMPRESSION_NEIGHBOURS = 1
+    # Chunks with at most this many sentences are passed through unchanged
+    COMPRESSION_MIN_SENTENCES = 5
+
+    # Hedged generation: if the selected model has not produced its first token
+    # within the deadline, race the same prompt on a fast fallback model.
+    HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "1") == "1"
+    HEDGE_FALLBACK_MODEL = os.getenv("HEDGE_FALLBACK_MODEL", "gemma3n:e4b")
+    HEDGE_FIRST_TOKEN_TIMEOUT = float(os.getenv("HEDGE_FIRST_TOKEN_TIMEOUT", 8.0))
+
+    # Query complexity routing (only applied when the request does not pin a model).
+    # Simple queries go to ROUTER_SIMPLE_MODEL, harder ones to ROUTER_COMPLEX_MODEL.
+    ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") == "1"
+    ROUTER_SIMPLE_MODEL = os.getenv("ROUTER_SIMPLE_MODEL", "gemma3n:e4b")
+    ROUTER_COMPLEX_MODEL = os.getenv("ROUTER_COMPLEX_MODEL", "gemma3:27b-it-qat")
+    ROUTER_COMPLEXITY_THRESHOLD = 0.5
+    ROUTER_LONG_QUERY_WORDS = 30
+    ROUTER_MANY_PDFS = 4
+    ROUTER_EMBEDDING_SCALE = 20.0
+    ROUTER_SIGNAL_WEIGHTS = {
+        "length": 0.2,
+        "pdfs": 0.3,
+        "rerank_spread": 0.2,
+        "embedding": 0.3,
+    }
+    # Labelled exemplars for the nearest-centroid classifier over query embeddings
+    ROUTER_SIMPLE_EXAMPLES = [
+        "What is the deadline for filing the annual return?",
+        "Who is the nodal agency for this scheme?",
+        "When did the policy come into force?",
+        "What is the penalty for non-compliance?",
+        "Define a high-risk AI system.",
+        "How much funding is allocated to the programme?",
+    ]
+    ROUTER_COMPLEX_EXAMPLES = [
+        "Compare the data protection obligations across these policies and explain where they conflict.",
+        "How do the enforcement mechanisms in the two acts differ, and which is stricter?",
+        "Summarise the key differences between the draft and the final version of the policy.",
+        "What are the implications of these regulations for startups versus large enterprises?",
+        "Analyse how the policy balances innovation against consumer protection.",
+        "Trace how the definition of personal data has evolved across these documents.",
+    ]
+
+    # Session-scoped candidate cache: follow-ups close to the previous query
+    # (cosine >= CANDIDATE_CACHE_SIMILARITY) are reranked against the previous
+    # turn's candidates plus a small fresh search.
+    CANDIDATE_CACHE_TTL_SECONDS = int(os.getenv("CANDIDATE_CACHE_TTL_SECONDS", 300))
+    CANDIDATE_CACHE_SIMILARITY = float(os.getenv("CANDIDATE_CACHE_SIMILARITY", 0.75))
+    CANDIDATE_CACHE_FRESH_K = 5
+    CANDIDATE_CACHE_MAX_CANDIDATES = 30
+    CANDIDATE_CACHE_MAX_SESSIONS = 1000
+
     RERANKING_MODEL_NAME = "BAAI/bge-reranker-base"
     TOP_K = 10
     TOP_P = 0.9
@@ -79,6 +250,7 @@ class Config:
     GENERATED_EXAMPLE_DOCUMENT_PROMPT = prompts.GENERATED_EXAMPLE_DOCUMENT_PROMPT
     APPLICATION_INSTRUCTIONS = prompts.APPLICATION_INSTRUCTIONS
     SUGGESTED_QUERIES_PROMPT = prompts.SUGGESTED_QUERIES_PROMPT
+    HISTORY_SUMMARY_PROMPT = prompts.HISTORY_SUMMARY_PROMPT
 
     # Admin config for testing models
     SUPPORTED_MODELS = [
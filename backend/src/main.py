@@ -1,10 +1,20 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from src.pdf_extractor import shutdown_extraction_pool
 from src.routers.chat import router as chat_router
 from src.routers.pdf import router as pdf_router
 
-app = FastAPI(title="PolicyBot Backend", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shutdown_extraction_pool()
+
+
+app = FastAPI(title="PolicyBot Backend", version="1.0.0", lifespan=lifespan)
 
 
 app.add_middleware(
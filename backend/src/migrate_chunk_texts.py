@@ -0,0 +1,198 @@
+"""
+Move chunk texts of an existing collection out of the Qdrant payloads into
+the chunk_texts table, and measure Qdrant's memory before and after.
+
+    python -m src.migrate_chunk_texts [--dry-run] [--settle-seconds N]
+
+Points that still carry a "text" payload are scrolled in batches; each
+batch is written to the chunk store first and its payload key is removed
+afterwards, so retrieval keeps working throughout and an interrupted run
+can simply be started again. The texts are stored with their MinHash
+signatures, so that documents ingested later are deduplicated against them.
+
+Memory is read from Qdrant's Prometheus endpoint (/metrics). Qdrant frees
+payload storage as its segments are optimised, so the second reading waits
+`--settle-seconds` after the last change; run the tool again later (it then
+has nothing to move) to take another reading.
+"""
+
+import argparse
+import asyncio
+import sys
+import urllib.request
+from typing import Dict, List, Optional
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import (Filter, IsEmptyCondition,
+                                       PayloadField)
+
+from src.config import cfg
+from src.logger import logger
+from src.rag.chunk_store import ChunkTextStore, chunk_text_store
+from src.rag.minhash import MinHasher
+
+# Qdrant metrics reported before and after the migration
+_MEMORY_METRICS = (
+    "memory_resident_bytes",
+    "memory_allocated_bytes",
+    "memory_active_bytes",
+    "process_resident_memory_bytes",
+)
+
+
+def _metrics_url() -> str:
+    return f"http://{cfg.QDRANT_HOST}:{cfg.QDRANT_PORT}/metrics"
+
+
+def read_memory_metrics(url: str) -> Dict[str, float]:
+    """Memory gauges from a Qdrant /metrics page; missing ones are left out."""
+    with urllib.request.urlopen(url, timeout=10) as response:
+        body = response.read().decode("utf-8")
+    metrics: Dict[str, float] = {}
+    for line in body.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        if name in _MEMORY_METRICS:
+            metrics[name] = float(value)
+    return metrics
+
+
+def _megabytes(value: float) -> str:
+    return f"{value / (1024 * 1024):.1f} MB"
+
+
+def _report_memory(before: Dict[str, float], after: Dict[str, float]) -> None:
+    if not before and not after:
+        print("Qdrant reported no memory metrics.")
+        return
+    print("\nQdrant memory (before -> after):")
+    for name in _MEMORY_METRICS:
+        if name not in before and name not in after:
+            continue
+        old, new = before.get(name), after.get(name)
+        if old is None or new is None:
+            print(f"  {name}: {_megabytes(old or new)} ({'before' if new is None else 'after'} only)")
+            continue
+        change = 100.0 * (new - old) / old if old else 0.0
+        print(f"  {name}: {_megabytes(old)} -> {_megabytes(new)} ({change:+.1f}%)")
+
+
+async def migrate(
+    client: AsyncQdrantClient,
+    store: ChunkTextStore,
+    dry_run: bool = False,
+    batch_size: int = cfg.QDRANT_UPSERT_BATCH_SIZE,
+) -> Dict[str, int]:
+    """Move the texts of all points that still carry one; returns counts."""
+    counts = {"points": 0, "text_bytes": 0}
+    if not await client.collection_exists(cfg.COLLECTION_NAME):
+        return counts
+    has_text = Filter(
+        must_not=[IsEmptyCondition(is_empty=PayloadField(key="text"))]
+    )
+    hasher = MinHasher()
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            collection_name=cfg.COLLECTION_NAME,
+            scroll_filter=has_text,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["text", "source", "token_count"],
+            with_vectors=False,
+        )
+        rows = [
+            {
+                "point_id": str(point.id),
+                "source": point.payload.get("source") or "",
+                "text": point.payload["text"],
+                "token_count": point.payload.get("token_count"),
+                "minhash": MinHasher.to_bytes(hasher.signature(point.payload["text"])),
+            }
+            for point in points
+            if isinstance((point.payload or {}).get("text"), str)
+        ]
+        counts["points"] += len(rows)
+        counts["text_bytes"] += sum(len(row["text"].encode("utf-8")) for row in rows)
+        if rows and not dry_run:
+            await store.put(rows)
+            await client.delete_payload(
+                collection_name=cfg.COLLECTION_NAME,
+                keys=["text"],
+                points=[point.id for point in points],
+            )
+            logger.debug(f"Moved the texts of {len(rows)} points to the chunk store")
+        if offset is None:
+            return counts
+
+
+async def run(args: argparse.Namespace) -> int:
+    url = args.metrics_url or _metrics_url()
+    try:
+        before = await asyncio.to_thread(read_memory_metrics, url)
+    except Exception as e:
+        logger.warning(f"Could not read Qdrant metrics from {url}: {e}")
+        before = {}
+
+    client = AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
+    try:
+        counts = await migrate(
+            client, chunk_text_store, dry_run=args.dry_run, batch_size=args.batch_size
+        )
+    finally:
+        await client.close()
+
+    action = "would be moved" if args.dry_run else "moved"
+    print(
+        f"{counts['points']} chunk texts {action} to the chunk store "
+        f"({_megabytes(counts['text_bytes'])} of text)"
+    )
+    if args.dry_run:
+        return 0
+
+    if counts["points"] and args.settle_seconds > 0:
+        print(f"Waiting {args.settle_seconds}s for Qdrant to optimise its segments...")
+        await asyncio.sleep(args.settle_seconds)
+    try:
+        after = await asyncio.to_thread(read_memory_metrics, url)
+    except Exception as e:
+        logger.warning(f"Could not read Qdrant metrics from {url}: {e}")
+        after = {}
+    _report_memory(before, after)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Move chunk texts from Qdrant payloads to the chunk_texts table."
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only count the texts that would be moved"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=cfg.QDRANT_UPSERT_BATCH_SIZE,
+        help="Points per scroll and payload update",
+    )
+    parser.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=30.0,
+        help="Seconds to wait before measuring Qdrant memory again",
+    )
+    parser.add_argument(
+        "--metrics-url", default=None, help="Qdrant metrics endpoint (default: from config)"
+    )
+    args = parser.parse_args(argv)
+    try:
+        return asyncio.run(run(args))
+    except Exception as e:
+        logger.error(f"Chunk text migration failed: {e}")
+        print(f"Chunk text migration failed: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
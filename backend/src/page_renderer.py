@@ -0,0 +1,235 @@
+import io
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pymupdf
+
+from src.config import cfg
+from src.logger import logger
+from src.page_text_cache import page_text_cache
+
+# Output formats and their media types; WebP needs the optional Pillow package.
+IMAGE_MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+# Highlight segments shorter than this are ignored: they match too easily.
+_MIN_SEGMENT_CHARS = 20
+_SEGMENT_SPLIT = re.compile(r"(?<=[.!?;:])\s+")
+
+
+def webp_available() -> bool:
+    try:
+        import PIL.Image  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def render_page(file_path: str, page_number: int, dpi: int, fmt: str) -> bytes:
+    """Render one page (1-based) of a PDF to an image in `fmt`."""
+    pdf_doc = pymupdf.open(file_path)
+    try:
+        pixmap = pdf_doc.load_page(page_number - 1).get_pixmap(dpi=dpi)
+        if fmt == "png":
+            return pixmap.tobytes("png")
+        if fmt == "jpeg":
+            return pixmap.tobytes("jpeg", jpg_quality=cfg.PAGE_RENDER_JPEG_QUALITY)
+        from PIL import Image
+
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        buffer = io.BytesIO()
+        image.save(buffer, "WEBP", quality=cfg.PAGE_RENDER_JPEG_QUALITY)
+        return buffer.getvalue()
+    finally:
+        pdf_doc.close()
+
+
+def _normalise(text: str) -> Tuple[str, List[int]]:
+    """Lower-case `text` with runs of whitespace collapsed to one space,
+    and the offset in `text` of every character of the result."""
+    chars: List[str] = []
+    offsets: List[int] = []
+    in_space = True
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            if not in_space:
+                chars.append(" ")
+                offsets.append(i)
+            in_space = True
+        else:
+            chars.append(ch.lower())
+            offsets.append(i)
+            in_space = False
+    return "".join(chars), offsets
+
+
+def find_highlights(text: str, highlight: str) -> List[Tuple[int, int]]:
+    """
+    Character ranges of `text` covered by `highlight` (e.g. a cited chunk).
+    Whitespace and case are ignored. A chunk that only partly lies on this
+    page is matched sentence by sentence, so the part on the page is found.
+    """
+    haystack, offsets = _normalise(text)
+    needle = " ".join(highlight.split()).lower()
+    if not haystack or not needle:
+        return []
+    segments = [needle] if needle in haystack else _SEGMENT_SPLIT.split(needle)
+
+    spans: List[Tuple[int, int]] = []
+    position = 0
+    for segment in segments:
+        if len(segment) < _MIN_SEGMENT_CHARS and segment != needle:
+            continue
+        start = haystack.find(segment, position)
+        if start < 0:
+            start = haystack.find(segment)
+            if start < 0:
+                continue
+        end = start + len(segment)
+        position = end
+        spans.append((offsets[start], offsets[end - 1] + 1))
+
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if merged and not text[merged[-1][1]:start].strip():
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def page_text(
+    file_path: str,
+    page_number: int,
+    highlight: Optional[str] = None,
+    file_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Text of one page (1-based), with the ranges and on-page rectangles
+    (in PDF points) of `highlight`. The text comes from the page text cache
+    when `file_hash` is cached there; the PDF is only parsed otherwise.
+    """
+    text = page_text_cache.read_page(file_hash, page_number) if file_hash else None
+    pdf_doc = pymupdf.open(file_path)
+    try:
+        page = pdf_doc.load_page(page_number - 1)
+        if text is None:
+            text = str(page.get_text("text")).strip()
+        highlights = find_highlights(text, highlight) if highlight else []
+        rects = [
+            [round(rect.x0, 2), round(rect.y0, 2), round(rect.x1, 2), round(rect.y1, 2)]
+            for start, end in highlights
+            for rect in page.search_for(" ".join(text[start:end].split()))
+        ]
+        return {
+            "page_number": page_number,
+            "page_count": pdf_doc.page_count,
+            "width": round(page.rect.width, 2),
+            "height": round(page.rect.height, 2),
+            "text": text,
+            "highlights": [{"start": start, "end": end} for start, end in highlights],
+            "rects": rects,
+        }
+    finally:
+        pdf_doc.close()
+
+
+class RenderedPageCache:
+    """
+    On-disk cache of rendered pages, keyed by file hash, page, DPI and
+    format, and bounded by total size with least-recently-used eviction.
+
+    Recency is kept in the file mtimes (touched on every hit), so the order
+    survives restarts and is shared by all processes using the directory.
+    """
+
+    def __init__(
+        self, directory: str = cfg.PAGE_CACHE_DIR, max_bytes: int = cfg.PAGE_CACHE_MAX_BYTES
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_hash: str, page_number: int, dpi: int, fmt: str) -> str:
+        return f"{file_hash}-p{page_number}-{dpi}.{fmt}"
+
+    def _load(self) -> "OrderedDict[str, int]":
+        if self._entries is None:
+            os.makedirs(self.directory, exist_ok=True)
+            files = []
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime_ns, entry.name, stat.st_size))
+            self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+            self._size = sum(self._entries.values())
+        return self._entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                entries = self._load()
+                if key in entries:
+                    self._size -= entries.pop(key)
+            return None
+        with self._lock:
+            entries = self._load()
+            if key in entries:
+                entries.move_to_end(key)
+            else:
+                # Written by another process
+                entries[key] = len(data)
+                self._size += len(data)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            entries = self._load()
+            tmp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, key))
+            self._size += len(data) - entries.pop(key, 0)
+            entries[key] = len(data)
+            while self._size > self.max_bytes and entries:
+                evicted, size = entries.popitem(last=False)
+                self._size -= size
+                try:
+                    os.remove(os.path.join(self.directory, evicted))
+                except FileNotFoundError:
+                    pass
+                logger.debug(f"Evicted rendered page {evicted} from the page cache")
+
+    def discard(self, file_hash: str) -> int:
+        """Remove every cached page of the file with this hash."""
+        prefix = f"{file_hash}-"
+        with self._lock:
+            entries = self._load()
+            keys = [key for key in entries if key.startswith(prefix)]
+            for key in keys:
+                self._size -= entries.pop(key)
+                try:
+                    os.remove(os.path.join(self.directory, key))
+                except FileNotFoundError:
+                    pass
+        return len(keys)
+
+
+page_cache = RenderedPageCache()
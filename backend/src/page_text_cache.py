@@ -0,0 +1,225 @@
+import mmap
+import os
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+import zstandard
+
+from src.config import cfg
+from src.logger import logger
+from src.pdf_extractor import extract_pages
+
+# Trailer: page count (uint32) and magic, after the (page count + 1) uint64 offsets
+_MAGIC = b"PTC1"
+_TRAILER = struct.Struct("<I4s")
+_OFFSET = struct.Struct("<Q")
+
+
+class PageTextWriter:
+    """
+    Writes a cache file page by page, so a document's text never has to be
+    held in memory at once; only the frame offsets are kept. The file
+    appears under its final name on `commit()`. Pages already added can be
+    read back with `read()` from another thread, also while writing.
+    """
+
+    def __init__(self, directory: str, path: str, level: int) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._file = open(self.tmp_path, "wb")
+        self._lock = threading.Lock()
+        self._committed = False
+        self.offsets = [0]
+
+    def add(self, pages: List[str]) -> None:
+        frames = [self._compressor.compress(text.encode("utf-8")) for text in pages]
+        for frame in frames:
+            self._file.write(frame)
+        self._file.flush()
+        # Only now are the pages visible to read().
+        for frame in frames:
+            self.offsets.append(self.offsets[-1] + len(frame))
+
+    def read(self, start: int, end: int) -> List[str]:
+        """Texts of added pages `start` to `end` (0-based, end exclusive)."""
+        with self._lock:
+            f = open(self.path if self._committed else self.tmp_path, "rb")
+        with f:
+            f.seek(self.offsets[start])
+            data = f.read(self.offsets[end] - self.offsets[start])
+        decompressor = zstandard.ZstdDecompressor()
+        base = self.offsets[start]
+        return [
+            decompressor.decompress(
+                data[self.offsets[i] - base : self.offsets[i + 1] - base]
+            ).decode("utf-8")
+            for i in range(start, end)
+        ]
+
+    def commit(self) -> None:
+        with self._file:
+            for offset in self.offsets:
+                self._file.write(_OFFSET.pack(offset))
+            self._file.write(_TRAILER.pack(len(self.offsets) - 1, _MAGIC))
+        with self._lock:
+            os.replace(self.tmp_path, self.path)
+            self._committed = True
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class PageTextCache:
+    """
+    Extracted page texts of each document, stored once at ingestion so that
+    summaries, re-indexing and the page endpoints do not parse the PDF again.
+
+    One file per content hash. Every page is its own zstd frame, followed by
+    an index of frame offsets and a small trailer, so a single page can be
+    read from a memory map without decompressing the rest.
+    """
+
+    def __init__(
+        self, directory: str = cfg.TEXT_CACHE_DIR, level: int = cfg.TEXT_CACHE_ZSTD_LEVEL
+    ) -> None:
+        self.directory = directory
+        self.level = level
+
+    def path(self, file_hash: str) -> str:
+        return os.path.join(self.directory, f"{file_hash}.pages.zst")
+
+    def exists(self, file_hash: str) -> bool:
+        return os.path.exists(self.path(file_hash))
+
+    def writer(self, file_hash: str) -> PageTextWriter:
+        return PageTextWriter(self.directory, self.path(file_hash), self.level)
+
+    def write(self, file_hash: str, pages: List[str]) -> None:
+        writer = self.writer(file_hash)
+        try:
+            writer.add(pages)
+            writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+        logger.debug(
+            f"Cached text of {len(pages)} pages for {file_hash[:12]} ({writer.offsets[-1]} bytes)"
+        )
+
+    @contextmanager
+    def _open(self, file_hash: str) -> Iterator[Optional[Tuple[mmap.mmap, List[int]]]]:
+        """Map the cache file and parse its index; yields None if it is missing or corrupt."""
+        try:
+            f = open(self.path(file_hash), "rb")
+        except FileNotFoundError:
+            yield None
+            return
+        with f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                mapped = None
+            if mapped is None:
+                yield None
+                return
+            with mapped:
+                index = self._index(mapped)
+                if index is None:
+                    logger.warning(f"Ignoring corrupt text cache for {file_hash[:12]}")
+                yield None if index is None else (mapped, index)
+
+    @staticmethod
+    def _index(mapped: mmap.mmap) -> Optional[List[int]]:
+        if len(mapped) < _TRAILER.size:
+            return None
+        count, magic = _TRAILER.unpack_from(mapped, len(mapped) - _TRAILER.size)
+        index_start = len(mapped) - _TRAILER.size - (count + 1) * _OFFSET.size
+        if magic != _MAGIC or index_start < 0:
+            return None
+        offsets = [
+            _OFFSET.unpack_from(mapped, index_start + i * _OFFSET.size)[0]
+            for i in range(count + 1)
+        ]
+        if offsets[-1] != index_start:
+            return None
+        return offsets
+
+    @staticmethod
+    def _page(mapped: mmap.mmap, offsets: List[int], i: int) -> str:
+        frame = mapped[offsets[i] : offsets[i + 1]]
+        return zstandard.ZstdDecompressor().decompress(frame).decode("utf-8")
+
+    def read_all(self, file_hash: str) -> Optional[List[str]]:
+        return self.read_range(file_hash, 0, None)
+
+    def read_range(
+        self, file_hash: str, start: int, end: Optional[int]
+    ) -> Optional[List[str]]:
+        """Texts of pages `start` to `end` (0-based, end exclusive; None for all)."""
+        try:
+            with self._open(file_hash) as opened:
+                if opened is None:
+                    return None
+                mapped, offsets = opened
+                count = len(offsets) - 1
+                stop = count if end is None else min(end, count)
+                return [self._page(mapped, offsets, i) for i in range(start, stop)]
+        except Exception as e:
+            logger.warning(f"Failed to read text cache for {file_hash[:12]}: {e}")
+            return None
+
+    def page_count(self, file_hash: str) -> Optional[int]:
+        try:
+            with self._open(file_hash) as opened:
+                return None if opened is None else len(opened[1]) - 1
+        except Exception as e:
+            logger.warning(f"Failed to read text cache for {file_hash[:12]}: {e}")
+            return None
+
+    def read_page(self, file_hash: str, page_number: int) -> Optional[str]:
+        """Text of one page (1-based), or None if it is not cached."""
+        try:
+            with self._open(file_hash) as opened:
+                if opened is None:
+                    return None
+                mapped, offsets = opened
+                if not 1 <= page_number < len(offsets):
+                    return None
+                return self._page(mapped, offsets, page_number - 1)
+        except Exception as e:
+            logger.warning(f"Failed to read text cache for {file_hash[:12]}: {e}")
+            return None
+
+    def discard(self, file_hash: str) -> None:
+        try:
+            os.remove(self.path(file_hash))
+        except FileNotFoundError:
+            pass
+
+
+page_text_cache = PageTextCache()
+
+
+def load_pages(file_path: str, file_hash: str) -> List[str]:
+    """
+    Page texts of a PDF from the text cache, extracting (and caching) them
+    if they are not there yet.
+    """
+    pages = page_text_cache.read_all(file_hash)
+    if pages is not None:
+        return pages
+    pages = extract_pages(file_path)
+    try:
+        page_text_cache.write(file_hash, pages)
+    except Exception as e:
+        logger.warning(f"Failed to cache extracted text of {file_path}: {e}")
+    return pages
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import os
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import cfg
+from src.logger import logger
+from src.schema.ingested_documents import (DOC_INDEXED, SUMMARY_DONE,
+                                           IngestedDocument)
+from src.schema.ingested_documents_crud import (get_documents,
+                                                get_manifest_version)
+
+
+def processing_state(document: IngestedDocument) -> str:
+    """Processing state of a file on disk from its manifest entry."""
+    if document.embedding_status != DOC_INDEXED:
+        return "partial_embeddings_missing"
+    if document.summary_status != SUMMARY_DONE:
+        return "partial_summary_missing"
+    return "complete"
+
+
+def _isoformat(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+@dataclass
+class CatalogSnapshot:
+    # Changes whenever DATA_DIR or the manifest changes; used for ETags.
+    version: str
+    # One entry per PDF in DATA_DIR, sorted by file name
+    entries: List[Dict[str, Any]]
+    names: List[str]
+
+
+class PDFCatalog:
+    """
+    In-process cache of the metadata behind /api/pdf/list.
+
+    Listing DATA_DIR and joining it with the ingested_documents manifest is
+    done once and reused until something changes. Every lookup checks two
+    cheap signals: the mtime of DATA_DIR, which changes when a file is
+    added, replaced or removed, and the row count plus max(updated_at) of
+    the manifest, which change with every ingestion event, including those
+    of worker processes. Routes that change files also call `invalidate()`,
+    for filesystems with coarse mtimes.
+    """
+
+    def __init__(self, directory: str = cfg.DATA_DIR) -> None:
+        self.directory = directory
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+    def _directory_version(self) -> int:
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _scan(self) -> List[Tuple[str, int, float]]:
+        if not os.path.isdir(self.directory):
+            return []
+        files = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.lower().endswith(".pdf"):
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime))
+        return sorted(files)
+
+    async def snapshot(self, db: AsyncSession) -> CatalogSnapshot:
+        dir_version = await asyncio.to_thread(self._directory_version)
+        count, updated_at = await get_manifest_version(db)
+        version = f"{dir_version}:{count}:{_isoformat(updated_at)}"
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        async with self._lock:
+            if self._snapshot is not None and self._snapshot.version == version:
+                return self._snapshot
+            files = await asyncio.to_thread(self._scan)
+            manifest = await get_documents(db)
+            entries = [
+                self._entry(name, size, mtime, manifest.get(name))
+                for name, size, mtime in files
+            ]
+            snapshot = CatalogSnapshot(
+                version=version, entries=entries, names=[e["file_name"] for e in entries]
+            )
+            self._snapshot = snapshot
+            logger.debug(f"Rebuilt PDF catalog: {len(entries)} files ({version})")
+            return snapshot
+
+    @staticmethod
+    def _entry(
+        name: str, size: int, mtime: float, document: Optional[IngestedDocument]
+    ) -> Dict[str, Any]:
+        entry: Dict[str, Any] = {
+            "file_name": name,
+            "size": size,
+            "modified_at": mtime,
+            "processing_state": "unknown",
+            "has_summary": False,
+            "page_count": None,
+            "chunk_count": None,
+            "embedding_status": None,
+            "summary_status": None,
+            "indexed_at": None,
+        }
+        if document is not None:
+            entry.update(
+                processing_state=processing_state(document),
+                has_summary=document.summary_status == SUMMARY_DONE,
+                page_count=document.page_count,
+                chunk_count=document.chunk_count,
+                embedding_status=document.embedding_status,
+                summary_status=document.summary_status,
+                indexed_at=_isoformat(document.indexed_at),
+            )
+        return entry
+
+    @staticmethod
+    def etag(snapshot: CatalogSnapshot, query: str) -> str:
+        digest = hashlib.sha1(f"{snapshot.version}|{query}".encode()).hexdigest()
+        return f'"{digest}"'
+
+    @staticmethod
+    def page(
+        snapshot: CatalogSnapshot,
+        limit: int,
+        after: Optional[str] = None,
+        state: Optional[str] = None,
+        has_summary: Optional[bool] = None,
+        q: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        One page of the files sorted by name, starting after the file name
+        `after` (keyset pagination), with optional filters.
+        """
+        needle = q.lower() if q else None
+
+        def matches(entry: Dict[str, Any]) -> bool:
+            if state is not None and entry["processing_state"] != state:
+                return False
+            if has_summary is not None and entry["has_summary"] != has_summary:
+                return False
+            if needle is not None and needle not in entry["file_name"].lower():
+                return False
+            return True
+
+        start = bisect_right(snapshot.names, after) if after is not None else 0
+        items: List[Dict[str, Any]] = []
+        next_cursor = None
+        for index in range(start, len(snapshot.entries)):
+            entry = snapshot.entries[index]
+            if not matches(entry):
+                continue
+            if len(items) == limit:
+                next_cursor = items[-1]["file_name"]
+                break
+            items.append(entry)
+        return {
+            "pdfs": [entry["file_name"] for entry in items],
+            "documents": items,
+            "next_cursor": next_cursor,
+            "total": len(snapshot.entries),
+        }
+
+
+pdf_catalog = PDFCatalog()
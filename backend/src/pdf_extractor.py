@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import pymupdf
+
+from src.config import cfg
+
+# This module lives outside src.rag on purpose: worker processes are spawned
+# and import it, and src.rag pulls in the embedding and LLM stack.
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end). Runs inside a worker process."""
+    pdf_doc = pymupdf.open(file_path)
+    try:
+        return [
+            str(pdf_doc.load_page(page_num).get_text("text")).strip()
+            for page_num in range(start, end)
+        ]
+    finally:
+        pdf_doc.close()
+
+
+def page_count(file_path: str) -> int:
+    pdf_doc = pymupdf.open(file_path)
+    try:
+        return len(pdf_doc)
+    finally:
+        pdf_doc.close()
+
+
+def page_ranges(total_pages: int, parts: int) -> List[Tuple[int, int]]:
+    """Split [0, total_pages) into at most `parts` contiguous, balanced ranges."""
+    parts = max(1, min(parts, total_pages))
+    size, extra = divmod(total_pages, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def get_extraction_pool(workers: int = cfg.EXTRACT_WORKERS) -> ProcessPoolExecutor:
+    """
+    Process pool shared by all extractions. Workers are spawned rather than
+    forked because the API process runs threads (and torch) that must not be
+    duplicated into a child.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_extraction_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def extract_pages(
+    file_path: str,
+    workers: int = cfg.EXTRACT_WORKERS,
+    min_pages: int = cfg.EXTRACT_PARALLEL_MIN_PAGES,
+    pool: Optional[Executor] = None,
+) -> List[str]:
+    """
+    Return the text of every page of the PDF, in page order.
+
+    Documents with fewer than `min_pages` pages (or `workers <= 1`) are read
+    in-process; larger ones are split into contiguous page ranges extracted
+    concurrently by worker processes, each opening the document itself.
+    """
+    total_pages = page_count(file_path)
+    if workers <= 1 or total_pages < min_pages:
+        return extract_page_range(file_path, 0, total_pages)
+
+    pool = pool or get_extraction_pool(workers)
+    ranges = page_ranges(total_pages, workers)
+    futures = [
+        pool.submit(extract_page_range, os.fspath(file_path), start, end)
+        for start, end in ranges
+    ]
+    pages: List[str] = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
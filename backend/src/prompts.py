@@ -97,3 +97,19 @@ And the following conversation history:
 Based on this information, suggest 3 relevant follow-up questions a user might ask.
 List each question on a separate line. Do not include any explanations or extra text—only the questions.
      """
+
+HISTORY_SUMMARY_PROMPT = """
+You are maintaining a running summary of a conversation between a user and a policy document assistant.
+
+Current summary (may be empty):
+
+{summary}
+
+New conversation turns to fold into the summary:
+
+{history}
+
+Rewrite the summary so it covers both the current summary and the new turns in at most {max_words} words.
+Keep the user's goals, the documents and sections discussed, key facts, figures and conclusions, and any open questions.
+Output only the updated summary text.
+     """
@@ -1,5 +1,5 @@
 import asyncio
-from typing import AsyncGenerator, Dict, List
+from typing import AsyncGenerator, Dict, List, Optional
 
 from langchain_classic.chains.llm import LLMChain
 from langchain_classic.chains.summarize import load_summarize_chain
@@ -15,7 +15,9 @@ from src.config import cfg
 from src.external import External
 from src.logger import logger
 
-from .chat_manager import ChatManager
+from .chat_manager import SUMMARY_KWARG, ChatManager
+from .context_packer import count_tokens
+from .hedging import hedge_stats
 
 
 class LLM_Interface:
@@ -30,16 +32,28 @@ class LLM_Interface:
         logger.info(f"Initializing LLM_Interface with model: {effective_model}")
 
         self.system_prompt = cfg.SYSTEM_PROMPT
-        self.max_history_messages = cfg.MAX_HISTORY_MESSAGES
-        self.llm = External.create_llm(effective_model)
+        self.fallback_model = cfg.HEDGE_FALLBACK_MODEL
+        self._fallback_chain = None
+        self.set_model(effective_model)
+        self.chat_manager = ChatManager()
+
+    def set_model(self, model_name: str) -> None:
+        """Switch the generation model (e.g. after query routing)."""
+        self.model_name = model_name
+        self.llm = External.create_llm(model_name)
         if self.llm is None:
             raise ValueError(
                 "LLM initialization failed. Ensure LLM_PROVIDER is configured correctly."
             )
         self.chain = self._create_chain()
-        self.chat_manager = ChatManager()
+        # Hedging is only meaningful when the fallback is a different model.
+        self.hedging_enabled = (
+            cfg.HEDGING_ENABLED
+            and bool(self.fallback_model)
+            and self.fallback_model != self.model_name
+        )
 
-    def _create_chain(self):
+    def _create_chain(self, llm=None):
         prompt = ChatPromptTemplate(
             [
                 ("system", self.system_prompt),
@@ -56,10 +70,112 @@ class LLM_Interface:
                 "query": lambda x: x["query"],
             }
             | prompt
-            | self.llm
+            | (llm or self.llm)
         )
         return chain
 
+    def _get_fallback_chain(self):
+        """Lazily build the chain for the hedge fallback model."""
+        if self._fallback_chain is None:
+            fallback_llm = External.create_llm(self.fallback_model)
+            self._fallback_chain = self._create_chain(llm=fallback_llm)
+        return self._fallback_chain
+
+    @staticmethod
+    async def _next_chunk(stream) -> tuple[bool, Optional[str]]:
+        try:
+            return True, External.extract_llm_output(await stream.__anext__())
+        except StopAsyncIteration:
+            return False, None
+
+    async def _astream_hedged(self, inputs: Dict) -> AsyncGenerator[str, None]:
+        """
+        Stream a response, hedging against a slow first token.
+
+        The primary chain is started immediately. If its first token has not
+        arrived within cfg.HEDGE_FIRST_TOKEN_TIMEOUT, the same inputs are sent
+        to the fallback model and whichever stream yields first is used; the
+        other one is cancelled. Outcomes are recorded in `hedge_stats`, also
+        when every stream failed.
+        """
+        racers: Dict[asyncio.Future, tuple] = {}
+
+        def start(model: str, chain) -> None:
+            stream = chain.astream(inputs).__aiter__()
+            racers[asyncio.ensure_future(self._next_chunk(stream))] = (model, stream)
+
+        start(self.model_name, self.chain)
+        done, _ = await asyncio.wait(
+            racers.keys(), timeout=cfg.HEDGE_FIRST_TOKEN_TIMEOUT
+        )
+        hedged = False
+        winner = None
+        losers = []
+        first_error: Optional[BaseException] = None
+        try:
+            while True:
+                for task in done:
+                    model, stream = racers.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        logger.error(f"Hedged stream from {model} failed: {error}")
+                        first_error = first_error or error
+                    elif winner is None:
+                        winner = (model, stream, task.result())
+                    else:
+                        losers.append((model, stream))
+                if winner is not None:
+                    break
+
+                # Primary is slow (or already failed): race the fallback model once.
+                if not hedged:
+                    hedged = True
+                    logger.warning(
+                        f"No first token from {self.model_name} within "
+                        f"{cfg.HEDGE_FIRST_TOKEN_TIMEOUT}s; hedging with {self.fallback_model}"
+                    )
+                    try:
+                        start(self.fallback_model, self._get_fallback_chain())
+                    except Exception as e:
+                        logger.error(f"Could not start hedge fallback model: {e}")
+                        first_error = first_error or e
+                if not racers:
+                    break
+                done, _ = await asyncio.wait(
+                    racers.keys(), return_when=asyncio.FIRST_COMPLETED
+                )
+        finally:
+            # Cancel whichever side lost (or everything, if we are being cancelled).
+            for task, (model, stream) in racers.items():
+                task.cancel()
+                losers.append((model, stream))
+            for task in racers:
+                try:
+                    await task
+                except BaseException:
+                    pass
+            for model, stream in losers:
+                logger.info(f"Cancelling losing hedged stream from {model}")
+                try:
+                    await stream.aclose()
+                except Exception:
+                    pass
+
+        if winner is None:
+            hedge_stats.record(self.model_name, hedged, None)
+            raise first_error or RuntimeError("No hedged stream produced output")
+
+        model, stream, (has_chunk, first_chunk) = winner
+        hedge_stats.record(self.model_name, hedged, model)
+        logger.info(
+            f"Hedged generation served by {model} (primary: {self.model_name}, hedged: {hedged})"
+        )
+        if not has_chunk:
+            return
+        yield first_chunk
+        async for chunk in stream:
+            yield External.extract_llm_output(chunk)
+
     def _format_context(self, context_chunks: List[str]) -> str:
         if not context_chunks:
             logger.info("No relevant context found for given prompt.")
@@ -78,15 +194,50 @@ class LLM_Interface:
         return f"Retrieved Information:\n{context}"
 
     def _format_history(self, history: List[BaseMessage]) -> List[BaseMessage]:
-        if not history:
-            return []
-
-        recent_history = history[-self.max_history_messages :]
-
-        if len(recent_history) % 2 == 1 and len(history) > len(recent_history):
-            recent_history = recent_history[1:]
+        # The cached history is the rolling summary of compacted turns (if
+        # any) followed by every message not folded into it.
+        # ChatManager.compact_history keeps it below the token cap; should it
+        # fall behind, only the summary and the latest turns that fit are sent.
+        summary = [m for m in history[:1] if m.additional_kwargs.get(SUMMARY_KWARG)]
+        messages = history[len(summary):]
+        budget = cfg.HISTORY_PROMPT_MAX_TOKENS - sum(
+            count_tokens(str(m.content)) for m in summary
+        )
+        start = len(messages)
+        while start > 0:
+            tokens = count_tokens(str(messages[start - 1].content))
+            if tokens > budget:
+                break
+            budget -= tokens
+            start -= 1
+        # Do not open with an answer whose question was cut off.
+        while start < len(messages) and messages[start].type != "human":
+            start += 1
+        if start > 0:
+            logger.warning(
+                f"History over {cfg.HISTORY_PROMPT_MAX_TOKENS} tokens; "
+                f"leaving {start} older messages out of the prompt"
+            )
+        return [*summary, *messages[start:]]
 
-        return recent_history
+    async def summarize_history(
+        self, previous_summary: Optional[str], messages: List[BaseMessage]
+    ) -> str:
+        """Fold `messages` into `previous_summary` and return the new summary."""
+        roles = {"human": "User", "ai": "Assistant", "system": "System"}
+        history = "\n".join(
+            f"{roles.get(message.type, message.type.capitalize())}: {message.content}"
+            for message in messages
+        )
+        response = await asyncio.to_thread(
+            self.llm.invoke,
+            cfg.HISTORY_SUMMARY_PROMPT.format(
+                summary=previous_summary or "",
+                history=history,
+                max_words=cfg.HISTORY_SUMMARY_MAX_WORDS,
+            ),
+        )
+        return str(External.extract_llm_output(response)).strip()
 
     async def generate_rewritten_queries(self, query: str, summary: str) -> List[str]:
         try:
@@ -181,6 +332,14 @@ class LLM_Interface:
             )
             logger.info(f"Async generating response for query: {query[:30]}...")
 
+            if self.hedging_enabled:
+                pieces = []
+                async for chunk in self._astream_hedged(inputs):
+                    pieces.append(str(chunk))
+                result = "".join(pieces)
+                logger.info(f"Generated async response (hedged): {result[:30]}...")
+                return result
+
             # Prefer async run-over documents if available
             # 1) chain.arun (common pattern for async chain-run)
             if hasattr(self.chain, "arun"):
@@ -242,7 +401,12 @@ class LLM_Interface:
 
             logger.info(f"Generating response for query: {query[:30]}...")
 
-            async for chunk in self.chain.astream(inputs):
+            stream = (
+                self._astream_hedged(inputs)
+                if self.hedging_enabled
+                else self.chain.astream(inputs)
+            )
+            async for chunk in stream:
                 chunk = External.extract_llm_output(chunk)
                 logger.info(f"Streaming chunk: {str(chunk)[:30]}...")
                 yield chunk
@@ -0,0 +1,111 @@
+import math
+import re
+from collections import Counter
+from typing import List, Set, Tuple
+
+from langchain_core.documents import Document
+
+from src.config import cfg
+
+_DIGITS_RE = re.compile(r"\d+")
+# Longer lines are body text, not running headers or footers.
+_MAX_LINE_CHARS = 160
+
+
+def _normalise(line: str) -> str:
+    """Key of a header/footer line: case, spacing and numbers (e.g. page numbers) ignored."""
+    return " ".join(_DIGITS_RE.sub("#", line.lower()).split())
+
+
+def sample_page_numbers(total_pages: int, size: int = cfg.BOILERPLATE_SAMPLE_PAGES) -> List[int]:
+    """Up to `size` page numbers (1-based) spread evenly over the document."""
+    if total_pages <= size:
+        return list(range(1, total_pages + 1))
+    step = total_pages / size
+    return sorted({int(i * step) + 1 for i in range(size)})
+
+
+class Boilerplate:
+    """
+    Header and footer lines repeated across the pages of a document, and
+    the amount stripped with them so far.
+    """
+
+    def __init__(
+        self,
+        headers: Set[str],
+        footers: Set[str],
+        edge_lines: int = cfg.BOILERPLATE_EDGE_LINES,
+    ) -> None:
+        self.headers = headers
+        self.footers = footers
+        self.edge_lines = edge_lines
+        self.lines_removed = 0
+        self.bytes_removed = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.headers or self.footers)
+
+    def strip(self, text: str) -> str:
+        if not self:
+            return text
+        lines = text.splitlines()
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        removed: Set[int] = set()
+        for i in content[: self.edge_lines]:
+            if _normalise(lines[i]) not in self.headers:
+                break
+            removed.add(i)
+        for i in reversed(content[-self.edge_lines :]):
+            if i in removed or _normalise(lines[i]) not in self.footers:
+                break
+            removed.add(i)
+        # A page made only of repeated lines (e.g. a form) is content, not boilerplate
+        if not removed or len(removed) == len(content):
+            return text
+        self.lines_removed += len(removed)
+        self.bytes_removed += sum(len(lines[i].encode("utf-8")) for i in removed)
+        return "\n".join(line for i, line in enumerate(lines) if i not in removed)
+
+    def strip_pages(self, pages: List[Document]) -> List[Document]:
+        """Copies of `pages` with their boilerplate stripped."""
+        if not self:
+            return pages
+        return [
+            Document(page_content=self.strip(page.page_content), metadata=page.metadata)
+            for page in pages
+        ]
+
+
+def _edges(text: str, edge_lines: int) -> Tuple[Set[str], Set[str]]:
+    lines = [line for line in text.splitlines() if line.strip()]
+
+    def keys(part: List[str]) -> Set[str]:
+        return {_normalise(line) for line in part if len(line.strip()) <= _MAX_LINE_CHARS}
+
+    return keys(lines[:edge_lines]), keys(lines[-edge_lines:])
+
+
+def detect_boilerplate(
+    pages: List[str],
+    edge_lines: int = cfg.BOILERPLATE_EDGE_LINES,
+    min_fraction: float = cfg.BOILERPLATE_MIN_PAGE_FRACTION,
+    min_pages: int = cfg.BOILERPLATE_MIN_PAGES,
+) -> Boilerplate:
+    """
+    Find the header and footer lines of a document from (a sample of) its
+    page texts: lines among the first or last `edge_lines` of a page that
+    recur on at least `min_fraction` of the pages, and on `min_pages` pages.
+    """
+    header_counts: Counter = Counter()
+    footer_counts: Counter = Counter()
+    for text in pages:
+        headers, footers = _edges(text, edge_lines)
+        header_counts.update(headers)
+        footer_counts.update(footers)
+    needed = max(min_pages, math.ceil(min_fraction * len(pages)))
+    return Boilerplate(
+        {line for line, count in header_counts.items() if line and count >= needed},
+        {line for line, count in footer_counts.items() if line and count >= needed},
+        edge_lines,
+    )
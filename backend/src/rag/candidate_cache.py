@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.config import cfg
+
+
+@dataclass
+class CachedCandidates:
+    query_embedding: np.ndarray
+    pdfs: List[str]
+    id_to_doc: Dict[Any, str]
+    id_to_metadata: Dict[Any, Dict[str, Any]]
+    id_to_vector: Dict[Any, np.ndarray]
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class CandidateCache:
+    """
+    Per-session cache of the previous turn's fused candidate set.
+
+    Follow-up questions usually hit the same region of the corpus, so when a
+    new query embedding is close to the cached one the retriever reranks the
+    cached candidates plus a small fresh search instead of running query
+    rewriting and the full multi-query search again. Entries expire after
+    `ttl_seconds` and only match when the selected PDFs are unchanged. Both
+    the age and the query embedding are those of the last full search;
+    follow-ups served from the cache only merge their fresh candidates in.
+    Deleting or re-indexing a PDF drops the entries searching it
+    (`invalidate_source`), so no deleted or replaced chunk is cited.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = cfg.CANDIDATE_CACHE_TTL_SECONDS,
+        max_sessions: int = cfg.CANDIDATE_CACHE_MAX_SESSIONS,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._entries: "OrderedDict[str, CachedCandidates]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._cached_turns = 0
+
+    def get(self, session_id: str, pdfs: List[str]) -> Optional[CachedCandidates]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.created_at > self.ttl_seconds:
+                del self._entries[session_id]
+                return None
+            if set(entry.pdfs) != set(pdfs):
+                return None
+            self._entries.move_to_end(session_id)
+            return entry
+
+    def put(self, session_id: str, entry: CachedCandidates) -> None:
+        with self._lock:
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def invalidate_source(self, source: str) -> int:
+        """Drop the entries whose candidates may come from `source`."""
+        with self._lock:
+            stale = [sid for sid, entry in self._entries.items() if source in entry.pdfs]
+            for session_id in stale:
+                del self._entries[session_id]
+            return len(stale)
+
+    def record_turn(self, served_from_cache: bool) -> None:
+        with self._lock:
+            self._turns += 1
+            if served_from_cache:
+                self._cached_turns += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "turns": self._turns,
+                "cached_turns": self._cached_turns,
+                "cached_turn_rate": (
+                    self._cached_turns / self._turns if self._turns else 0.0
+                ),
+            }
+
+
+candidate_cache = CandidateCache()
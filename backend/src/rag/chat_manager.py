@@ -1,59 +1,237 @@
-from typing import Dict, List, Optional
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
 
-from langchain_core.chat_history import InMemoryChatMessageHistory
-from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.messages import (AIMessage, BaseMessage, ChatMessage,
+                                     HumanMessage, SystemMessage)
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.config import cfg
 from src.logger import logger
+from src.schema.chat_messages_crud import (add_chat_messages,
+                                           get_recent_chat_messages)
+from src.schema.chat_session_summaries_crud import (get_session_summary,
+                                                    upsert_session_summary)
+
+from .context_packer import count_tokens
+from .session_store import SessionStore, session_store
+
+# Marks the system message that carries the rolling conversation summary
+SUMMARY_KWARG = "history_summary"
 
 
 class ChatManager:
-    def __init__(self) -> None:
-        # Structure: {session_id: InMemoryChatMessageHistory}
-        self.sessions: Dict[str, InMemoryChatMessageHistory] = {}
+    def __init__(self, store: Optional[SessionStore] = None) -> None:
+        # Sessions live in a process-wide bounded cache backed by Postgres,
+        # so a fresh ChatManager per request still sees earlier turns.
+        self.store = store or session_store
+
+    @staticmethod
+    def _to_message(
+        role: str, message: str, chunk_ids: Optional[List[str]] = None
+    ) -> BaseMessage:
+        if role == "user":
+            return HumanMessage(content=message)
+        if role == "assistant":
+            additional_kwargs = {"chunk_ids": chunk_ids} if chunk_ids else {}
+            return AIMessage(content=message, additional_kwargs=additional_kwargs)
+        if role == "system":
+            return SystemMessage(content=message)
+        if role == "context":
+            return ChatMessage(content=message, role="context")
+        raise ValueError("Role must be 'user', 'assistant', 'system' or 'context'")
 
     def get_history(self, session_id: str) -> List[BaseMessage]:
-        if session_id not in self.sessions:
-            self.sessions[session_id] = InMemoryChatMessageHistory()
+        """
+        Return the cached history of a session. When older turns have been
+        compacted, the first message is a system message with their summary.
+        """
+        session = self.store.get(session_id)
+        if session is None:
             logger.info(
                 f"No chat history found for session_id '{session_id}', initializing new session."
             )
-        return self.sessions[session_id].messages
+            session = self.store.get_or_create(session_id)
+        if session.summary:
+            summary_message = SystemMessage(
+                content=f"Summary of the earlier conversation:\n{session.summary}",
+                additional_kwargs={SUMMARY_KWARG: True},
+            )
+            return [summary_message, *session.history.messages]
+        return session.history.messages
+
+    async def load_session(self, session_id: str, db: Optional[AsyncSession]) -> None:
+        """
+        Warm the cache from Postgres with the session summary and the
+        messages not folded into it (at most SESSION_CACHE_MAX_MESSAGES). The
+        loaded history starts at a user message, so it never opens with an
+        answer whose question was cut off.
+        """
+        if session_id in self.store or db is None:
+            return
+        try:
+            summary_row = await get_session_summary(db, session_id)
+            after_id = int(summary_row.last_message_id) if summary_row else None
+            rows = await get_recent_chat_messages(
+                db, session_id, limit=cfg.SESSION_CACHE_MAX_MESSAGES, after_id=after_id
+            )
+            rows = self._from_first_question(rows)
+        except Exception as e:
+            logger.error(f"Failed to load chat history for '{session_id}': {e}")
+            return
+        self.store.get_or_create(session_id)
+        if summary_row is not None:
+            self.store.compact(session_id, str(summary_row.summary), after_id or 0)
+        for row in rows:
+            try:
+                message = self._to_message(row["role"], row["content"], row["chunk_ids"])
+            except ValueError:
+                logger.warning(f"Skipping stored message with role '{row['role']}'")
+                continue
+            message.id = str(row["id"])
+            # Already persisted, so nothing is queued for the next flush.
+            self.store.append(session_id, message, record=None)
+        logger.info(f"Loaded {len(rows)} messages for session_id '{session_id}'")
+
+    @staticmethod
+    def _from_first_question(rows: List[Dict]) -> List[Dict]:
+        """`rows` without the leading messages that precede the first user message."""
+        for i, row in enumerate(rows):
+            if row["role"] == "user":
+                return rows[i:]
+        return []
+
+    async def persist(self, session_id: str, db: Optional[AsyncSession]) -> int:
+        """Bulk-write messages added since the last flush."""
+        pending = self.store.take_pending(session_id)
+        if not pending or db is None:
+            return 0
+        try:
+            ids = await add_chat_messages(db, session_id, pending)
+        except Exception as e:
+            logger.error(f"Failed to persist chat history for '{session_id}': {e}")
+            await db.rollback()
+            return 0
+        # Remember row ids so compaction can refer to persisted messages.
+        for record, message_id in zip(pending, ids):
+            record["message"].id = str(message_id)
+        return len(ids)
+
+    async def compact_history(
+        self,
+        session_id: str,
+        summarize: Callable[[Optional[str], List[BaseMessage]], Awaitable[str]],
+        db: Optional[AsyncSession],
+    ) -> bool:
+        """
+        Fold the messages older than the last cfg.MAX_HISTORY_MESSAGES turns
+        into the running summary once they exceed
+        cfg.HISTORY_SUMMARY_TRIGGER_TOKENS (or the cache is about to drop them).
+
+        Every message not folded yet is still sent to the LLM (up to
+        cfg.HISTORY_PROMPT_MAX_TOKENS), so the prompt history is bounded by
+        the threshold plus the recent turns and no message is ever in
+        neither. Only persisted messages are folded. The summary is attempted
+        cfg.HISTORY_SUMMARY_ATTEMPTS times; failing that, the next turn tries
+        again. Meant to run as a background task, off the request path.
+        """
+        session = self.store.get(session_id)
+        if session is None or session.compacting:
+            return False
+        messages = list(session.history.messages)
+        older = messages[: max(len(messages) - 2 * cfg.MAX_HISTORY_MESSAGES, 0)]
+        tokens = sum(count_tokens(str(m.content)) for m in older)
+        # The cache drops its oldest messages past max_messages; fold them first.
+        near_cap = len(messages) + 2 > self.store.max_messages
+        if tokens <= cfg.HISTORY_SUMMARY_TRIGGER_TOKENS and not near_cap:
+            return False
+
+        to_fold = []
+        for message in older:
+            if message.id is None:
+                break
+            to_fold.append(message)
+        if not to_fold:
+            return False
+
+        session.compacting = True
+        try:
+            summary = await self._summarize_with_retries(
+                session_id, summarize, session.summary, to_fold
+            )
+            if not summary:
+                logger.error(
+                    f"History compaction for '{session_id}' is falling behind: "
+                    f"{len(older)} older messages ({tokens} tokens) not summarized"
+                    + (", and the cache is about to drop some" if near_cap else "")
+                )
+                return False
+            last_message_id = int(to_fold[-1].id)
+            if db is not None:
+                await upsert_session_summary(db, session_id, summary, last_message_id)
+            self.store.compact(session_id, summary, last_message_id)
+            logger.info(
+                f"Compacted {len(to_fold)} messages ({tokens} older tokens) "
+                f"into summary for session_id '{session_id}'"
+            )
+            return True
+        except Exception as e:
+            logger.error(f"History compaction failed for '{session_id}': {e}")
+            return False
+        finally:
+            session.compacting = False
+
+    @staticmethod
+    async def _summarize_with_retries(
+        session_id: str,
+        summarize: Callable[[Optional[str], List[BaseMessage]], Awaitable[str]],
+        previous: Optional[str],
+        messages: List[BaseMessage],
+    ) -> Optional[str]:
+        for attempt in range(1, cfg.HISTORY_SUMMARY_ATTEMPTS + 1):
+            try:
+                summary = await summarize(previous, messages)
+                if summary:
+                    return summary
+                logger.warning(
+                    f"Empty history summary for '{session_id}' "
+                    f"(attempt {attempt}/{cfg.HISTORY_SUMMARY_ATTEMPTS})"
+                )
+            except Exception as e:
+                logger.warning(
+                    f"History summary failed for '{session_id}' "
+                    f"(attempt {attempt}/{cfg.HISTORY_SUMMARY_ATTEMPTS}): {e}"
+                )
+            if attempt < cfg.HISTORY_SUMMARY_ATTEMPTS:
+                await asyncio.sleep(attempt)
+        return None
 
     def add_message(
         self,
         session_id: str,
         role: str,
         message: str,
-        chunks: Optional[List[str]] = None,
+        chunk_ids: Optional[List[str]] = None,
     ) -> None:
-        if session_id not in self.sessions:
-            self.sessions[session_id] = InMemoryChatMessageHistory()
-            logger.info(
-                f"No chat history found for session_id '{session_id}', initializing new session before adding message."
-            )
-
-        if role == "user":
-            self.sessions[session_id].add_user_message(message)
-        elif role == "assistant":
-            additional_kwargs = {"chunks": chunks} if chunks else {}
-            ai_message = AIMessage(content=message, additional_kwargs=additional_kwargs)
-            self.sessions[session_id].add_message(ai_message)
-        elif role == "system":
-            self.sessions[session_id].add_message(SystemMessage(content=message))
-        elif role == "context":
-            self.sessions[session_id].add_message(
-                BaseMessage(content=message, role="context")
-            )
-        else:
+        try:
+            chat_message = self._to_message(role, message, chunk_ids)
+        except ValueError:
             logger.error(
                 f"Invalid role '{role}' provided to add_message for session_id '{session_id}'"
             )
-            raise ValueError("Role must be 'user', 'assistant', or 'system'")
+            raise
+        record: Dict = {
+            "role": role,
+            "content": message,
+            "chunk_ids": chunk_ids,
+            "message": chat_message,
+        }
+        self.store.append(session_id, chat_message, record)
 
     def get_last_n_messages(self, session_id: str, n: int = 5) -> List[BaseMessage]:
-        if session_id not in self.sessions:
+        session = self.store.get(session_id)
+        if session is None:
             logger.info(
                 f"No chat history found for session_id '{session_id}' when requesting last {n} messages."
             )
             return []
-        return self.sessions[session_id].messages[-n:]
+        return session.history.messages[-n:]
@@ -0,0 +1,343 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import (PointIdsList, SetPayload,
+                                       SetPayloadOperation)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import cfg
+from src.logger import logger
+from src.rag.minhash import MinHasher
+from src.schema.chunk_texts import ChunkRef, ChunkText
+from src.schema.chunk_texts_crud import (delete_chunk_refs, delete_chunk_texts,
+                                         get_band_candidates, get_chunk_refs,
+                                         get_chunk_signatures, get_chunk_texts,
+                                         get_refs_of_source, lock_chunk_texts,
+                                         upsert_chunk_refs, upsert_chunk_texts)
+from src.schema.db import AsyncSessionLocal
+
+# Location of a chunk in a document, as kept in payloads and references
+_PAGE_FIELDS = ("file_hash", "page_number", "page_start", "page_end")
+
+
+def payload_sources(payload: Dict[str, Any]) -> List[str]:
+    """
+    Documents a point serves. `source` is a list for points shared by
+    near-duplicate chunks of several documents, with the owner first.
+    """
+    source = payload.get("source")
+    if isinstance(source, list):
+        return source
+    return [source] if source else []
+
+
+def payload_owner(payload: Dict[str, Any]) -> Optional[str]:
+    sources = payload_sources(payload)
+    return sources[0] if sources else None
+
+
+class ChunkTextStore:
+    """
+    Chunk texts by Qdrant point id, kept in Postgres (`chunk_texts`) so that
+    the Qdrant payloads only carry what is filtered or shown with a hit:
+    source, file hash, page numbers and token count.
+
+    Writers store the texts before upserting the points, so every point a
+    search can return has its text; deleters remove the points first. Each
+    call uses its own short session, so the store can be used from the
+    ingestion stages, which have no request session.
+
+    The store also deduplicates across documents. Texts are stored with a
+    MinHash signature whose LSH bands are indexed (`chunk_lsh_bands`); a new
+    chunk that is a near-duplicate of another document's stored one is not
+    indexed again but recorded as a reference (`chunk_refs`) to the existing
+    point, whose `source` payload becomes the list of all documents it
+    serves (filters on `source` match any element) and whose `refs` payload
+    gives the pages of the chunk in each other document. A document has at
+    most one reference per point, so its own repeated chunks are indexed
+    each time and cited at their own pages. References and payloads are
+    changed with the owner rows locked, so concurrent ingestions do not
+    lose each other's updates.
+    """
+
+    def __init__(
+        self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal
+    ) -> None:
+        self.session_factory = session_factory
+
+    async def put(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Store `rows` of point_id, source, text, token_count and optionally
+        minhash (signature bytes); rows with a signature are indexed for
+        near-duplicate lookups.
+        """
+        rows = [{**row, "minhash": row.get("minhash")} for row in rows]
+        async with self.session_factory() as db:
+            for i in range(0, len(rows), cfg.CHUNK_TEXT_WRITE_BATCH_SIZE):
+                batch = rows[i : i + cfg.CHUNK_TEXT_WRITE_BATCH_SIZE]
+                bands = [
+                    {"band": band, "bucket": bucket, "point_id": row["point_id"]}
+                    for row in batch
+                    if row["minhash"] is not None
+                    for band, bucket in enumerate(
+                        MinHasher.bands(MinHasher.from_bytes(row["minhash"]))
+                    )
+                ]
+                await upsert_chunk_texts(db, batch, bands)
+
+    async def get_many(self, point_ids: Iterable[Any]) -> Dict[str, str]:
+        """Texts of `point_ids` in one query, keyed by the string form of the id."""
+        ids = [str(point_id) for point_id in point_ids]
+        if not ids:
+            return {}
+        async with self.session_factory() as db:
+            return await get_chunk_texts(db, ids)
+
+    async def find_near_duplicates(
+        self,
+        signatures: List[np.ndarray],
+        exclude: Set[str],
+        threshold: float = cfg.INGEST_DEDUP_THRESHOLD,
+    ) -> List[Optional[Tuple[str, str]]]:
+        """
+        For each signature, the (point id, owner source) of the most similar
+        stored chunk with similarity >= `threshold`, or None. Candidates come
+        from the LSH buckets; points in `exclude` are never returned.
+        """
+        if not signatures:
+            return []
+        bands = [MinHasher.bands(signature) for signature in signatures]
+        async with self.session_factory() as db:
+            buckets = await get_band_candidates(
+                db, {(band, bucket) for row in bands for band, bucket in enumerate(row)}
+            )
+            candidates = {point_id for ids in buckets.values() for point_id in ids}
+            stored = await get_chunk_signatures(db, candidates - exclude)
+
+        matches: List[Optional[Tuple[str, str]]] = []
+        for signature, row in zip(signatures, bands):
+            best: Optional[Tuple[str, str]] = None
+            best_similarity = 0.0
+            ids = {
+                point_id
+                for band, bucket in enumerate(row)
+                for point_id in buckets.get((band, bucket), [])
+                if point_id in stored
+            }
+            for point_id in sorted(ids):
+                source, minhash = stored[point_id]
+                similarity = MinHasher.similarity(signature, MinHasher.from_bytes(minhash))
+                if similarity >= threshold and similarity > best_similarity:
+                    best, best_similarity = (point_id, source), similarity
+            matches.append(best)
+        return matches
+
+    async def put_deduplicated(
+        self,
+        client: AsyncQdrantClient,
+        rows: List[Dict[str, Any]],
+        signatures: List[np.ndarray],
+        payloads: List[Dict[str, Any]],
+    ) -> List[int]:
+        """
+        Store `rows` as `put` does, with the MinHash `signatures` of their
+        texts, except near-duplicates of other documents' chunks: those
+        become a reference to the existing point, at the pages of their own
+        point's payload in `payloads`. A document has one reference per
+        point, so a repeat of its own chunk (or a second match of the same
+        point) is kept and stays citable at its page. Returns the indices of
+        the stored rows, whose points still have to be written.
+        """
+        # A replayed batch must not match its own points.
+        matches = await self.find_near_duplicates(
+            signatures, exclude={row["point_id"] for row in rows}
+        )
+        # References the documents already have to the matched points
+        existing: Dict[Tuple[str, str], ChunkRef] = {}
+        point_ids = {match[0] for match in matches if match is not None}
+        async with self.session_factory() as db:
+            for source in {row["source"] for row in rows}:
+                for ref in await get_refs_of_source(db, source, point_ids):
+                    existing[(ref.point_id, source)] = ref
+
+        kept: List[int] = []
+        # Reference per shared point, with the index of the row it replaces
+        refs: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        for i, (row, match) in enumerate(zip(rows, matches)):
+            row["minhash"] = MinHasher.to_bytes(signatures[i])
+            if match is None or match[1] == row["source"] or match[0] in refs:
+                kept.append(i)
+                continue
+            point_id = match[0]
+            ref = {
+                "point_id": point_id,
+                "source": row["source"],
+                **{field: payloads[i][field] for field in _PAGE_FIELDS},
+            }
+            earlier = existing.get((point_id, row["source"]))
+            # Unless it is the same chunk again (a replayed batch), replacing
+            # the reference would move the earlier chunk's citation here.
+            if earlier is not None and any(
+                getattr(earlier, field) != ref[field] for field in _PAGE_FIELDS[1:]
+            ):
+                kept.append(i)
+                continue
+            refs[point_id] = (i, ref)
+
+        if refs:
+            missing = await self.add_references(client, [ref for _, ref in refs.values()])
+            # Points deleted in the meantime: store these chunks after all.
+            kept.extend(refs[ref["point_id"]][0] for ref in missing)
+            kept.sort()
+        await self.put([rows[i] for i in kept])
+        return kept
+
+    @staticmethod
+    def _ref_payload(ref: ChunkRef) -> Dict[str, Any]:
+        return {"source": ref.source, **{field: getattr(ref, field) for field in _PAGE_FIELDS}}
+
+    async def _sync_payloads(
+        self,
+        client: AsyncQdrantClient,
+        db: AsyncSession,
+        owners: Dict[str, ChunkText],
+        promoted: Optional[Dict[str, ChunkRef]] = None,
+    ) -> None:
+        """Write `source` and `refs` of the points in `owners` from their references."""
+        refs = await get_chunk_refs(db, owners)
+        operations = []
+        for point_id, owner in owners.items():
+            point_refs = refs.get(point_id, [])
+            payload: Dict[str, Any] = {
+                "source": (
+                    [owner.source] + [ref.source for ref in point_refs]
+                    if point_refs
+                    else owner.source
+                ),
+                "refs": [self._ref_payload(ref) for ref in point_refs],
+            }
+            if promoted and point_id in promoted:
+                payload.update(
+                    {field: getattr(promoted[point_id], field) for field in _PAGE_FIELDS}
+                )
+            operations.append(
+                SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id]))
+            )
+        for i in range(0, len(operations), cfg.QDRANT_UPSERT_BATCH_SIZE):
+            await client.batch_update_points(
+                collection_name=cfg.COLLECTION_NAME,
+                update_operations=operations[i : i + cfg.QDRANT_UPSERT_BATCH_SIZE],
+            )
+
+    async def add_references(
+        self, client: AsyncQdrantClient, refs: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Record `refs` (point_id, source and page fields) and update the
+        payloads of their points. Returns the references whose point no
+        longer exists; their chunks have to be indexed themselves.
+        """
+        if not refs:
+            return []
+        async with self.session_factory() as db:
+            owners = await lock_chunk_texts(db, point_ids={ref["point_id"] for ref in refs})
+            added = [ref for ref in refs if ref["point_id"] in owners]
+            await upsert_chunk_refs(db, added)
+            await self._sync_payloads(client, db, owners)
+            await db.commit()
+        return [ref for ref in refs if ref["point_id"] not in owners]
+
+    async def references_of(self, source: str) -> List[Dict[str, Any]]:
+        """References of `source` (point_id, source and page fields)."""
+        async with self.session_factory() as db:
+            refs = await get_refs_of_source(db, source)
+        return [{"point_id": ref.point_id, **self._ref_payload(ref)} for ref in refs]
+
+    async def copy_references(
+        self, client: AsyncQdrantClient, from_source: str, to_source: str
+    ) -> int:
+        """Give `to_source` the same references as `from_source` (an identical file)."""
+        rows = [
+            {**ref, "source": to_source} for ref in await self.references_of(from_source)
+        ]
+        missing = await self.add_references(client, rows)
+        return len(rows) - len(missing)
+
+    async def drop_references(
+        self,
+        client: AsyncQdrantClient,
+        source: str,
+        point_ids: Optional[Iterable[Any]] = None,
+    ) -> int:
+        """
+        Remove `source` from the points it shares with other documents (all
+        of them, or `point_ids`).
+        """
+        ids = None if point_ids is None else [str(point_id) for point_id in point_ids]
+        if ids is not None and not ids:
+            return 0
+        async with self.session_factory() as db:
+            refs = await get_refs_of_source(db, source, ids)
+            if not refs:
+                return 0
+            owners = await lock_chunk_texts(db, point_ids={ref.point_id for ref in refs})
+            await delete_chunk_refs(db, source, ids)
+            await self._sync_payloads(client, db, owners)
+            await db.commit()
+        logger.debug(f"Dropped {len(refs)} shared chunk references of {source}")
+        return len(refs)
+
+    async def remove_owned(
+        self,
+        client: AsyncQdrantClient,
+        source: str,
+        point_ids: Optional[Iterable[Any]] = None,
+    ) -> int:
+        """
+        Remove points owned by `source` (all of them, or `point_ids`). A point
+        that other documents still reference is handed over to the first of
+        them instead of being deleted. Of `point_ids`, those without a stored
+        text (indexed with the text in the payload) are deleted as well.
+        Returns the number of points deleted.
+        """
+        ids = None if point_ids is None else [str(point_id) for point_id in point_ids]
+        if ids is not None and not ids:
+            return 0
+        async with self.session_factory() as db:
+            if ids is None:
+                owned = await lock_chunk_texts(db, source=source)
+                unstored: List[str] = []
+            else:
+                rows = await lock_chunk_texts(db, point_ids=ids)
+                owned = {i: row for i, row in rows.items() if row.source == source}
+                unstored = [i for i in ids if i not in rows]
+            refs = await get_chunk_refs(db, owned)
+            promoted: Dict[str, ChunkRef] = {}
+            for point_id, point_refs in refs.items():
+                heir = point_refs[0]
+                owned[point_id].source = heir.source
+                await db.delete(heir)
+                promoted[point_id] = heir
+            await db.flush()
+            if promoted:
+                await self._sync_payloads(
+                    client, db, {i: owned[i] for i in promoted}, promoted
+                )
+            deleted = [point_id for point_id in owned if point_id not in promoted]
+            removed = deleted + unstored
+            for i in range(0, len(removed), cfg.CHUNK_TEXT_WRITE_BATCH_SIZE):
+                await client.delete(
+                    collection_name=cfg.COLLECTION_NAME,
+                    points_selector=PointIdsList(
+                        points=removed[i : i + cfg.CHUNK_TEXT_WRITE_BATCH_SIZE]
+                    ),
+                )
+            await delete_chunk_texts(db, deleted)
+            await db.commit()
+        if promoted:
+            logger.info(f"Handed {len(promoted)} shared chunks of {source} over to other documents")
+        return len(removed)
+
+
+chunk_text_store = ChunkTextStore()
@@ -0,0 +1,124 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import cfg
+from src.logger import logger
+from src.rag.context_packer import count_tokens
+from src.util import load_embedding_model
+
+# Same sentence boundary as langchain's SemanticChunker, plus blank lines.
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.?!])\s+|\n\s*\n")
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Return (start, end) character offsets of the sentences in `text`."""
+    spans = []
+    start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text):
+        if text[start : match.start()].strip():
+            spans.append((start, match.start()))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
+
+
+class ExtractiveCompressor:
+    """
+    Query-focused extractive compression of retrieved chunks.
+
+    All sentences of all chunks are embedded in one batch and scored by
+    cosine similarity against the query embedding computed during retrieval.
+    For each chunk the top sentences plus their neighbours are kept in their
+    original order. The kept character spans are recorded in the chunk
+    metadata (`compressed_spans`, offsets into `original_text`) so citations
+    still resolve against the full chunk.
+    """
+
+    def __init__(
+        self,
+        top_sentences: int = cfg.COMPRESSION_TOP_SENTENCES,
+        neighbours: int = cfg.COMPRESSION_NEIGHBOURS,
+        min_sentences: int = cfg.COMPRESSION_MIN_SENTENCES,
+    ) -> None:
+        self.top_sentences = top_sentences
+        self.neighbours = neighbours
+        self.min_sentences = min_sentences
+
+    def _keep_indices(self, scores: np.ndarray) -> List[int]:
+        top = np.argsort(-scores)[: self.top_sentences]
+        keep = set()
+        for i in top:
+            for j in range(i - self.neighbours, i + self.neighbours + 1):
+                if 0 <= j < len(scores):
+                    keep.add(j)
+        return sorted(keep)
+
+    def compress(
+        self,
+        query_embedding: Optional[np.ndarray],
+        chunks: List[str],
+        metadata: List[Dict[str, Any]],
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        if query_embedding is None or not chunks:
+            return chunks, metadata
+
+        sentence_spans = [split_sentences(chunk) for chunk in chunks]
+        to_score = [
+            i for i, spans in enumerate(sentence_spans) if len(spans) > self.min_sentences
+        ]
+        if not to_score:
+            return chunks, metadata
+
+        sentences = [
+            chunks[i][start:end] for i in to_score for start, end in sentence_spans[i]
+        ]
+        try:
+            embedding_model, _ = load_embedding_model()
+            vectors = np.array(
+                embedding_model.embed_documents(sentences), dtype=np.float32
+            )
+        except Exception as e:
+            logger.error(f"Sentence embedding for compression failed: {e}")
+            return chunks, metadata
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        scores = (vectors @ query) / norms
+
+        compressed_chunks = list(chunks)
+        compressed_metadata = [dict(meta) for meta in metadata]
+        offset = 0
+        for i in to_score:
+            spans = sentence_spans[i]
+            keep = self._keep_indices(scores[offset : offset + len(spans)])
+            offset += len(spans)
+
+            # Merge adjacent kept sentences into contiguous spans of the original text
+            merged: List[List[int]] = []
+            for idx in keep:
+                start, end = spans[idx]
+                if merged and idx - 1 in keep and merged[-1][1] == spans[idx - 1][1]:
+                    merged[-1][1] = end
+                else:
+                    merged.append([start, end])
+
+            compressed_chunks[i] = " … ".join(
+                chunks[i][start:end].strip() for start, end in merged
+            )
+            compressed_metadata[i]["original_text"] = chunks[i]
+            compressed_metadata[i]["compressed_spans"] = merged
+            compressed_metadata[i]["token_count"] = count_tokens(compressed_chunks[i])
+
+        tokens_before = sum(count_tokens(chunk) for chunk in chunks)
+        tokens_after = sum(count_tokens(chunk) for chunk in compressed_chunks)
+        logger.info(
+            f"Compressed {len(to_score)}/{len(chunks)} chunks: "
+            f"{tokens_before} -> {tokens_after} tokens "
+            f"({tokens_before / max(tokens_after, 1):.2f}x reduction)"
+        )
+        return compressed_chunks, compressed_metadata
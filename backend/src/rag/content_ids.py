@@ -0,0 +1,78 @@
+import hashlib
+import os
+import uuid
+from typing import Union
+
+from src.config import cfg
+from src.logger import logger
+
+# Namespace for all Qdrant point ids derived from document content
+POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "policybot/points")
+
+
+def sha256_file(path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _hash_path(file_name: str) -> str:
+    return os.path.join(cfg.INDEX_STATE_DIR, f"{file_name}.sha256")
+
+
+def record_file_hash(file_name: str, digest: str) -> None:
+    """Store the SHA-256 computed at upload next to the other index state."""
+    os.makedirs(cfg.INDEX_STATE_DIR, exist_ok=True)
+    with open(_hash_path(file_name), "w", encoding="utf-8") as f:
+        f.write(digest)
+
+
+def get_file_hash(file_name: str) -> str:
+    """
+    Return the SHA-256 of an uploaded PDF. Uses the value recorded at upload
+    unless the file is newer than it; files uploaded before hashes were
+    recorded are hashed (and recorded) on first use.
+    """
+    file_path = os.path.join(cfg.DATA_DIR, file_name)
+    hash_path = _hash_path(file_name)
+    try:
+        if os.path.getmtime(hash_path) >= os.path.getmtime(file_path):
+            with open(hash_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+    except OSError:
+        pass
+    digest = sha256_file(file_path)
+    try:
+        record_file_hash(file_name, digest)
+    except OSError as e:
+        logger.warning(f"Could not record file hash for {file_name}: {e}")
+    return digest
+
+
+def clear_file_hash(file_name: str) -> None:
+    try:
+        os.remove(_hash_path(file_name))
+    except FileNotFoundError:
+        pass
+
+
+def chunk_point_id(
+    file_hash: str, chunk_key: Union[int, str], text: str, source: str
+) -> str:
+    """
+    Deterministic point id for a chunk of a document's content. `chunk_key`
+    is the chunk index, or any other key unique within the document. The file
+    name is part of the id so that two files with the same content, indexed
+    independently, never overwrite each other's points.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(
+        uuid.uuid5(POINT_NAMESPACE, f"{source}:{file_hash}:{chunk_key}:{text_hash}")
+    )
+
+
+def copy_point_id(point_id: str, source: str) -> str:
+    """Id of an existing point copied under another file name."""
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{point_id}:{source}"))
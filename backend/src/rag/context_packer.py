@@ -0,0 +1,85 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import cfg
+from src.logger import logger
+from src.rag.minhash import MinHasher
+
+# Tokens per whitespace-separated word; same approximation as
+# PDFProcessor._split_text_by_tokens.
+TOKENS_PER_WORD = 1.33
+
+
+def count_tokens(text: str) -> int:
+    """Fast approximation of the number of LLM tokens in `text`."""
+    return int(math.ceil(len(text.split()) * TOKENS_PER_WORD))
+
+
+class ContextPacker:
+    """
+    Select the context chunks that go into the prompt.
+
+    Chunks are taken in rerank order; a chunk is dropped when it is a
+    near-duplicate (MinHash similarity >= threshold) of a chunk already
+    selected, or when it does not fit in the remaining token budget.
+    Token counts are read from the chunk metadata (`token_count`, stored in
+    the Qdrant payload at ingestion) and only computed when missing.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = cfg.CONTEXT_TOKEN_BUDGET,
+        similarity_threshold: float = cfg.DEDUP_SIMILARITY_THRESHOLD,
+    ) -> None:
+        self.token_budget = token_budget
+        self.similarity_threshold = similarity_threshold
+        self.hasher = MinHasher()
+
+    def pack(
+        self, chunks: List[str], metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        metadata = metadata if metadata is not None else [{} for _ in chunks]
+        selected_chunks: List[str] = []
+        selected_metadata: List[Dict[str, Any]] = []
+        signatures: List[np.ndarray] = []
+        used_tokens = 0
+        duplicates = 0
+        over_budget = 0
+
+        for chunk, meta in zip(chunks, metadata):
+            if not chunk or not chunk.strip():
+                continue
+            tokens = meta.get("token_count") or count_tokens(chunk)
+
+            signature = self.hasher.signature(chunk)
+            if any(
+                MinHasher.similarity(signature, other) >= self.similarity_threshold
+                for other in signatures
+            ):
+                duplicates += 1
+                continue
+
+            if used_tokens + tokens > self.token_budget:
+                if selected_chunks:
+                    over_budget += 1
+                    continue
+                # Never return an empty context: truncate the best chunk instead.
+                words = chunk.split()[: int(self.token_budget / TOKENS_PER_WORD)]
+                chunk = " ".join(words)
+                tokens = count_tokens(chunk)
+                # Callers see the metadata; describe what was actually sent.
+                meta = {**meta, "token_count": tokens, "truncated": True}
+
+            selected_chunks.append(chunk)
+            selected_metadata.append(meta)
+            signatures.append(signature)
+            used_tokens += tokens
+
+        logger.info(
+            f"Packed {len(selected_chunks)}/{len(chunks)} chunks into "
+            f"{used_tokens}/{self.token_budget} tokens "
+            f"({duplicates} near-duplicates, {over_budget} over budget dropped)"
+        )
+        return selected_chunks, selected_metadata
@@ -0,0 +1,96 @@
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from src.config import cfg
+from src.logger import logger
+from src.rag.context_packer import count_tokens
+
+
+def _token_counter(embedding_model) -> Callable[[str], int]:
+    """
+    Use the embedding model's own tokenizer when it is reachable, otherwise
+    fall back to the word-based estimate used elsewhere in the pipeline.
+    """
+    client = getattr(embedding_model, "_client", None) or getattr(
+        embedding_model, "client", None
+    )
+    tokenizer = getattr(client, "tokenizer", None)
+    if tokenizer is None:
+        return count_tokens
+
+    def count(text: str) -> int:
+        return len(tokenizer(text, add_special_tokens=True, truncation=False)["input_ids"])
+
+    return count
+
+
+class EmbeddingEngine:
+    """
+    Batched document embedding for ingestion.
+
+    Texts are sorted by token length and grouped into batches whose padded
+    size (longest text x batch size) stays under `token_budget`, so texts of
+    similar length share a forward pass and little compute is spent on
+    padding. Results are written into a preallocated float32 array in the
+    original order.
+    """
+
+    def __init__(
+        self,
+        embedding_model,
+        device: str = "cpu",
+        token_budget: int = cfg.EMBED_BATCH_TOKEN_BUDGET,
+        max_batch_size: int = cfg.EMBED_MAX_BATCH_SIZE,
+    ) -> None:
+        self.embedding_model = embedding_model
+        self.device = device
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.count_tokens = _token_counter(embedding_model)
+
+    def _build_batches(self, lengths: List[int]) -> List[List[int]]:
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        for i in order:
+            # Sorted ascending, so the current text is the longest in the batch.
+            padded = max(lengths[i], 1) * (len(batch) + 1)
+            if batch and (padded > self.token_budget or len(batch) >= self.max_batch_size):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        if not texts:
+            return None
+        start = time.perf_counter()
+        lengths = [self.count_tokens(text) for text in texts]
+        batches = self._build_batches(lengths)
+
+        embeddings: Optional[np.ndarray] = None
+        for batch in batches:
+            vectors = np.asarray(
+                self.embedding_model.embed_documents([texts[i] for i in batch]),
+                dtype=np.float32,
+            )
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+
+        if self.device == "cuda":
+            import torch
+
+            # Release cached blocks once per document rather than per chunk.
+            torch.cuda.empty_cache()
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Embedded {len(texts)} chunks in {len(batches)} batches "
+            f"in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f} chunks/sec)"
+        )
+        return embeddings
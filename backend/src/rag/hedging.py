@@ -0,0 +1,65 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+
+class HedgeStats:
+    """
+    Process-wide counters for hedged generation, keyed by primary model.
+
+    For every primary model we track how many requests were served, how many
+    of them had to be hedged (first token missed the deadline) and which side
+    won the race. Fallback wins are also counted per fallback model so the
+    win rate can be reported from both perspectives. Requests where every
+    stream failed have no winner and are counted as `failed`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {
+                "requests": 0,
+                "hedged": 0,
+                "primary_wins": 0,
+                "fallback_wins": 0,
+                "won_as_fallback": 0,
+                "failed": 0,
+            }
+        )
+
+    def record(
+        self, primary_model: str, hedged: bool, winner_model: Optional[str]
+    ) -> None:
+        with self._lock:
+            counters = self._counters[primary_model]
+            counters["requests"] += 1
+            counters["hedged"] += int(hedged)
+            if winner_model is None:
+                counters["failed"] += 1
+                return
+            if not hedged:
+                counters["primary_wins"] += 1
+                return
+            if winner_model == primary_model:
+                counters["primary_wins"] += 1
+            else:
+                counters["fallback_wins"] += 1
+                self._counters[winner_model]["won_as_fallback"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            result = {}
+            for model, counters in self._counters.items():
+                requests = counters["requests"]
+                hedged = counters["hedged"]
+                result[model] = {
+                    **counters,
+                    "hedge_rate": hedged / requests if requests else 0.0,
+                    "fallback_win_rate": (
+                        counters["fallback_wins"] / hedged if hedged else 0.0
+                    ),
+                }
+            return result
+
+
+hedge_stats = HedgeStats()
@@ -0,0 +1,423 @@
+import asyncio
+import difflib
+import hashlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import (FieldCondition, Filter, MatchValue,
+                                       PointIdsList, PointStruct, SetPayload,
+                                       SetPayloadOperation)
+
+from src.config import cfg
+from src.logger import logger
+from src.page_text_cache import load_pages
+from src.rag.boilerplate import (Boilerplate, detect_boilerplate,
+                                 sample_page_numbers)
+from src.rag.chunk_store import (ChunkTextStore, chunk_text_store,
+                                  payload_owner)
+from src.rag.content_ids import chunk_point_id, get_file_hash
+from src.rag.context_packer import count_tokens
+from src.rag.minhash import MinHasher
+from src.rag.qdrant_writer import QdrantBatchWriter
+from src.rag.semantic_chunker import SemanticChunker
+from src.util import free_embedding_model, load_embedding_model
+
+
+def page_hash(text: str) -> str:
+    """Hash of a page's text, insensitive to whitespace-only changes."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def _runs(pages: Set[int]) -> List[Tuple[int, int]]:
+    """Group page numbers into inclusive (start, end) runs of consecutive pages."""
+    runs: List[Tuple[int, int]] = []
+    for page in sorted(pages):
+        if runs and page == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], page)
+        else:
+            runs.append((page, page))
+    return runs
+
+
+class IncrementalIndexer:
+    """
+    Updates the index of a PDF that is being replaced by a new version,
+    re-chunking and re-embedding only the regions whose pages changed.
+
+    Pages of both versions are hashed and aligned with difflib. Points lying
+    entirely on unchanged pages keep their vectors; only their page numbers
+    (and file hash) are updated in place. Points touching a changed page are
+    deleted, and the new pages they covered, plus inserted or edited pages,
+    are re-chunked and embedded as contiguous runs.
+
+    An injected Qdrant `client` is used as is and not closed. Chunk texts of
+    new points go to `chunk_store` (the payloads with `chunk_store=None`);
+    kept points keep their ids and so their stored texts. Re-chunked pages
+    have the new version's boilerplate stripped, as IngestionPipeline does.
+    References of this document to points of others (deduplicated chunks)
+    are classified like its own points: those on unchanged pages are kept
+    and moved, the others dropped. New chunks are deduplicated as in
+    IngestionPipeline, and stale points other documents still reference are
+    handed over to them.
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        old_path: str,
+        new_path: str,
+        new_file_hash: str,
+        client: Optional[AsyncQdrantClient] = None,
+        chunk_store: Optional[ChunkTextStore] = chunk_text_store,
+        deduplicate: bool = cfg.INGEST_DEDUP_ENABLED,
+    ) -> None:
+        self.file_name = file_name
+        self.client = client
+        self.chunk_store = chunk_store
+        self.deduplicate = deduplicate and chunk_store is not None
+        self.old_path = old_path
+        self.new_path = new_path
+        self.new_file_hash = new_file_hash
+        self.new_pages: List[str] = []
+        self.boilerplate: Optional[Boilerplate] = None
+        self.report: Dict[str, Any] = {}
+
+    @staticmethod
+    def _span(payload: Dict[str, Any]) -> Tuple[int, int]:
+        # Points indexed before chunks could span pages only have page_number.
+        start = payload.get("page_start") or payload.get("page_number") or 1
+        end = payload.get("page_end") or start
+        return int(start), int(end)
+
+    @classmethod
+    def _moved(cls, payload: Dict[str, Any], mapping: Dict[int, int]) -> Tuple[int, int, int]:
+        """New page_number, page_start and page_end of a chunk on unchanged pages."""
+        start, end = cls._span(payload)
+        page_number = payload.get("page_number") or start
+        return mapping[page_number], mapping[start], mapping[end]
+
+    def _diff(
+        self, old_pages: List[str], new_pages: List[str]
+    ) -> Tuple[Dict[int, int], Set[int], Set[int], Set[int]]:
+        """
+        Return the old->new page mapping of unchanged pages, the changed old
+        pages, the changed new pages, and the old page boundaries (page after
+        which something was inserted) that a chunk must not straddle.
+        """
+        matcher = difflib.SequenceMatcher(
+            None,
+            [page_hash(p) for p in old_pages],
+            [page_hash(p) for p in new_pages],
+            autojunk=False,
+        )
+        mapping: Dict[int, int] = {}
+        changed_old: Set[int] = set()
+        changed_new: Set[int] = set()
+        insert_after: Set[int] = set()
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                for offset in range(i2 - i1):
+                    mapping[i1 + offset + 1] = j1 + offset + 1
+                continue
+            changed_old.update(range(i1 + 1, i2 + 1))
+            changed_new.update(range(j1 + 1, j2 + 1))
+            if tag == "insert":
+                insert_after.add(i1)
+        return mapping, changed_old, changed_new, insert_after
+
+    async def _scroll_points(self, client: AsyncQdrantClient) -> List[Any]:
+        points: List[Any] = []
+        offset = None
+        while True:
+            batch, offset = await client.scroll(
+                collection_name=cfg.COLLECTION_NAME,
+                scroll_filter=Filter(
+                    must=[FieldCondition(key="source", match=MatchValue(value=self.file_name))]
+                ),
+                limit=256,
+                offset=offset,
+                with_payload=["source", "page_number", "page_start", "page_end"],
+                with_vectors=False,
+            )
+            # The filter also matches points this document only references.
+            points.extend(
+                point for point in batch if payload_owner(point.payload or {}) == self.file_name
+            )
+            if offset is None:
+                return points
+
+    def _classify(
+        self,
+        spans: Dict[Any, Tuple[int, int]],
+        mapping: Dict[int, int],
+        changed_old: Set[int],
+        insert_after: Set[int],
+    ) -> Tuple[Set[Any], Set[int]]:
+        """Return the stale ones of the chunks in `spans` (by id) and the dirty old pages."""
+
+        def touches(span: Tuple[int, int], pages: Set[int]) -> bool:
+            return any(page in pages for page in range(span[0], span[1] + 1))
+
+        dirty_old = set(changed_old)
+        stale_ids: Set[Any] = set()
+        for chunk_id, (start, end) in spans.items():
+            if (
+                touches((start, end), dirty_old)
+                or any(start <= boundary < end for boundary in insert_after)
+                or not all(page in mapping for page in range(start, end + 1))
+            ):
+                stale_ids.add(chunk_id)
+
+        # A page shared by a stale and a kept chunk is re-chunked as a whole,
+        # so the kept chunk has to go as well; repeat until nothing changes.
+        while True:
+            for point_id in stale_ids:
+                start, end = spans[point_id]
+                dirty_old.update(range(start, end + 1))
+            newly_stale = {
+                chunk_id
+                for chunk_id, span in spans.items()
+                if chunk_id not in stale_ids and touches(span, dirty_old)
+            }
+            if not newly_stale:
+                break
+            stale_ids |= newly_stale
+        return stale_ids, dirty_old
+
+    def _chunk_runs(
+        self, runs: List[Tuple[int, int]]
+    ) -> Tuple[List[Document], np.ndarray]:
+        embedding_model, device = load_embedding_model()
+        try:
+            chunker = SemanticChunker(embedding_model, device)
+            chunks: List[Document] = []
+            vectors: List[np.ndarray] = []
+            for start, end in runs:
+                docs = [
+                    Document(
+                        page_content=(
+                            self.boilerplate.strip(self.new_pages[page - 1])
+                            if self.boilerplate
+                            else self.new_pages[page - 1]
+                        ),
+                        metadata={"page_number": page, "source": self.file_name},
+                    )
+                    for page in range(start, end + 1)
+                ]
+                run_chunks, run_vectors = chunker.split_documents(docs)
+                for i, chunk in enumerate(run_chunks):
+                    chunk.metadata["chunk_key"] = f"p{start}.{i}"
+                chunks.extend(run_chunks)
+                if run_vectors is not None:
+                    vectors.append(run_vectors)
+            return chunks, (np.concatenate(vectors) if vectors else np.empty((0, 0)))
+        finally:
+            free_embedding_model(embedding_model, device)
+
+    async def run(self) -> Dict[str, Any]:
+        old_hash = await asyncio.to_thread(get_file_hash, self.file_name)
+        old_pages, self.new_pages = await asyncio.gather(
+            asyncio.to_thread(load_pages, self.old_path, old_hash),
+            asyncio.to_thread(load_pages, self.new_path, self.new_file_hash),
+        )
+        mapping, changed_old, changed_new, insert_after = self._diff(
+            old_pages, self.new_pages
+        )
+        if cfg.BOILERPLATE_ENABLED:
+            self.boilerplate = detect_boilerplate(
+                [self.new_pages[page - 1] for page in sample_page_numbers(len(self.new_pages))]
+            )
+
+        client = self.client or AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
+        try:
+            points = await self._scroll_points(client)
+            refs = (
+                await self.chunk_store.references_of(self.file_name)
+                if self.chunk_store is not None
+                else []
+            )
+            # A reference is this document's chunk too; it is never the id of
+            # one of its own points.
+            spans = {point.id: self._span(point.payload or {}) for point in points}
+            spans.update({ref["point_id"]: self._span(ref) for ref in refs})
+            stale_ids, dirty_old = self._classify(spans, mapping, changed_old, insert_after)
+            kept = [point for point in points if point.id not in stale_ids]
+            stale = [point for point in points if point.id in stale_ids]
+            kept_refs = [ref for ref in refs if ref["point_id"] not in stale_ids]
+            stale_refs = [ref for ref in refs if ref["point_id"] in stale_ids]
+            dirty_new = set(changed_new) | {
+                mapping[page] for page in dirty_old if page in mapping
+            }
+            # New pages no kept chunk covers (e.g. pages that had no text).
+            covered = set()
+            for chunk_id, (start, end) in spans.items():
+                if chunk_id not in stale_ids:
+                    covered.update(mapping[page] for page in range(start, end + 1))
+            dirty_new |= set(range(1, len(self.new_pages) + 1)) - covered - dirty_new
+            runs = _runs(dirty_new)
+            logger.info(
+                f"Incremental re-index of {self.file_name}: {len(changed_new)} changed pages, "
+                f"{len(kept)} chunks and {len(kept_refs)} references kept, {len(stale)} "
+                f"and {len(stale_refs)} stale, re-chunking runs {runs}"
+            )
+
+            chunks, vectors = await asyncio.to_thread(self._chunk_runs, runs)
+
+            writer = QdrantBatchWriter(client)
+            if stale and self.chunk_store is not None:
+                await self.chunk_store.remove_owned(
+                    client, self.file_name, [point.id for point in stale]
+                )
+            elif stale:
+                await client.delete(
+                    collection_name=cfg.COLLECTION_NAME,
+                    points_selector=PointIdsList(points=[point.id for point in stale]),
+                )
+            if stale_refs:
+                await self.chunk_store.drop_references(
+                    client, self.file_name, [ref["point_id"] for ref in stale_refs]
+                )
+            new_points: List[PointStruct] = []
+            if chunks:
+                new_points = await self._new_points(client, chunks, vectors)
+                if new_points:
+                    await writer.write(new_points)
+            await self._update_kept(client, kept, mapping)
+            await self._update_kept_refs(client, kept_refs, mapping)
+            await writer.barrier()
+        finally:
+            if client is not self.client:
+                await client.close()
+
+        reused = len(kept) + len(kept_refs)
+        total_after = reused + len(chunks)
+        self.report = {
+            "pages_before": len(old_pages),
+            "pages_after": len(self.new_pages),
+            "pages_changed": len(changed_new),
+            "pages_rechunked": len(dirty_new),
+            "chunks_kept": reused,
+            "chunks_deleted": len(stale) + len(stale_refs),
+            "chunks_embedded": len(chunks),
+            # Chunks of other documents' points, among the kept and new chunks
+            "references_kept": len(kept_refs),
+            "chunks_deduplicated": len(chunks) - len(new_points),
+            "work_avoided_pct": round(100.0 * reused / total_after, 1) if total_after else 0.0,
+            "changed_fraction": (
+                len(dirty_new) / len(self.new_pages) if self.new_pages else 1.0
+            ),
+            "boilerplate_lines_removed": self.boilerplate.lines_removed if self.boilerplate else 0,
+            "boilerplate_bytes_removed": self.boilerplate.bytes_removed if self.boilerplate else 0,
+        }
+        logger.info(f"Incremental re-index report for {self.file_name}: {self.report}")
+        return self.report
+
+    async def _new_points(
+        self, client: AsyncQdrantClient, chunks: List[Document], vectors: np.ndarray
+    ) -> List[PointStruct]:
+        """
+        Points of re-chunked regions still to be written; their texts are
+        stored first, and near-duplicates of indexed chunks become references.
+        """
+        points = []
+        for i, chunk in enumerate(chunks):
+            payload = {
+                "source": self.file_name,
+                "file_hash": self.new_file_hash,
+                "page_number": chunk.metadata.get("page_number"),
+                "page_start": chunk.metadata.get("page_start"),
+                "page_end": chunk.metadata.get("page_end"),
+                "token_count": count_tokens(chunk.page_content),
+            }
+            if self.chunk_store is None:
+                payload["text"] = chunk.page_content
+            points.append(
+                PointStruct(
+                    id=chunk_point_id(
+                        self.new_file_hash,
+                        chunk.metadata["chunk_key"],
+                        chunk.page_content,
+                        self.file_name,
+                    ),
+                    vector=vectors[i].tolist(),
+                    payload=payload,
+                )
+            )
+        if self.chunk_store is None:
+            return points
+        rows = [
+            {
+                "point_id": point.id,
+                "source": self.file_name,
+                "text": chunk.page_content,
+                "token_count": point.payload["token_count"],
+            }
+            for point, chunk in zip(points, chunks)
+        ]
+        if not self.deduplicate:
+            await self.chunk_store.put(rows)
+            return points
+
+        hasher = MinHasher()
+        signatures = await asyncio.to_thread(
+            lambda: [hasher.signature(chunk.page_content) for chunk in chunks]
+        )
+        kept = await self.chunk_store.put_deduplicated(
+            client, rows, signatures, [point.payload for point in points]
+        )
+        return [points[i] for i in kept]
+
+    async def _update_kept(
+        self, client: AsyncQdrantClient, kept: List[Any], mapping: Dict[int, int]
+    ) -> None:
+        """Move kept points to their new page numbers and the new file hash."""
+        by_payload: Dict[Tuple[int, int, int], List[Any]] = defaultdict(list)
+        for point in kept:
+            by_payload[self._moved(point.payload or {}, mapping)].append(point.id)
+
+        operations = [
+            SetPayloadOperation(
+                set_payload=SetPayload(
+                    payload={
+                        "page_number": page_number,
+                        "page_start": start,
+                        "page_end": end,
+                        "file_hash": self.new_file_hash,
+                    },
+                    points=ids,
+                )
+            )
+            for (page_number, start, end), ids in by_payload.items()
+        ]
+        for i in range(0, len(operations), cfg.QDRANT_UPSERT_BATCH_SIZE):
+            await client.batch_update_points(
+                collection_name=cfg.COLLECTION_NAME,
+                update_operations=operations[i : i + cfg.QDRANT_UPSERT_BATCH_SIZE],
+            )
+
+    async def _update_kept_refs(
+        self, client: AsyncQdrantClient, kept_refs: List[Dict[str, Any]], mapping: Dict[int, int]
+    ) -> None:
+        """Move kept references to their new page numbers and the new file hash."""
+        if not kept_refs:
+            return
+        refs = []
+        for ref in kept_refs:
+            page_number, start, end = self._moved(ref, mapping)
+            refs.append(
+                {
+                    **ref,
+                    "file_hash": self.new_file_hash,
+                    "page_number": page_number,
+                    "page_start": start,
+                    "page_end": end,
+                }
+            )
+        missing = await self.chunk_store.add_references(client, refs)
+        if missing:
+            logger.warning(
+                f"{len(missing)} shared chunks of {self.file_name} were deleted during re-indexing"
+            )
@@ -0,0 +1,71 @@
+import json
+import os
+from typing import Any, Dict, Optional
+
+from src.config import cfg
+from src.logger import logger
+
+
+class IngestionCheckpoint:
+    """
+    On-disk record of how far the ingestion of a PDF has been committed to
+    Qdrant: pages fully processed, chunks written, and the sentences of the
+    unfinished chunk carried over to the next page batch.
+
+    The checkpoint is tied to the file (size and mtime) and to the chunking
+    configuration; if either changes it is treated as stale, because
+    the chunk boundaries and point ids of a rerun would no longer line up.
+    """
+
+    def __init__(self, file_name: str, state_dir: str = cfg.INDEX_STATE_DIR) -> None:
+        self.file_name = file_name
+        self.path = os.path.join(state_dir, f"{file_name}.json")
+
+    def _fingerprint(self) -> Dict[str, Any]:
+        stat = os.stat(os.path.join(cfg.DATA_DIR, self.file_name))
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "embedding_model": cfg.EMBEDDING_MODEL_NAME,
+            "page_batch_size": cfg.INGEST_PAGE_BATCH_SIZE,
+            "breakpoint": [cfg.BREAKPOINT_THRESHOLD_TYPE, cfg.BREAKPOINT_THRESHOLD_AMOUNT],
+            "sentence_buffer": cfg.CHUNK_SENTENCE_BUFFER,
+            "vector_mode": cfg.CHUNK_VECTOR_MODE,
+        }
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Return the saved state, or None if there is none or it is stale."""
+        if not self.exists():
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("fingerprint") != self._fingerprint():
+                logger.warning(f"Ignoring stale ingestion checkpoint for {self.file_name}")
+                return None
+            return state
+        except Exception as e:
+            logger.error(f"Failed to read ingestion checkpoint for {self.file_name}: {e}")
+            return None
+
+    def save(self, pages_done: int, chunks_done: int, tail: list) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        state = {
+            "fingerprint": self._fingerprint(),
+            "pages_done": pages_done,
+            "chunks_done": chunks_done,
+            "tail": tail,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
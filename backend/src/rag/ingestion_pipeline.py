@@ -0,0 +1,592 @@
+import asyncio
+import os
+from collections import deque
+from typing import (Any, AsyncGenerator, Awaitable, Callable, Deque, Dict,
+                    List, Optional, Tuple)
+
+import numpy as np
+from langchain_core.documents import Document
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import (Distance, PayloadSchemaType,
+                                       PointStruct, VectorParams)
+
+from src.config import cfg
+from src.logger import logger
+from src.page_text_cache import PageTextWriter, page_text_cache
+from src.pdf_extractor import (extract_page_range, get_extraction_pool,
+                               page_count)
+from src.rag.boilerplate import (Boilerplate, detect_boilerplate,
+                                 sample_page_numbers)
+from src.rag.chunk_store import ChunkTextStore, chunk_text_store
+from src.rag.content_ids import chunk_point_id, get_file_hash
+from src.rag.context_packer import count_tokens
+from src.rag.embedding_engine import EmbeddingEngine
+from src.rag.ingestion_checkpoint import IngestionCheckpoint
+from src.rag.minhash import MinHasher
+from src.rag.qdrant_writer import QdrantBatchWriter
+from src.rag.semantic_chunker import SemanticChunker
+from src.util import free_embedding_model, load_embedding_model
+
+# Marks the end of a stage's output on its queue
+_DONE = object()
+
+
+class IngestionPipeline:
+    """
+    Streaming ingestion of one PDF into Qdrant.
+
+    Extraction, chunking, embedding and upserting run as concurrent stages
+    connected by bounded asyncio queues that carry page or chunk batches, so
+    memory is bounded by the queue sizes rather than by the document length
+    and the CPU-bound stages keep working while Qdrant I/O is in flight.
+
+    The chunk stage carries the last (possibly unfinished) chunk of every
+    page batch over to the next one, so chunks still span page boundaries.
+    Breakpoint thresholds are computed per page batch rather than over the
+    whole document.
+
+    Each chunk batch carries a checkpoint mark (pages done, chunks done and
+    the carried-over sentences). Once a batch and all batches before it are
+    committed, the mark is saved to the IngestionCheckpoint, and a rerun
+    resumes after the last committed page batch instead of re-embedding.
+    Point ids are derived from the file name and SHA-256, the chunk index
+    and the chunk text, so replaying a batch overwrites rather than duplicates.
+
+    `run()` yields human-readable progress messages for the SSE stream. Page
+    texts are written to the page text cache as they are extracted rather
+    than kept, and the chunk stage is fed from there, so extraction runs at
+    full speed instead of at the pace of chunking and embedding. The
+    document summary reads the texts back from the cache too, and a rerun
+    for the same content does instead of parsing the PDF again. `extracted`
+    is set once the cache is complete, so the summary can start while
+    chunks are still being embedded. If the cache cannot be written, pages
+    are handed to the chunk stage directly.
+
+    Chunk texts go to the `chunk_store` and are written before their points;
+    with `chunk_store=None` they are kept in the point payloads instead.
+
+    Before chunking, header and footer lines repeated across the document
+    are stripped; they are detected once from a fixed sample of pages, so a
+    resumed run strips the same lines. With a chunk store, a chunk that is a
+    near-duplicate of an indexed chunk of another document is stored as a
+    reference to that point; repeats within this document are kept, so
+    each stays citable at its page. What was removed is counted in
+    `removed`.
+
+    A Qdrant client and a loaded `(model, device)` embedder can be passed in
+    to share them between pipelines; they are then neither closed nor freed.
+    """
+
+    STAGES = ("extract", "chunk", "embed", "store")
+
+    def __init__(
+        self,
+        file_name: str,
+        checkpoint: Optional[IngestionCheckpoint] = None,
+        page_batch_size: int = cfg.INGEST_PAGE_BATCH_SIZE,
+        queue_size: int = cfg.INGEST_QUEUE_SIZE,
+        client: Optional[AsyncQdrantClient] = None,
+        embedder: Optional[Tuple[Any, str]] = None,
+        chunk_store: Optional[ChunkTextStore] = chunk_text_store,
+        strip_boilerplate: bool = cfg.BOILERPLATE_ENABLED,
+        deduplicate: bool = cfg.INGEST_DEDUP_ENABLED,
+    ) -> None:
+        self.file_name = file_name
+        self.client = client
+        self.embedder = embedder
+        self.chunk_store = chunk_store
+        self.strip_boilerplate = strip_boilerplate
+        self.deduplicate = deduplicate and chunk_store is not None
+        self.boilerplate: Optional[Boilerplate] = None
+        self.hasher = MinHasher()
+        self.removed: Dict[str, int] = {
+            "boilerplate_lines": 0,
+            "boilerplate_bytes": 0,
+            "duplicate_chunks": 0,
+            "duplicate_bytes": 0,
+        }
+        self.checkpoint = checkpoint or IngestionCheckpoint(file_name)
+        self.page_batch_size = page_batch_size
+        self.queue_size = queue_size
+        # Whether any extracted page has text; the texts themselves are only
+        # in the text cache, so memory does not grow with the document.
+        self.has_text = False
+        self._cache_writer: Optional[PageTextWriter] = None
+        self.extracted = asyncio.Event()
+        # Set whenever more pages are extracted, for the stage feeding chunking
+        self._spooled = asyncio.Event()
+        self.total_pages = 0
+        self.progress: Dict[str, int] = {stage: 0 for stage in self.STAGES}
+        self.error: Optional[str] = None
+        self.file_hash = ""
+        self._events: asyncio.Queue = asyncio.Queue()
+        # Resume position, filled from the checkpoint in run()
+        self._start_page = 0
+        self._start_chunk = 0
+        self._start_tail: List[Tuple[str, int]] = []
+
+    @property
+    def resumed_pages(self) -> int:
+        """Pages already committed by an earlier run."""
+        return self._start_page
+
+    @property
+    def resumed_chunks(self) -> int:
+        return self._start_chunk
+
+    def _report(self, stage: str, count: int) -> None:
+        self.progress[stage] += count
+        self._events.put_nowait(stage)
+
+    def _progress_message(self) -> str:
+        return (
+            f"Progress: extracted {self.progress['extract']}/{self.total_pages} pages, "
+            f"chunked {self.progress['chunk']}, embedded {self.progress['embed']}, "
+            f"stored {self.progress['store']} chunks"
+        )
+
+    # --- stages -----------------------------------------------------------
+
+    def _pages(self, texts: List[str], start: int) -> List[Document]:
+        return [
+            Document(
+                page_content=text,
+                metadata={"page_number": start + i + 1, "source": self.file_name},
+            )
+            for i, text in enumerate(texts)
+        ]
+
+    async def _read_cached(self, start: int, end: int) -> List[str]:
+        texts = await asyncio.to_thread(page_text_cache.read_range, self.file_hash, start, end)
+        if texts is None or len(texts) != end - start:
+            raise RuntimeError(f"Text cache of {self.file_name} became unreadable")
+        return texts
+
+    async def _extract(self, out: asyncio.Queue) -> None:
+        file_path = os.path.join(cfg.DATA_DIR, self.file_name)
+        cached_pages = await asyncio.to_thread(page_text_cache.page_count, self.file_hash)
+        if cached_pages is not None:
+            # Extracted before (e.g. the embeddings were dropped): no parsing.
+            self.total_pages = cached_pages
+            self.has_text = await asyncio.to_thread(self._cached_has_text)
+            self._report("extract", cached_pages)
+            self.extracted.set()
+            await self._feed(out, self._read_cached)
+            return
+
+        self.total_pages = await asyncio.to_thread(page_count, file_path)
+        # Pages go straight to the text cache file instead of staying in memory.
+        try:
+            self._cache_writer = await asyncio.to_thread(page_text_cache.writer, self.file_hash)
+        except Exception as e:
+            logger.warning(f"Failed to cache extracted text of {self.file_name}: {e}")
+
+        if self._cache_writer is None:
+            # Nothing to spool to: extraction goes at the pace of chunking.
+            async for start, texts in self._extracted_batches(file_path):
+                self._note_extracted(texts)
+                # Pages committed by an earlier run are not chunked again.
+                if start >= self._start_page:
+                    await out.put(self._pages(texts, start))
+            self.extracted.set()
+            await out.put(_DONE)
+            return
+
+        writer = self._cache_writer
+        feed = asyncio.create_task(
+            self._feed(out, lambda start, end: asyncio.to_thread(writer.read, start, end))
+        )
+        try:
+            async for start, texts in self._extracted_batches(file_path):
+                await asyncio.to_thread(writer.add, texts)
+                self._note_extracted(texts)
+                if feed.done():
+                    feed.result()
+            try:
+                await asyncio.to_thread(writer.commit)
+                self._cache_writer = None
+            except Exception as e:
+                # The feed still reads the spooled pages; run() removes them.
+                logger.warning(f"Failed to cache extracted text of {self.file_name}: {e}")
+            self.extracted.set()
+            await feed
+        finally:
+            feed.cancel()
+            await asyncio.gather(feed, return_exceptions=True)
+
+    async def _extracted_batches(
+        self, file_path: str
+    ) -> AsyncGenerator[Tuple[int, List[str]], None]:
+        """Page batches of the PDF as (start, texts), in page order."""
+        starts = range(0, self.total_pages, self.page_batch_size)
+        if cfg.EXTRACT_WORKERS > 1 and self.total_pages >= cfg.EXTRACT_PARALLEL_MIN_PAGES:
+            # Keep up to EXTRACT_WORKERS page batches in flight in the process
+            # pool and hand them on in page order.
+            loop = asyncio.get_running_loop()
+            pool = get_extraction_pool()
+            in_flight: deque = deque()
+            for start in starts:
+                end = min(start + self.page_batch_size, self.total_pages)
+                in_flight.append(
+                    (start, loop.run_in_executor(pool, extract_page_range, file_path, start, end))
+                )
+                if len(in_flight) >= cfg.EXTRACT_WORKERS:
+                    start, texts = in_flight.popleft()
+                    yield start, await texts
+            while in_flight:
+                start, texts = in_flight.popleft()
+                yield start, await texts
+        else:
+            for start in starts:
+                end = min(start + self.page_batch_size, self.total_pages)
+                yield start, await asyncio.to_thread(extract_page_range, file_path, start, end)
+
+    def _note_extracted(self, texts: List[str]) -> None:
+        self.has_text = self.has_text or any(text.strip() for text in texts)
+        self._spooled.set()
+        self._report("extract", len(texts))
+
+    def _cached_has_text(self) -> bool:
+        for start in range(0, self.total_pages, self.page_batch_size):
+            texts = page_text_cache.read_range(
+                self.file_hash, start, start + self.page_batch_size
+            )
+            if texts and any(text.strip() for text in texts):
+                return True
+        return False
+
+    async def _feed(
+        self, out: asyncio.Queue, read: Callable[[int, int], Awaitable[List[str]]]
+    ) -> None:
+        """Hand page batches to the chunk stage once they are extracted."""
+        for start in range(0, self.total_pages, self.page_batch_size):
+            # Pages committed by an earlier run are not chunked again.
+            if start < self._start_page:
+                continue
+            end = min(start + self.page_batch_size, self.total_pages)
+            while self.progress["extract"] < end:
+                self._spooled.clear()
+                await self._spooled.wait()
+            await out.put(self._pages(await read(start, end), start))
+        await out.put(_DONE)
+
+    def _chunk_batch(
+        self,
+        chunker: SemanticChunker,
+        sentences: List[Tuple[str, int]],
+        final: bool,
+    ) -> Tuple[List[Document], Optional[np.ndarray], List[Tuple[str, int]]]:
+        chunks, spans, sentence_vectors = chunker.chunk_sentences(
+            sentences, {"source": self.file_name}
+        )
+        tail: List[Tuple[str, int]] = []
+        if not final and chunks:
+            # The last chunk may continue on the next pages; re-chunk it then.
+            tail = sentences[spans[-1][0] :]
+            chunks, spans = chunks[:-1], spans[:-1]
+        vectors = None
+        if chunks and chunker.vector_mode == "mean":
+            vectors = chunker.mean_vectors(sentence_vectors, spans)
+        return chunks, vectors, tail
+
+    async def _chunk(
+        self, chunker: SemanticChunker, inp: asyncio.Queue, out: asyncio.Queue
+    ) -> None:
+        tail = list(self._start_tail)
+        chunk_index = self._start_chunk
+        while True:
+            batch = await inp.get()
+            final = batch is _DONE
+            if not final and self.boilerplate:
+                batch = self.boilerplate.strip_pages(batch)
+            sentences = tail + ([] if final else chunker.sentences(batch))
+            chunks: List[Document] = []
+            vectors = None
+            if sentences:
+                chunks, vectors, tail = await asyncio.to_thread(
+                    self._chunk_batch, chunker, sentences, final
+                )
+            for chunk in chunks:
+                chunk.metadata["chunk_index"] = chunk_index
+                chunk_index += 1
+            mark = {
+                "pages_done": (
+                    self.total_pages if final else batch[-1].metadata["page_number"]
+                ),
+                "chunks_done": chunk_index,
+                "tail": [list(sentence) for sentence in tail],
+            }
+            # Sent even without chunks so the checkpoint can advance.
+            await out.put((chunks, vectors, mark))
+            self._report("chunk", len(chunks))
+            if final:
+                break
+        await out.put(_DONE)
+
+    async def _embed(
+        self, engine: EmbeddingEngine, inp: asyncio.Queue, out: asyncio.Queue
+    ) -> None:
+        while True:
+            item = await inp.get()
+            if item is _DONE:
+                break
+            chunks, vectors, mark = item
+            if chunks and vectors is None:
+                vectors = await asyncio.to_thread(
+                    engine.embed, [chunk.page_content for chunk in chunks]
+                )
+                if vectors is None:
+                    raise RuntimeError("Failed to generate embeddings.")
+            await out.put((chunks, vectors, mark))
+            self._report("embed", len(chunks))
+        await out.put(_DONE)
+
+    def _points(self, chunks: List[Document], vectors: np.ndarray) -> List[PointStruct]:
+        points = []
+        for i, chunk in enumerate(chunks):
+            payload = {
+                "source": self.file_name,
+                "file_hash": self.file_hash,
+                "page_number": chunk.metadata.get("page_number"),
+                "page_start": chunk.metadata.get("page_start"),
+                "page_end": chunk.metadata.get("page_end"),
+                "token_count": count_tokens(chunk.page_content),
+            }
+            if self.chunk_store is None:
+                payload["text"] = chunk.page_content
+            points.append(
+                PointStruct(
+                    id=chunk_point_id(
+                        self.file_hash,
+                        chunk.metadata["chunk_index"],
+                        chunk.page_content,
+                        self.file_name,
+                    ),
+                    vector=vectors[i].tolist(),
+                    payload=payload,
+                )
+            )
+        return points
+
+    async def _commit(self, units: Deque[Tuple[asyncio.Task, Dict[str, Any]]]) -> None:
+        """Wait for the oldest write and checkpoint its mark."""
+        task, mark = units.popleft()
+        await task
+        await asyncio.to_thread(
+            self.checkpoint.save, mark["pages_done"], mark["chunks_done"], mark["tail"]
+        )
+
+    async def _store(self, inp: asyncio.Queue) -> None:
+        client = self.client or AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
+        writer = QdrantBatchWriter(client)
+        collection_ready = False
+        # Writes in flight, in order, with the checkpoint mark each one completes
+        units: Deque[Tuple[asyncio.Task, Dict[str, Any]]] = deque()
+        try:
+            while True:
+                item = await inp.get()
+                if item is _DONE:
+                    break
+                chunks, vectors, mark = item
+                if chunks and not collection_ready:
+                    await self._ensure_collection(client, vectors.shape[1])
+                    collection_ready = True
+                task = asyncio.create_task(self._write(writer, chunks, vectors))
+                units.append((task, mark))
+                # Checkpoint the committed prefix; bound the writes in flight.
+                while units and (units[0][0].done() or len(units) > cfg.QDRANT_UPSERT_CONCURRENCY):
+                    await self._commit(units)
+            while units:
+                await self._commit(units)
+            await writer.barrier()
+        finally:
+            for task, _ in units:
+                task.cancel()
+            if client is not self.client:
+                await client.close()
+
+    async def _write(
+        self, writer: QdrantBatchWriter, chunks: List[Document], vectors: np.ndarray
+    ) -> None:
+        if not chunks:
+            return
+        points = self._points(chunks, vectors)
+        if self.chunk_store is not None:
+            points = await self._store_texts(writer.client, points, chunks)
+        if points:
+            await writer.write(points)
+        self._report("store", len(chunks))
+
+    def _signatures(self, chunks: List[Document]) -> List[np.ndarray]:
+        return [self.hasher.signature(chunk.page_content) for chunk in chunks]
+
+    async def _store_texts(
+        self, client: AsyncQdrantClient, points: List[PointStruct], chunks: List[Document]
+    ) -> List[PointStruct]:
+        """
+        Store the texts of `points` and return the points still to be
+        written: near-duplicates of indexed chunks become references instead.
+        """
+        rows = [
+            {
+                "point_id": point.id,
+                "source": self.file_name,
+                "text": chunk.page_content,
+                "token_count": point.payload["token_count"],
+            }
+            for point, chunk in zip(points, chunks)
+        ]
+        if not self.deduplicate:
+            await self.chunk_store.put(rows)
+            return points
+
+        signatures = await asyncio.to_thread(self._signatures, chunks)
+        kept = await self.chunk_store.put_deduplicated(
+            client, rows, signatures, [point.payload for point in points]
+        )
+        stored = set(kept)
+        for i, row in enumerate(rows):
+            if i not in stored:
+                self.removed["duplicate_chunks"] += 1
+                self.removed["duplicate_bytes"] += len(row["text"].encode("utf-8"))
+        return [points[i] for i in kept]
+
+    async def _detect_boilerplate(self) -> Boilerplate:
+        file_path = os.path.join(cfg.DATA_DIR, self.file_name)
+
+        def sample() -> List[str]:
+            texts = []
+            for page in sample_page_numbers(page_count(file_path)):
+                text = page_text_cache.read_page(self.file_hash, page)
+                if text is None:
+                    text = extract_page_range(file_path, page - 1, page)[0]
+                texts.append(text)
+            return texts
+
+        try:
+            boilerplate = detect_boilerplate(await asyncio.to_thread(sample))
+        except Exception as e:
+            # Unreadable pages fail the extract stage, which reports the error.
+            logger.warning(f"Could not sample pages of {self.file_name} for boilerplate: {e}")
+            return Boilerplate(set(), set())
+        if boilerplate:
+            logger.info(
+                f"Stripping {len(boilerplate.headers)} header and "
+                f"{len(boilerplate.footers)} footer lines from {self.file_name}"
+            )
+        return boilerplate
+
+    @staticmethod
+    async def _ensure_collection(client: AsyncQdrantClient, vector_size: int) -> None:
+        try:
+            await client.get_collection(cfg.COLLECTION_NAME)
+            logger.info(f"Collection {cfg.COLLECTION_NAME} already exists")
+        except Exception:
+            await client.create_collection(
+                collection_name=cfg.COLLECTION_NAME,
+                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+            )
+            # Duplicate detection looks points up by content hash.
+            await client.create_payload_index(
+                collection_name=cfg.COLLECTION_NAME,
+                field_name="file_hash",
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
+            logger.info(f"Created new collection {cfg.COLLECTION_NAME}")
+
+    # --- driver -----------------------------------------------------------
+
+    async def run(self) -> AsyncGenerator[str, None]:
+        logger.info(f"Starting ingestion pipeline for {self.file_name}")
+        self.file_hash = await asyncio.to_thread(get_file_hash, self.file_name)
+        state = await asyncio.to_thread(self.checkpoint.load)
+        if state is not None:
+            self._start_page = state["pages_done"]
+            self._start_chunk = state["chunks_done"]
+            self._start_tail = [tuple(sentence) for sentence in state["tail"]]
+            for stage in ("chunk", "embed", "store"):
+                self.progress[stage] = self._start_chunk
+            yield (
+                f"Resuming after page {self._start_page} "
+                f"({self._start_chunk} chunks already stored)..."
+            )
+        else:
+            await asyncio.to_thread(self.checkpoint.save, 0, 0, [])
+
+        if self.embedder is not None:
+            embedding_model, device = self.embedder
+        else:
+            embedding_model, device = await asyncio.to_thread(load_embedding_model)
+        chunker = SemanticChunker(embedding_model, device)
+        engine = EmbeddingEngine(embedding_model, device)
+        if self.strip_boilerplate:
+            self.boilerplate = await self._detect_boilerplate()
+
+        pages_q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        chunks_q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        vectors_q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        tasks = [
+            asyncio.create_task(self._extract(pages_q)),
+            asyncio.create_task(self._chunk(chunker, pages_q, chunks_q)),
+            asyncio.create_task(self._embed(engine, chunks_q, vectors_q)),
+            asyncio.create_task(self._store(vectors_q)),
+        ]
+        # A failing stage fails the gather; the others are cancelled below.
+        stages_done = asyncio.ensure_future(asyncio.gather(*tasks))
+
+        event: Optional[asyncio.Future] = None
+        try:
+            while not stages_done.done():
+                event = asyncio.ensure_future(self._events.get())
+                await asyncio.wait(
+                    {event, stages_done}, return_when=asyncio.FIRST_COMPLETED
+                )
+                progressed = event.done()
+                if not progressed:
+                    event.cancel()
+                # Coalesce bursts of stage events into a single message.
+                while not self._events.empty():
+                    self._events.get_nowait()
+                    progressed = True
+                if progressed:
+                    yield self._progress_message()
+            stages_done.result()
+        except Exception as e:
+            logger.error(f"Ingestion pipeline failed for {self.file_name}: {e}")
+            self.error = str(e) or type(e).__name__
+        finally:
+            # Also reached when the consumer cancels us mid-wait
+            if event is not None:
+                event.cancel()
+            for task in tasks:
+                task.cancel()
+            # Includes `stages_done` so its error is retrieved when cancelled.
+            await asyncio.gather(stages_done, *tasks, return_exceptions=True)
+            if self._cache_writer is not None:
+                # Extraction did not finish; leave no partial cache file behind.
+                await asyncio.to_thread(self._cache_writer.abort)
+                self._cache_writer = None
+            if self.embedder is None:
+                free_embedding_model(embedding_model, device)
+
+        if self.error is None and self.progress["store"] == 0:
+            await asyncio.to_thread(self.checkpoint.clear)
+            self.error = "No text found in PDF."
+        if self.error is None:
+            # Everything is visible in Qdrant; nothing left to resume.
+            await asyncio.to_thread(self.checkpoint.clear)
+            logger.info(
+                f"Ingested {self.file_name}: {self.total_pages} pages, "
+                f"{self.progress['store']} chunks"
+            )
+            if self.boilerplate:
+                self.removed["boilerplate_lines"] = self.boilerplate.lines_removed
+                self.removed["boilerplate_bytes"] = self.boilerplate.bytes_removed
+            if any(self.removed.values()):
+                logger.info(f"Removed from {self.file_name}: {self.removed}")
+                yield (
+                    f"Removed {self.removed['boilerplate_lines']} repeated header/footer "
+                    f"lines ({self.removed['boilerplate_bytes']} bytes) and "
+                    f"{self.removed['duplicate_chunks']} near-duplicate chunks "
+                    f"({self.removed['duplicate_bytes']} bytes)."
+                )
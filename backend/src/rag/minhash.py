@@ -0,0 +1,80 @@
+import hashlib
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+from src.config import cfg
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _shingles(text: str, size: int) -> List[bytes]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words).encode("utf-8")]
+    return [
+        " ".join(words[i : i + size]).encode("utf-8")
+        for i in range(len(words) - size + 1)
+    ]
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles.
+
+    Hash functions are (a * x + b) mod p with a fixed seed, so signatures
+    are stable across processes and can be persisted.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = cfg.MINHASH_PERMUTATIONS,
+        shingle_size: int = cfg.SHINGLE_SIZE,
+        seed: int = 1,
+    ) -> None:
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Keep a < 2^31 and shingle hashes < 2^32 so a * x fits in uint64.
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [zlib.crc32(s) for s in _shingles(text, self.shingle_size)],
+            dtype=np.uint64,
+        )
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    @staticmethod
+    def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the two underlying shingle sets."""
+        return float(np.mean(sig_a == sig_b))
+
+    @staticmethod
+    def to_bytes(signature: np.ndarray) -> bytes:
+        return signature.astype("<u8").tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype="<u8").astype(np.uint64)
+
+    @staticmethod
+    def bands(signature: np.ndarray, num_bands: int = cfg.LSH_BANDS) -> List[int]:
+        """
+        LSH bucket of each band of the signature, as signed 64-bit integers.
+        Two signatures share a bucket in some band with high probability when
+        their similarity is above about (1 / bands) ** (1 / rows per band).
+        """
+        return [
+            int.from_bytes(
+                hashlib.blake2b(band.astype("<u8").tobytes(), digest_size=8).digest(),
+                "little",
+                signed=True,
+            )
+            for band in np.array_split(signature, num_bands)
+        ]
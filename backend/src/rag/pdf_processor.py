@@ -1,47 +1,109 @@
 import asyncio
+import json
 import os
-import uuid
 import warnings
-from typing import AsyncGenerator, List, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
 
-import numpy as np
-import pymupdf
 from langchain_classic.chains.summarize import load_summarize_chain
 from langchain_core.documents import Document
-from langchain_experimental.text_splitter import SemanticChunker
 from langchain_text_splitters.character import RecursiveCharacterTextSplitter
 from qdrant_client import AsyncQdrantClient
-from qdrant_client.http.models import (Distance, FieldCondition, Filter,
-                                       FilterSelector, MatchValue, PointStruct,
-                                       VectorParams)
+from qdrant_client.http.models import (FieldCondition, Filter,
+                                       FilterSelector, MatchValue, PointStruct)
+from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from transformers import logging as hf_logging
 
 from src.config import cfg
 from src.logger import logger
+from src.page_text_cache import load_pages, page_text_cache
+from src.pdf_extractor import page_count
 from src.rag import LLM_Interface
+from src.rag.candidate_cache import candidate_cache
+from src.rag.chunk_store import (ChunkTextStore, chunk_text_store,
+                                 payload_owner)
+from src.rag.content_ids import (copy_point_id, get_file_hash, record_file_hash,
+                                 sha256_file)
+from src.rag.incremental_indexer import IncrementalIndexer
+from src.rag.ingestion_checkpoint import IngestionCheckpoint
+from src.rag.ingestion_pipeline import IngestionPipeline
+from src.rag.qdrant_writer import QdrantBatchWriter
+from src.schema.ingested_documents import (DOC_FAILED, DOC_INDEXED,
+                                           DOC_INDEXING, SUMMARY_DONE,
+                                           SUMMARY_FAILED, SUMMARY_PENDING)
+from src.schema.ingested_documents_crud import (count_documents_with_hash,
+                                                get_document, upsert_document)
+from src.schema.overall_summaries_crud import \
+    delete_overall_summaries_containing_file
 from src.schema.source_summaries_crud import (add_source_summary,
+                                              delete_source_summary,
                                               get_summary_by_source_name)
-from src.util import free_embedding_model, load_embedding_model
 
 warnings.filterwarnings("ignore", category=UserWarning, module="transformers")
 hf_logging.set_verbosity_error()
 
 
 class PDFProcessor:
-    def __init__(self) -> None:
-        self.interface = LLM_Interface()
+    """
+    Indexes PDFs into Qdrant and summarises them.
+
+    The LLM interface, the Qdrant client and the loaded embedding model
+    (a `(model, device)` pair) can be injected, e.g. to share them across
+    many documents or to run against an in-memory Qdrant and a stub LLM.
+    An injected client is never closed here. Chunk texts are kept in
+    `chunk_store`; pass `chunk_store=None` to keep them in the Qdrant
+    payloads, e.g. when there is no database.
+    """
+
+    def __init__(
+        self,
+        interface: Optional[Any] = None,
+        qdrant_client: Optional[AsyncQdrantClient] = None,
+        embedder: Optional[Tuple[Any, str]] = None,
+        chunk_store: Optional[ChunkTextStore] = chunk_text_store,
+    ) -> None:
+        self.interface = interface or LLM_Interface()
+        self.qdrant_client = qdrant_client
+        self.embedder = embedder
+        self.chunk_store = chunk_store
+        # Outcome of the last process_pdf call: pages and chunks indexed,
+        # and the file whose points were copied, if any.
+        self.last_result: Dict[str, Any] = {}
+
+    @asynccontextmanager
+    async def _qdrant(self) -> AsyncIterator[AsyncQdrantClient]:
+        if self.qdrant_client is not None:
+            yield self.qdrant_client
+            return
+        client = AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
+        try:
+            yield client
+        finally:
+            try:
+                await client.close()
+            except Exception as close_error:
+                logger.warning(f"Error closing Qdrant client: {close_error}")
 
     async def process_pdf(
-        self, file_name: str, db: Optional[AsyncSession] = None
+        self, file_name: str, db: Optional[AsyncSession] = None, summarize: bool = True
     ) -> AsyncGenerator[str, None]:
         """
         Process a PDF and yield status updates.
 
         Accepts an optional AsyncSession `db`. When provided, source summaries
         will be looked up and persisted using the async CRUD functions.
+        With `summarize=False` only the embeddings are created.
+
+        When the document is embedded, its summary is generated alongside the
+        chunk/embed/store stages once the text is extracted (see
+        INGEST_CONCURRENT_SUMMARY), and progress of both is interleaved. A
+        failed summary does not fail the embeddings or the other way round.
         """
         logger.info(f"Processing PDF file: {file_name}")
+        self.last_result = {"pages": 0, "chunks": 0, "duplicate_of": None}
+        # Outcome of a summary made beside the pipeline; None if there was none
+        summary_created: Optional[bool] = None
         yield "Starting PDF processing..."
         await asyncio.sleep(0)
 
@@ -49,8 +111,24 @@ class PDFProcessor:
         await asyncio.sleep(0)
         embeddings_exist = await self._check_existing_embeddings(file_name)
 
+        # A checkpoint means an earlier run stopped part-way through indexing.
+        checkpoint = IngestionCheckpoint(file_name)
+        if checkpoint.exists() and await asyncio.to_thread(checkpoint.load) is None:
+            # Stale: the file or chunking settings changed, so start over.
+            yield "Discarding partial embeddings from an earlier run..."
+            await self.delete_embeddings(file_name)
+            await asyncio.to_thread(checkpoint.clear)
+            embeddings_exist = False
+
         docs = None
-        if embeddings_exist:
+        duplicate_of = None
+        if embeddings_exist and not checkpoint.exists():
+            await self._record_existing_index(db, file_name)
+            if not summarize:
+                yield "Embeddings already exist."
+                yield "PDF processing complete."
+                yield "done"
+                return
             yield "Embeddings already exist. Skipping to summary generation..."
             # Extract text for summary generation only
             yield "Extracting text from PDF for summary..."
@@ -61,43 +139,110 @@ class PDFProcessor:
                 return
         else:
             yield "Embeddings not found. Starting full processing..."
-            yield "Extracting text from PDF..."
             await asyncio.sleep(0)
-            docs = await asyncio.to_thread(self._extract_text_from_pdf, file_name)
-            if not docs:
-                yield "Error: Failed to extract text."
-                return
-
-            yield "Running splitter for creating chunks..."
-            await asyncio.sleep(0)
-            split_docs = await asyncio.to_thread(self._run_splitter, docs, file_name)
-            if not split_docs:
-                yield "Error: Failed to split documents."
-                return
-
-            yield "Embedding chunks..."
-            await asyncio.sleep(0)
-            embeddings = await asyncio.to_thread(
-                self._embed_docs, split_docs, file_name
-            )
-            if embeddings is None:
-                yield "Error: Failed to generate embeddings."
-                return
-            logger.info(
-                f"Generated embeddings shape: {embeddings.shape} for {file_name}."
+            file_hash = await asyncio.to_thread(get_file_hash, file_name)
+            await self._update_manifest(
+                db, file_name, file_hash=file_hash, embedding_status=DOC_INDEXING, error=None
             )
+            state = await asyncio.to_thread(checkpoint.load)
+            if state is None or state["chunks_done"] == 0:
+                duplicate_of = await self._find_duplicate_source(file_hash, file_name)
+
+            if duplicate_of:
+                yield f"Identical content already indexed as {duplicate_of}. Copying its embeddings..."
+                await asyncio.to_thread(checkpoint.save, 0, 0, [])
+                copied = await self._copy_duplicate_points(
+                    file_hash, duplicate_of, file_name
+                )
+                if not copied:
+                    await self._update_manifest(
+                        db,
+                        file_name,
+                        embedding_status=DOC_FAILED,
+                        error="Failed to copy embeddings.",
+                    )
+                    yield "Error: Failed to copy embeddings."
+                    return
+                await asyncio.to_thread(checkpoint.clear)
+                await self._mark_indexed(
+                    db,
+                    file_name,
+                    page_count=await asyncio.to_thread(
+                        page_count, os.path.join(cfg.DATA_DIR, file_name)
+                    ),
+                    chunk_count=copied,
+                )
+                self.last_result.update(chunks=copied, duplicate_of=duplicate_of)
+                yield f"Copied {copied} embeddings from {duplicate_of}."
+            else:
+                pipeline = IngestionPipeline(
+                    file_name,
+                    checkpoint=checkpoint,
+                    client=self.qdrant_client,
+                    embedder=self.embedder,
+                    chunk_store=self.chunk_store,
+                )
+                messages: asyncio.Queue = asyncio.Queue()
+                summary_task: Optional[asyncio.Task] = None
+                if summarize and cfg.INGEST_CONCURRENT_SUMMARY:
+                    summary_task = asyncio.create_task(
+                        self._summarize_extracted(pipeline, file_name, db, messages)
+                    )
+                try:
+                    async for progress in self._merged_progress(
+                        pipeline, messages, summary_task
+                    ):
+                        yield progress
+                finally:
+                    if summary_task is not None and not summary_task.done():
+                        summary_task.cancel()
+                        await asyncio.gather(summary_task, return_exceptions=True)
+                if summary_task is not None and not summary_task.cancelled():
+                    summary_created = summary_task.result()
+                if pipeline.error is not None:
+                    await self._update_manifest(
+                        db, file_name, embedding_status=DOC_FAILED, error=pipeline.error
+                    )
+                    yield f"Error: {pipeline.error}"
+                    # Reported after the embedding error, which is what fails the job
+                    if summary_created is False:
+                        yield "Error: Failed to create summary."
+                    return
+                # Dropped near-duplicates have no point; count what is indexed.
+                points = await self.count_points(file_name)
+                await self._mark_indexed(
+                    db,
+                    file_name,
+                    page_count=pipeline.total_pages,
+                    chunk_count=points if points is not None else pipeline.progress["store"],
+                )
+                self.last_result.update(
+                    pages=pipeline.total_pages - pipeline.resumed_pages,
+                    chunks=pipeline.progress["store"] - pipeline.resumed_chunks,
+                    removed=dict(pipeline.removed),
+                )
+                logger.info(
+                    f"Successfully processed and stored embeddings for {file_name}."
+                )
 
-            yield "Saving embeddings to database..."
-            await asyncio.sleep(0)
-            await self._store_embeddings(split_docs, embeddings, file_name)
-            logger.info(
-                f"Successfully processed and stored embeddings for {file_name}."
-            )
+        if not summarize:
+            yield "PDF processing complete."
+            yield "done"
+            return
+        if summary_created is not None:
+            if not summary_created:
+                yield "Error: Failed to create summary."
+            yield "PDF processing complete."
+            yield "done"
+            return
 
         yield "Creating summary..."
         await asyncio.sleep(0)
         # _create_summary is now async and will perform async DB CRUD when a session is provided.
-        summary_result = await self._create_summary(docs, file_name, db=db)
+        summary_result = await self._create_summary(
+            docs, file_name, db=db, duplicate_of=duplicate_of
+        )
+        await self._record_summary(db, file_name, bool(summary_result))
         if summary_result:
             yield "Summary created and saved."
         else:
@@ -106,6 +251,258 @@ class PDFProcessor:
         yield "PDF processing complete."
         yield "done"
 
+    async def _merged_progress(
+        self,
+        pipeline: IngestionPipeline,
+        messages: asyncio.Queue,
+        summary_task: Optional[asyncio.Task],
+    ) -> AsyncGenerator[str, None]:
+        """
+        Progress of `pipeline` and of the summary branch in `summary_task`
+        (which reports to `messages`) in one stream, until both have finished.
+        The summary is cancelled if the pipeline ends without having
+        extracted all pages.
+        """
+
+        async def run_pipeline() -> None:
+            async for progress in pipeline.run():
+                messages.put_nowait(progress)
+
+        pipeline_task = asyncio.create_task(run_pipeline())
+        branches = {pipeline_task} if summary_task is None else {pipeline_task, summary_task}
+        try:
+            while True:
+                while not messages.empty():
+                    yield messages.get_nowait()
+                running = {task for task in branches if not task.done()}
+                if not running:
+                    break
+                if pipeline_task.done() and not pipeline.extracted.is_set():
+                    summary_task.cancel()
+                message = asyncio.ensure_future(messages.get())
+                await asyncio.wait({message, *running}, return_when=asyncio.FIRST_COMPLETED)
+                if message.done():
+                    yield message.result()
+                else:
+                    message.cancel()
+            pipeline_task.result()
+        finally:
+            if not pipeline_task.done():
+                pipeline_task.cancel()
+                await asyncio.gather(pipeline_task, return_exceptions=True)
+
+    @asynccontextmanager
+    async def _own_session(
+        self, db: Optional[AsyncSession]
+    ) -> AsyncIterator[Optional[AsyncSession]]:
+        """A separate session on the engine of `db`, for work running beside it."""
+        if db is None:
+            yield None
+            return
+        async with AsyncSession(db.bind, expire_on_commit=False) as session:
+            yield session
+
+    async def _summarize_extracted(
+        self,
+        pipeline: IngestionPipeline,
+        file_name: str,
+        db: Optional[AsyncSession],
+        messages: asyncio.Queue,
+    ) -> Optional[bool]:
+        """
+        Summary branch of process_pdf: once `pipeline` has extracted every
+        page, summarise them while its remaining stages run, on a session of
+        its own. Returns whether a summary was created, or None if there was
+        no text to summarise. Only success is reported to `messages`; a
+        failure is reported by process_pdf after the embedding outcome.
+        """
+        await pipeline.extracted.wait()
+        if not pipeline.has_text:
+            return None
+        messages.put_nowait("Creating summary...")
+        async with self._own_session(db) as summary_db:
+            # Pages are read back from the text cache the pipeline just wrote.
+            created = bool(await self._create_summary(None, file_name, db=summary_db))
+            await self._record_summary(summary_db, file_name, created)
+        if created:
+            messages.put_nowait("Summary created and saved.")
+        return created
+
+    async def reindex_pdf(
+        self, file_name: str, new_path: str, db: Optional[AsyncSession] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Replace `file_name` with the PDF staged at `new_path`, updating the
+        index incrementally: only regions whose pages changed are re-chunked
+        and re-embedded. Yields status updates like process_pdf.
+        """
+        file_path = os.path.join(cfg.DATA_DIR, file_name)
+        try:
+            yield "Comparing pages with the current version..."
+            new_hash = await asyncio.to_thread(sha256_file, new_path)
+            old_hash = await asyncio.to_thread(get_file_hash, file_name)
+            if new_hash == old_hash:
+                yield "File content is unchanged. Nothing to re-index."
+                yield "done"
+                return
+
+            checkpoint = IngestionCheckpoint(file_name)
+            indexed = await self._check_existing_embeddings(file_name)
+            if not indexed or checkpoint.exists():
+                # Nothing complete to diff against: index the new version fully.
+                await asyncio.to_thread(os.replace, new_path, file_path)
+                await asyncio.to_thread(record_file_hash, file_name, new_hash)
+                async for update in self.process_pdf(file_name, db=db):
+                    yield update
+                return
+
+            indexer = IncrementalIndexer(
+                file_name,
+                file_path,
+                new_path,
+                new_hash,
+                client=self.qdrant_client,
+                chunk_store=self.chunk_store,
+            )
+            try:
+                report = await indexer.run()
+            except Exception as e:
+                logger.error(f"Incremental re-index of {file_name} failed: {e}")
+                await asyncio.to_thread(os.replace, new_path, file_path)
+                await asyncio.to_thread(record_file_hash, file_name, new_hash)
+                # The index may be half-updated; drop it so a reprocess starts clean.
+                await self.delete_embeddings(file_name)
+                await self._update_manifest(
+                    db,
+                    file_name,
+                    file_hash=new_hash,
+                    chunk_count=0,
+                    embedding_status=DOC_FAILED,
+                    error=f"Incremental re-index failed: {e}",
+                )
+                yield f"Error: Incremental re-index failed ({e}). Please reprocess the file."
+                return
+
+            await asyncio.to_thread(os.replace, new_path, file_path)
+            await asyncio.to_thread(record_file_hash, file_name, new_hash)
+            # Cached follow-up candidates may hold replaced chunks.
+            candidate_cache.invalidate_source(file_name)
+            await self._mark_indexed(
+                db,
+                file_name,
+                file_hash=new_hash,
+                page_count=report["pages_after"],
+                chunk_count=report["chunks_kept"] + report["chunks_embedded"],
+            )
+            await self._discard_unused_text(db, old_hash)
+            yield (
+                f"Re-indexed {report['pages_rechunked']}/{report['pages_after']} pages: "
+                f"{report['chunks_embedded']} chunks embedded, {report['chunks_kept']} reused "
+                f"({report['work_avoided_pct']}% of embedding work avoided)."
+            )
+            yield f"Report: {json.dumps(report)}"
+
+            if report["changed_fraction"] >= cfg.REINDEX_RESUMMARIZE_FRACTION:
+                yield "Document changed substantially. Regenerating summary..."
+                if db is not None:
+                    await delete_source_summary(db, file_name)
+                    await delete_overall_summaries_containing_file(db, file_name)
+                    await self._update_manifest(
+                        db, file_name, summary_status=SUMMARY_PENDING, summarized_at=None
+                    )
+                docs = [
+                    Document(
+                        page_content=text,
+                        metadata={"page_number": i + 1, "source": file_name},
+                    )
+                    for i, text in enumerate(indexer.new_pages)
+                ]
+                created = bool(await self._create_summary(docs, file_name, db=db))
+                await self._record_summary(db, file_name, created)
+                if created:
+                    yield "Summary created and saved."
+                else:
+                    yield "Error: Failed to create summary."
+            else:
+                yield "Summary kept: too few pages changed to regenerate it."
+
+            yield "PDF processing complete."
+            yield "done"
+        finally:
+            if os.path.exists(new_path):
+                await asyncio.to_thread(os.remove, new_path)
+
+    async def _update_manifest(
+        self, db: Optional[AsyncSession], file_name: str, **values: Any
+    ) -> None:
+        """Record ingestion state in the ingested_documents manifest (needs `db`)."""
+        if db is None:
+            return
+        try:
+            await upsert_document(db, file_name, **values)
+        except Exception as e:
+            # The reconcile command repairs the manifest from Qdrant later.
+            logger.error(f"Failed to update manifest for {file_name}: {e}")
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+
+    async def _mark_indexed(
+        self, db: Optional[AsyncSession], file_name: str, **values: Any
+    ) -> None:
+        await self._update_manifest(
+            db,
+            file_name,
+            embedding_status=DOC_INDEXED,
+            embedding_model=cfg.EMBEDDING_MODEL_NAME,
+            index_version=cfg.INDEX_VERSION,
+            indexed_at=func.now(),
+            error=None,
+            **values,
+        )
+
+    async def _record_summary(
+        self, db: Optional[AsyncSession], file_name: str, created: bool
+    ) -> None:
+        if created:
+            await self._update_manifest(
+                db, file_name, summary_status=SUMMARY_DONE, summarized_at=func.now()
+            )
+        else:
+            await self._update_manifest(db, file_name, summary_status=SUMMARY_FAILED)
+
+    async def _record_existing_index(
+        self, db: Optional[AsyncSession], file_name: str
+    ) -> None:
+        """Fill in the manifest for a file indexed before it had an entry."""
+        if db is None:
+            return
+        try:
+            document = await get_document(db, file_name)
+            if document is not None and document.embedding_status == DOC_INDEXED:
+                return
+            file_path = os.path.join(cfg.DATA_DIR, file_name)
+            values = {
+                "file_hash": await asyncio.to_thread(get_file_hash, file_name),
+                "page_count": await asyncio.to_thread(page_count, file_path),
+                "chunk_count": await self.count_points(file_name) or 0,
+            }
+        except Exception as e:
+            logger.error(f"Failed to fill in manifest for {file_name}: {e}")
+            return
+        await self._mark_indexed(db, file_name, **values)
+
+    async def _discard_unused_text(self, db: Optional[AsyncSession], file_hash: str) -> None:
+        """Drop the cached page text of a replaced version no document uses any more."""
+        if db is None:
+            return
+        try:
+            if await count_documents_with_hash(db, file_hash) == 0:
+                await asyncio.to_thread(page_text_cache.discard, file_hash)
+        except Exception as e:
+            logger.warning(f"Failed to drop cached text of {file_hash[:12]}: {e}")
+
     def _split_text_by_tokens(self, text: str, tokens_per_chunk: int) -> List[str]:
         words = text.split()
         words_per_chunk = int(tokens_per_chunk / 1.33)
@@ -116,13 +513,20 @@ class PDFProcessor:
         return chunks
 
     async def _create_summary(
-        self, docs: List[Document], file_name: str, db: Optional[AsyncSession]
+        self,
+        docs: Optional[List[Document]],
+        file_name: str,
+        db: Optional[AsyncSession],
+        duplicate_of: Optional[str] = None,
     ) -> Optional[tuple[str, str]]:
         """
         Create a summary for the provided documents.
 
         - If `db` (AsyncSession) is provided, use async CRUD to check for and store summaries.
         - If a summary already exists in the DB, return it and skip generation.
+        - If the file duplicates `duplicate_of`, its summary is copied instead.
+        - If `docs` is None, the text is read from the page text cache (or
+          extracted) only when a summary must be generated.
         - Uses an async `arun` on the map-reduce summarize chain when available.
         """
         logger.info(f"Creating a summary for {file_name}.")
@@ -144,6 +548,20 @@ class PDFProcessor:
                 )
                 return file_name, existing_summary
 
+            if duplicate_of and db is not None:
+                duplicate_summary = await get_summary_by_source_name(db, duplicate_of)
+                if duplicate_summary:
+                    await add_source_summary(
+                        db, source_name=os.path.basename(file_name), summary=duplicate_summary
+                    )
+                    logger.info(f"Copied summary of {duplicate_of} to {file_name}.")
+                    return file_name, duplicate_summary
+
+            if docs is None:
+                docs = await asyncio.to_thread(self._extract_text_from_pdf, file_name)
+                if not docs:
+                    return None
+
             # Build a single document and chunk it for summarization
             text = "\n".join([doc.page_content for doc in docs])
             doc = Document(page_content=text, metadata={"source": file_name})
@@ -196,26 +614,16 @@ class PDFProcessor:
             return None
 
         try:
-            pdf_doc = pymupdf.open(file_path)
-            documents = []
-
-            for page_num in range(len(pdf_doc)):
-                # Use load_page by index to avoid relying on iteration protocol of
-                # the pymupdf Document (which caused static typing/analysis issues).
-                page = pdf_doc.load_page(page_num)
-                # Coerce the raw page text to str before calling .strip() so static
-                # analysis and runtime are robust against non-string return types.
-                raw_text = page.get_text("text")
-                text = str(raw_text).strip()
-
-                metadata = {
-                    "page_number": page_num + 1,
-                    "source": file_name,
-                }
-
-                doc = Document(page_content=text, metadata=metadata)
-                documents.append(doc)
-            pdf_doc.close()
+            # Cached at ingestion; otherwise extracted (large documents across
+            # worker processes) and cached now.
+            texts = load_pages(file_path, get_file_hash(file_name))
+            documents = [
+                Document(
+                    page_content=text,
+                    metadata={"page_number": page_num + 1, "source": file_name},
+                )
+                for page_num, text in enumerate(texts)
+            ]
 
             if not documents:
                 logger.info(f"No text found in PDF {file_name}.")
@@ -230,17 +638,16 @@ class PDFProcessor:
     async def _check_existing_embeddings(self, file_name: str) -> bool:
         logger.info(f"Checking existing embeddings for {file_name}...")
         try:
-            client = AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
             # Use scroll to find any point with the given source
             filter_ = Filter(
                 must=[FieldCondition(key="source", match=MatchValue(value=file_name))]
             )
-            result = await client.scroll(
-                collection_name=cfg.COLLECTION_NAME,
-                limit=1,
-                scroll_filter=filter_,
-            )
-            await client.close()
+            async with self._qdrant() as client:
+                result = await client.scroll(
+                    collection_name=cfg.COLLECTION_NAME,
+                    limit=1,
+                    scroll_filter=filter_,
+                )
             if result and result[0]:
                 logger.info(
                     f"Document embeddings already exist in Qdrant for {file_name}."
@@ -252,119 +659,181 @@ class PDFProcessor:
             logger.error(f"Error checking embeddings in Qdrant: {e}")
             return False
 
-    def _run_splitter(
-        self, docs: List[Document], file_name: str
-    ) -> Optional[List[Document]]:
-        logger.info(f"Running splitter on {len(docs)} documents for {file_name}.")
+    async def count_points(self, file_name: str) -> Optional[int]:
+        """Exact number of points stored for `file_name` (None on error)."""
         try:
-            embedding_model, device = load_embedding_model()
-            splitter = SemanticChunker(
-                embeddings=embedding_model,
-                breakpoint_threshold_type=cfg.BREAKPOINT_THRESHOLD_TYPE,
-                breakpoint_threshold_amount=cfg.BREAKPOINT_THRESHOLD_AMOUNT,
-            )
-            split_docs = splitter.split_documents(docs)
-            free_embedding_model(embedding_model, device)
-            logger.info(
-                f"Split {len(docs)} page documents into {len(split_docs)} chunks for {file_name}."
-            )
-            return split_docs
-
+            async with self._qdrant() as client:
+                result = await client.count(
+                    collection_name=cfg.COLLECTION_NAME,
+                    count_filter=Filter(
+                        must=[FieldCondition(key="source", match=MatchValue(value=file_name))]
+                    ),
+                    exact=True,
+                )
+            return result.count
         except Exception as e:
-            logger.error(f"Error processing PDF {file_name} with splitter: {e}")
+            logger.error(f"Error counting points of {file_name}: {e}")
             return None
 
-    def _embed_docs(self, docs: List[Document], file_name: str) -> Optional[np.ndarray]:
+    async def has_content_indexed(self, file_name: str, file_hash: str) -> bool:
+        """Whether `file_name` has points for the content with this SHA-256."""
         try:
-            logger.info(f"Embedding {len(docs)} chunks for {file_name}.")
-            embedding_model, device = load_embedding_model()
-            all_embeddings = []
-
-            for i, doc in enumerate(docs):
-                try:
-                    text = [doc.page_content]
-                    embedding = embedding_model.embed_documents(text)
-                    all_embeddings.extend(embedding)
-
-                    if device == "cuda":
-                        import torch
-
-                        torch.cuda.empty_cache()
-
-                except Exception as e:
-                    logger.error(f"Error embedding document {i}: {e}")
-                    return None
-            embeddings = np.array(all_embeddings, dtype=np.float32)
-            free_embedding_model(embedding_model, device)
-            logger.info(f"Generated embeddings for {len(all_embeddings)} chunks.")
-            return embeddings if len(all_embeddings) > 0 else None
+            async with self._qdrant() as client:
+                points, _ = await client.scroll(
+                    collection_name=cfg.COLLECTION_NAME,
+                    scroll_filter=Filter(
+                        must=[
+                            FieldCondition(key="source", match=MatchValue(value=file_name)),
+                            FieldCondition(key="file_hash", match=MatchValue(value=file_hash)),
+                        ]
+                    ),
+                    limit=1,
+                )
+            return bool(points)
         except Exception as e:
-            logger.error(f"Error embedding documents: {e}")
-            return None
+            # e.g. the collection does not exist yet
+            logger.debug(f"Could not look up indexed content of {file_name}: {e}")
+            return False
 
-    async def _store_embeddings(
-        self, docs: List[Document], embeddings: np.ndarray, file_name: str
-    ) -> None:
+    async def _find_duplicate_source(
+        self, file_hash: str, file_name: str
+    ) -> Optional[str]:
+        """Return another file name whose content (same SHA-256) is already indexed."""
         try:
-            logger.info(f"Saving embeddings to db for {file_name}")
-            client = AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
-
-            try:
-                await client.get_collection(cfg.COLLECTION_NAME)
-                logger.info(f"Collection {cfg.COLLECTION_NAME} already exists")
-            except Exception:
-                await client.create_collection(
+            async with self._qdrant() as client:
+                points, _ = await client.scroll(
                     collection_name=cfg.COLLECTION_NAME,
-                    vectors_config=VectorParams(
-                        size=embeddings.shape[1], distance=Distance.COSINE
+                    scroll_filter=Filter(
+                        must=[
+                            FieldCondition(key="file_hash", match=MatchValue(value=file_hash))
+                        ],
+                        must_not=[
+                            FieldCondition(key="source", match=MatchValue(value=file_name))
+                        ],
                     ),
+                    limit=16,
+                    with_payload=["source"],
                 )
-                logger.info(f"Created new collection {cfg.COLLECTION_NAME}")
-
-            points = [
-                PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=embeddings[i].tolist(),
-                    payload={
-                        "text": docs[i].page_content,
-                        "source": file_name,
-                        "page_number": docs[i].metadata.get("page_number"),
-                    },
-                )
-                for i in range(len(docs))
-            ]
-            logger.info(f"Stored embeddings for {len(docs)} chunks.")
-
-            await client.upsert(collection_name=cfg.COLLECTION_NAME, points=points)
-            await client.close()
+            for source in dict.fromkeys(payload_owner(point.payload) for point in points):
+                # A source with a checkpoint is still (or was partially) indexed.
+                if source and not await asyncio.to_thread(
+                    IngestionCheckpoint(source).exists
+                ):
+                    return source
+            return None
+        except Exception as e:
+            logger.error(f"Error looking up duplicate content for {file_name}: {e}")
+            return None
 
+    async def _copy_duplicate_points(
+        self, file_hash: str, duplicate_of: str, file_name: str
+    ) -> int:
+        """
+        Copy the points of an identical, already indexed file under
+        `file_name`, reusing their vectors instead of re-embedding.
+        Returns the number of points copied (0 on failure).
+        """
+        copied = 0
+        try:
+            async with self._qdrant() as client:
+                writer = QdrantBatchWriter(client)
+                scroll_filter = Filter(
+                    must=[
+                        FieldCondition(key="file_hash", match=MatchValue(value=file_hash)),
+                        FieldCondition(key="source", match=MatchValue(value=duplicate_of)),
+                    ]
+                )
+                offset = None
+                while True:
+                    points, offset = await client.scroll(
+                        collection_name=cfg.COLLECTION_NAME,
+                        scroll_filter=scroll_filter,
+                        limit=cfg.QDRANT_UPSERT_BATCH_SIZE,
+                        offset=offset,
+                        with_payload=True,
+                        with_vectors=True,
+                    )
+                    await writer.write(await self._copied_points(points, file_name))
+                    copied += len(points)
+                    if offset is None:
+                        break
+                await writer.barrier()
+                if self.chunk_store is not None:
+                    # Chunks of the original that are served by other documents' points
+                    copied += await self.chunk_store.copy_references(
+                        client, duplicate_of, file_name
+                    )
+            logger.info(f"Copied {copied} points from {duplicate_of} to {file_name}.")
+            return copied
         except Exception as e:
-            logger.error(f"Error storing embeddings: {e}")
+            logger.error(f"Error copying embeddings from {duplicate_of}: {e}")
+            return 0
+
+    async def _copied_points(self, points: List[Any], file_name: str) -> List[PointStruct]:
+        """Copies of `points` under `file_name`, with their texts stored first."""
+        # The copies are not shared, even where the originals are.
+        copies = [
+            PointStruct(
+                id=copy_point_id(str(point.id), file_name),
+                vector=point.vector,
+                payload={**point.payload, "source": file_name, "refs": []},
+            )
+            for point in points
+        ]
+        if self.chunk_store is None:
+            if any("text" not in copy.payload for copy in copies):
+                raise RuntimeError("The source texts are in the chunk store, which is not in use")
+            return copies
+        # Texts of points written before the chunk store are still in the payload.
+        texts = await self.chunk_store.get_many(
+            point.id for point in points if "text" not in point.payload
+        )
+        rows = []
+        for point, copy in zip(points, copies):
+            text = copy.payload.pop("text", None) or texts.get(str(point.id))
+            if text is None:
+                raise RuntimeError(f"No stored text for point {point.id}")
+            rows.append(
+                {
+                    "point_id": copy.id,
+                    "source": file_name,
+                    "text": text,
+                    "token_count": copy.payload.get("token_count"),
+                }
+            )
+        await self.chunk_store.put(rows)
+        return copies
 
     async def delete_embeddings(self, source_name: str) -> bool:
-        client = None
+        candidate_cache.invalidate_source(source_name)
         try:
             logger.info(
                 f"Starting Qdrant embeddings deletion for source: {source_name}"
             )
             logger.debug(f"Connecting to Qdrant at {cfg.QDRANT_HOST}:{cfg.QDRANT_PORT}")
-            client = AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
-
-            # Create filter for the source
-            filter_ = Filter(
-                must=[FieldCondition(key="source", match=MatchValue(value=source_name))]
-            )
-            logger.debug(f"Created filter for source: {source_name}")
+            async with self._qdrant() as client:
+                if self.chunk_store is not None:
+                    # Shared points are kept for the other documents they serve;
+                    # afterwards only points without a stored text match the filter.
+                    await self.chunk_store.drop_references(client, source_name)
+                    deleted = await self.chunk_store.remove_owned(client, source_name)
+                    logger.debug(f"Deleted {deleted} chunks of {source_name} with their texts")
+
+                # Create filter for the source
+                filter_ = Filter(
+                    must=[FieldCondition(key="source", match=MatchValue(value=source_name))]
+                )
+                logger.debug(f"Created filter for source: {source_name}")
 
-            # Delete all points matching the filter
-            logger.info(
-                f"Deleting points from collection '{cfg.COLLECTION_NAME}' for source: {source_name}"
-            )
-            result = await client.delete(
-                collection_name=cfg.COLLECTION_NAME,
-                points_selector=FilterSelector(filter=filter_),
-            )
-            logger.debug(f"Qdrant delete operation result: {result}")
+                # Delete all points matching the filter
+                logger.info(
+                    f"Deleting points from collection '{cfg.COLLECTION_NAME}' for source: {source_name}"
+                )
+                result = await client.delete(
+                    collection_name=cfg.COLLECTION_NAME,
+                    points_selector=FilterSelector(filter=filter_),
+                )
+                logger.debug(f"Qdrant delete operation result: {result}")
 
             logger.info(
                 f"Successfully deleted embeddings for {source_name} from Qdrant"
@@ -376,13 +845,6 @@ class PDFProcessor:
                 exc_info=True,
             )
             return False
-        finally:
-            if client:
-                try:
-                    await client.close()
-                    logger.debug(f"Closed Qdrant client connection for {source_name}")
-                except Exception as close_error:
-                    logger.warning(f"Error closing Qdrant client: {close_error}")
 
 
 if __name__ == "__main__":
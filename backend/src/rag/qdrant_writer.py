@@ -0,0 +1,94 @@
+import asyncio
+from typing import Any, List, Sequence
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import PointStruct
+
+from src.config import cfg
+from src.logger import logger
+
+
+class QdrantBatchWriter:
+    """
+    Upserts points in fixed-size batches with bounded concurrency.
+
+    Batches are sent with `wait=False`, so Qdrant acknowledges them once
+    they are in its write-ahead log instead of after indexing, and failed
+    batches are retried with exponential backoff. `barrier()` then waits
+    until one point of every batch is readable, which makes the writes
+    visible before ingestion reports success.
+    """
+
+    def __init__(
+        self,
+        client: AsyncQdrantClient,
+        collection_name: str = cfg.COLLECTION_NAME,
+        batch_size: int = cfg.QDRANT_UPSERT_BATCH_SIZE,
+        concurrency: int = cfg.QDRANT_UPSERT_CONCURRENCY,
+        retries: int = cfg.QDRANT_UPSERT_RETRIES,
+        backoff_seconds: float = cfg.QDRANT_RETRY_BACKOFF_SECONDS,
+    ) -> None:
+        self.client = client
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # One point id per acknowledged batch, checked by barrier()
+        self._sentinel_ids: List[Any] = []
+
+    async def _upsert_batch(self, points: Sequence[PointStruct]) -> None:
+        delay = self.backoff_seconds
+        async with self._semaphore:
+            for attempt in range(1, self.retries + 1):
+                try:
+                    await self.client.upsert(
+                        collection_name=self.collection_name,
+                        points=list(points),
+                        wait=False,
+                    )
+                    self._sentinel_ids.append(points[-1].id)
+                    return
+                except Exception as e:
+                    if attempt == self.retries:
+                        raise
+                    logger.warning(
+                        f"Upsert of {len(points)} points failed "
+                        f"(attempt {attempt}/{self.retries}): {e}. Retrying in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+                    delay *= 2
+
+    async def write(self, points: Sequence[PointStruct]) -> None:
+        """Upsert `points`, returning once every batch has been acknowledged."""
+        batches = [
+            points[i : i + self.batch_size]
+            for i in range(0, len(points), self.batch_size)
+        ]
+        await asyncio.gather(*(self._upsert_batch(batch) for batch in batches))
+
+    async def barrier(
+        self, timeout_seconds: float = cfg.QDRANT_BARRIER_TIMEOUT_SECONDS
+    ) -> None:
+        """Wait until the last point of every written batch can be read back."""
+        pending = list(self._sentinel_ids)
+        deadline = asyncio.get_running_loop().time() + timeout_seconds
+        delay = 0.1
+        while pending:
+            found = await self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=pending,
+                with_payload=False,
+                with_vectors=False,
+            )
+            found_ids = {str(point.id) for point in found}
+            pending = [point_id for point_id in pending if str(point_id) not in found_ids]
+            if not pending:
+                break
+            if asyncio.get_running_loop().time() > deadline:
+                raise TimeoutError(
+                    f"{len(pending)} upserted batches not visible after {timeout_seconds}s"
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 2.0)
+        logger.info(f"Consistency barrier passed for {len(self._sentinel_ids)} batches")
@@ -0,0 +1,159 @@
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from src.config import cfg
+from src.logger import logger
+from src.util import load_embedding_model
+
+
+class RoutingStats:
+    """Process-wide counters of routing decisions and generation latency per model."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"queries": 0, "total_latency": 0.0}
+        )
+
+    def record(self, model: str, latency: float) -> None:
+        with self._lock:
+            self._counters[model]["queries"] += 1
+            self._counters[model]["total_latency"] += latency
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                model: {
+                    "queries": int(c["queries"]),
+                    "avg_latency": c["total_latency"] / c["queries"]
+                    if c["queries"]
+                    else 0.0,
+                }
+                for model, c in self._counters.items()
+            }
+
+
+routing_stats = RoutingStats()
+
+
+class QueryRouter:
+    """
+    Pick the cheapest adequate generation model for a query.
+
+    The complexity score is a weighted mix of cheap signals that are already
+    available after retrieval:
+
+    - length: number of words in the query
+    - pdfs: number of PDFs selected for the query
+    - rerank_spread: normalized entropy of the reranker scores; a flat
+      distribution means the answer is spread over many chunks
+    - embedding: nearest-centroid classifier over the query embedding, using
+      the labelled exemplars in cfg.ROUTER_SIMPLE_EXAMPLES/COMPLEX_EXAMPLES
+    """
+
+    # Exemplar centroids are shared by every router instance in the process.
+    _centroids: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    _centroid_lock = threading.Lock()
+
+    def __init__(
+        self,
+        simple_model: str = cfg.ROUTER_SIMPLE_MODEL,
+        complex_model: str = cfg.ROUTER_COMPLEX_MODEL,
+        threshold: float = cfg.ROUTER_COMPLEXITY_THRESHOLD,
+    ) -> None:
+        supported = [m["id"] for m in cfg.SUPPORTED_MODELS if m.get("id")]
+        for model in (simple_model, complex_model):
+            if model not in supported:
+                logger.warning(
+                    f"Router model '{model}' is not in SUPPORTED_MODELS; "
+                    f"falling back to {cfg.MODEL_NAME}"
+                )
+        self.simple_model = simple_model if simple_model in supported else cfg.MODEL_NAME
+        self.complex_model = (
+            complex_model if complex_model in supported else cfg.MODEL_NAME
+        )
+        self.threshold = threshold
+        self.weights = cfg.ROUTER_SIGNAL_WEIGHTS
+
+    @classmethod
+    def _load_centroids(cls) -> Tuple[np.ndarray, np.ndarray]:
+        with cls._centroid_lock:
+            if cls._centroids is None:
+                embedding_model, _ = load_embedding_model()
+                simple = np.array(
+                    embedding_model.embed_documents(cfg.ROUTER_SIMPLE_EXAMPLES),
+                    dtype=np.float32,
+                )
+                complex_ = np.array(
+                    embedding_model.embed_documents(cfg.ROUTER_COMPLEX_EXAMPLES),
+                    dtype=np.float32,
+                )
+                cls._centroids = (
+                    cls._normalize(simple.mean(axis=0)),
+                    cls._normalize(complex_.mean(axis=0)),
+                )
+                logger.info("Query router exemplar centroids computed.")
+            return cls._centroids
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _embedding_signal(self, query_embedding: Optional[np.ndarray]) -> float:
+        if query_embedding is None or len(query_embedding) == 0:
+            return 0.5
+        simple, complex_ = self._load_centroids()
+        query = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+        margin = float(query @ complex_ - query @ simple)
+        return float(1.0 / (1.0 + np.exp(-cfg.ROUTER_EMBEDDING_SCALE * margin)))
+
+    @staticmethod
+    def _rerank_spread_signal(rerank_scores: np.ndarray) -> float:
+        scores = np.asarray(rerank_scores, dtype=np.float64)
+        if scores.size < 2:
+            return 0.0
+        exp_scores = np.exp((scores - scores.max()) / cfg.RERANKER_TEMP)
+        probs = exp_scores / exp_scores.sum()
+        entropy = -np.sum(probs * np.log(probs + 1e-12))
+        return float(entropy / np.log(scores.size))
+
+    def route(
+        self,
+        query: str,
+        num_pdfs: int,
+        rerank_scores: np.ndarray,
+        query_embedding: Optional[np.ndarray],
+    ) -> Dict[str, Any]:
+        """Classify the query and return the routing decision with its signals."""
+        signals = {
+            "length": min(len(query.split()) / cfg.ROUTER_LONG_QUERY_WORDS, 1.0),
+            "pdfs": min(max(num_pdfs - 1, 0) / max(cfg.ROUTER_MANY_PDFS - 1, 1), 1.0),
+            "rerank_spread": self._rerank_spread_signal(rerank_scores),
+        }
+        try:
+            signals["embedding"] = self._embedding_signal(query_embedding)
+        except Exception as e:
+            logger.error(f"Query router embedding classifier failed: {e}")
+            signals["embedding"] = 0.5
+
+        total_weight = sum(self.weights.get(name, 0.0) for name in signals) or 1.0
+        complexity = (
+            sum(self.weights.get(name, 0.0) * value for name, value in signals.items())
+            / total_weight
+        )
+        is_complex = complexity >= self.threshold
+        decision = {
+            "model": self.complex_model if is_complex else self.simple_model,
+            "complexity": round(complexity, 4),
+            "label": "complex" if is_complex else "simple",
+            "signals": {name: round(value, 4) for name, value in signals.items()},
+        }
+        logger.info(
+            f"Routing decision: {decision['label']} -> {decision['model']} "
+            f"(complexity: {decision['complexity']}, signals: {decision['signals']})"
+        )
+        return decision
@@ -15,6 +15,9 @@ from transformers import logging as hf_logging
 
 from src.config import cfg
 from src.logger import logger
+from src.rag.candidate_cache import CachedCandidates, candidate_cache
+from src.rag.chunk_store import (ChunkTextStore, chunk_text_store,
+                                 payload_sources)
 from src.rag.LLM_interface import LLM_Interface
 from src.schema.source_summaries_crud import get_summary_by_source_name
 from src.util import free_embedding_model, load_embedding_model
@@ -27,20 +30,31 @@ warnings.filterwarnings(
 )
 warnings.filterwarnings("ignore", category=UserWarning, module="transformers")
 
+# Payload fields read from search hits. "text" is only present on points
+# indexed before chunk texts moved to the chunk store; "refs" only on points
+# shared by near-duplicate chunks of several documents.
+_PAYLOAD_FIELDS = ["source", "page_number", "token_count", "text", "refs"]
+
 
 class Retriever:
     def __init__(
         self,
         interface: LLM_Interface,
         top_k: int = 5,
+        chunk_store: Optional[ChunkTextStore] = chunk_text_store,
     ) -> None:
         self.top_k = top_k
         self.interface = interface
+        self.chunk_store = chunk_store
         # Lazily initialize FlagReranker to avoid blocking import/startup.
         # The actual heavy initialization will run in a background thread when needed.
         self.reranker: Optional[FlagReranker] = None
         self._reranker_init_lock = threading.Lock()
         self._reranker_ready = False
+        # Signals from the most recent retrieve() call, reused by later stages
+        # (e.g. query routing) so they do not have to be recomputed.
+        self.last_query_embedding: Optional[np.ndarray] = None
+        self.last_rerank_scores: np.ndarray = np.array([], dtype=np.float32)
 
     def _init_reranker_sync(self):
         """Synchronous initializer for FlagReranker. Designed to be run inside
@@ -93,11 +107,24 @@ class Retriever:
         return selected_chunk_ids
 
     def rerank_chunks(self, query: str, chunks: List[str]) -> List[str]:
+        selected_indices, _ = self.rerank_chunks_with_scores(query, chunks)
+        return [chunks[i] for i in selected_indices]
+
+    def rerank_chunks_with_scores(
+        self, query: str, chunks: List[str]
+    ) -> Tuple[List[int], np.ndarray]:
+        """
+        Rerank chunks and return the indices of the selected chunks (best first)
+        together with the raw reranker score of every input chunk.
+
+        On failure the original order is kept and the scores array is empty.
+        """
+        unranked = list(range(len(chunks))), np.array([], dtype=np.float32)
         try:
             logger.info(f"Applying reranking to filtered chunks: {len(chunks)} chunks")
             if not chunks:
                 logger.warning("No chunks provided for reranking.")
-                return []
+                return [], np.array([], dtype=np.float32)
             # Ensure reranker is available; try to initialize synchronously if it's not.
             # This method may be executed inside a thread (via asyncio.to_thread), so
             # calling the synchronous initializer here will not block the event loop.
@@ -106,31 +133,31 @@ class Retriever:
                     self._init_reranker_sync()
                 except Exception as e:
                     logger.error(f"Reranker not available: {e}")
-                    return chunks
+                    return unranked
             # Use a local variable to help type-checkers and avoid race windows.
             reranker = self.reranker
             if reranker is None:
                 logger.error("Reranker unexpectedly None after init")
-                return chunks
+                return unranked
             scores = reranker.compute_score([(query, chunk) for chunk in chunks])
-            scores = np.array(scores)
+            scores = np.atleast_1d(np.array(scores, dtype=np.float32))
             if len(scores) != len(chunks):
                 logger.error(
                     f"Mismatch between scores ({len(scores)}) and chunks ({len(chunks)})"
                 )
-                return chunks
+                return unranked
 
-            selected_chunks = self._softmax_top_p_filter(
+            selected_indices = self._softmax_top_p_filter(
                 scores=scores,
-                items=chunks,
+                items=list(range(len(chunks))),
                 top_p=cfg.TOP_P,
                 temperature=cfg.RERANKER_TEMP,
             )
-            logger.debug(f"Number of chunks after reranking: {len(selected_chunks)}")
-            return selected_chunks
+            logger.debug(f"Number of chunks after reranking: {len(selected_indices)}")
+            return selected_indices, scores
         except Exception as e:
             logger.error(f"Error during reranking: {e}")
-            return chunks
+            return unranked
 
     def _generate_query_embeddings_sync(self, embedding_model, rewritten_queries):
         """
@@ -142,13 +169,169 @@ class Retriever:
             embeddings.append(embedding_model.embed_query(rq))
         return np.array(embeddings, dtype=np.float32)
 
+    @staticmethod
+    def _citation(payload: Dict, pdfs: List[str]) -> Tuple[str, Optional[int]]:
+        """
+        Source and page to cite for a hit: for a point shared by several
+        documents, the first of them that was searched, with its page.
+        """
+        sources = payload_sources(payload)
+        source = next((s for s in sources if s in pdfs), sources[0] if sources else "Unknown")
+        if sources and source != sources[0]:
+            for ref in payload.get("refs") or []:
+                if ref.get("source") == source:
+                    return source, ref.get("page_number")
+        return source, payload.get("page_number", None)
+
+    @classmethod
+    def _parse_points(
+        cls, results, id_to_doc, id_to_metadata, id_to_vector, pdfs: List[str]
+    ) -> None:
+        """
+        Collect metadata and (when requested) vectors of query results, and
+        the texts of points that still carry them in their payload.
+        """
+        for query_response in results:
+            for point in query_response.points:
+                payload = point.payload or {}
+                if "text" in payload:
+                    id_to_doc[point.id] = payload["text"]
+                source, page_number = cls._citation(payload, pdfs)
+                id_to_metadata[point.id] = {
+                    "point_id": str(point.id),
+                    "source": source,
+                    "page_number": page_number,
+                    "token_count": payload.get("token_count", None),
+                }
+                if point.vector is not None:
+                    id_to_vector[point.id] = np.asarray(point.vector, dtype=np.float32)
+
+    async def _load_texts(self, chunk_ids: List, id_to_doc: Dict) -> List:
+        """
+        Fill in `id_to_doc` for `chunk_ids` from the chunk store, in one query,
+        and return the ids that have a text.
+        """
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in id_to_doc]
+        if missing and self.chunk_store is not None:
+            texts = await self.chunk_store.get_many(missing)
+            for chunk_id in missing:
+                text = texts.get(str(chunk_id))
+                if text is not None:
+                    id_to_doc[chunk_id] = text
+        found = [chunk_id for chunk_id in chunk_ids if chunk_id in id_to_doc]
+        if len(found) < len(chunk_ids):
+            logger.warning(
+                f"No stored text for {len(chunk_ids) - len(found)} retrieved chunks; skipping them"
+            )
+        return found
+
+    async def _rerank_candidates(
+        self,
+        query: str,
+        candidate_ids: List,
+        id_to_doc: Dict,
+        id_to_metadata: Dict,
+    ) -> Tuple[List[str], List[Dict[str, any]]]:
+        filtered_ids = [chunk_id for chunk_id in candidate_ids if chunk_id in id_to_doc]
+        filtered_chunks = [id_to_doc[chunk_id] for chunk_id in filtered_ids]
+
+        # Ensure FlagReranker is initialized before reranking. Initialization
+        # runs synchronously but inside a background thread so it does not
+        # block the event loop.
+        await asyncio.to_thread(self._init_reranker_sync)
+
+        logger.info("Performing reranking on filtered chunks")
+        selected_indices, rerank_scores = await asyncio.to_thread(
+            self.rerank_chunks_with_scores, query, filtered_chunks
+        )
+        self.last_rerank_scores = rerank_scores
+
+        # Keep metadata aligned with the reranked order
+        reranked_chunks = [filtered_chunks[i] for i in selected_indices]
+        reranked_metadata = [id_to_metadata[filtered_ids[i]] for i in selected_indices]
+        return reranked_chunks, reranked_metadata
+
+    async def _retrieve_from_cache(
+        self,
+        query: str,
+        query_embedding: np.ndarray,
+        cached: CachedCandidates,
+        filter_: Filter,
+        session_id: str,
+    ) -> Tuple[List[str], List[Dict[str, any]]]:
+        """
+        Follow-up path: rerank the previous turn's candidates plus a small
+        fresh search, skipping query rewriting and the multi-query search.
+        """
+        id_to_doc = dict(cached.id_to_doc)
+        id_to_metadata = dict(cached.id_to_metadata)
+        id_to_vector = dict(cached.id_to_vector)
+
+        client = AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
+        try:
+            results = await client.query_batch_points(
+                collection_name=cfg.COLLECTION_NAME,
+                requests=[
+                    QueryRequest(
+                        query=query_embedding.tolist(),
+                        limit=cfg.CANDIDATE_CACHE_FRESH_K,
+                        filter=filter_,
+                        with_payload=_PAYLOAD_FIELDS,
+                        with_vector=True,
+                    )
+                ],
+            )
+        finally:
+            await client.close()
+        self._parse_points(results, id_to_doc, id_to_metadata, id_to_vector, cached.pdfs)
+
+        # Order the merged pool by similarity to the new query and keep it bounded.
+        candidate_ids = list(id_to_metadata.keys())
+        if id_to_vector:
+            similarity = {
+                chunk_id: float(id_to_vector[chunk_id] @ query_embedding)
+                for chunk_id in candidate_ids
+                if chunk_id in id_to_vector
+            }
+            candidate_ids.sort(key=lambda chunk_id: -similarity.get(chunk_id, -1.0))
+        candidate_ids = candidate_ids[: cfg.CANDIDATE_CACHE_MAX_CANDIDATES]
+        candidate_ids = await self._load_texts(candidate_ids, id_to_doc)
+        logger.info(
+            f"Serving follow-up from candidate cache with {len(candidate_ids)} candidates"
+        )
+
+        # Anchor and age stay those of the last full search, so the TTL and
+        # the similarity threshold do not drift along a chain of follow-ups.
+        candidate_cache.put(
+            session_id,
+            CachedCandidates(
+                query_embedding=cached.query_embedding,
+                created_at=cached.created_at,
+                pdfs=cached.pdfs,
+                id_to_doc={i: id_to_doc[i] for i in candidate_ids},
+                id_to_metadata={i: id_to_metadata[i] for i in candidate_ids},
+                id_to_vector={i: id_to_vector[i] for i in candidate_ids if i in id_to_vector},
+            ),
+        )
+        return await self._rerank_candidates(
+            query, candidate_ids, id_to_doc, id_to_metadata
+        )
+
     async def retrieve(
         self,
         query: str,
         pdfs: List[str],
         db: Optional[AsyncSession] = None,
         top_k: Optional[int] = None,
+        session_id: Optional[str] = None,
     ) -> Tuple[List[str], List[Dict[str, any]]]:
+        """
+        Retrieve and rerank chunks for `query` from the given PDFs.
+
+        When `session_id` is given, the fused candidate set is cached for the
+        session; a follow-up whose query embedding is close to the previous
+        one is reranked against those candidates plus a small fresh search.
+        """
         if top_k is None:
             top_k = self.top_k
 
@@ -158,6 +341,32 @@ class Retriever:
                 load_embedding_model, None
             )
 
+            # Qdrant filter for all sources in pdfs
+            filter_ = Filter(
+                must=[FieldCondition(key="source", match=MatchAny(any=pdfs))]
+            )
+            logger.info(f"Using filter for sources: {pdfs}")
+
+            cached = candidate_cache.get(session_id, pdfs) if session_id else None
+            if cached is not None:
+                query_embedding = (
+                    await asyncio.to_thread(
+                        self._generate_query_embeddings_sync,
+                        embedding_model,
+                        [query.strip()],
+                    )
+                )[0]
+                similarity = float(query_embedding @ cached.query_embedding)
+                if similarity >= cfg.CANDIDATE_CACHE_SIMILARITY:
+                    self.last_query_embedding = query_embedding
+                    candidate_cache.record_turn(served_from_cache=True)
+                    return await self._retrieve_from_cache(
+                        query, query_embedding, cached, filter_, session_id
+                    )
+                logger.info(
+                    f"Follow-up too far from cached query (similarity {similarity:.3f})"
+                )
+
             logger.info("Generating rewritten queries for better retrieval")
             # Fetch source summaries asynchronously if a DB session is provided.
             if db is not None and pdfs:
@@ -175,32 +384,32 @@ class Retriever:
             rewritten_queries = await self.interface.generate_rewritten_queries(
                 query=query, summary=summary
             )
+            if not rewritten_queries:
+                rewritten_queries = [query.strip()]
 
             logger.info("Generating query embeddings (threaded)")
             # Generate embeddings in a thread (embedding_model.embed_query is sync/CPU-bound).
             query_embeddings = await asyncio.to_thread(
                 self._generate_query_embeddings_sync, embedding_model, rewritten_queries
             )
+            # The original query is always the last entry of rewritten_queries.
+            self.last_query_embedding = query_embeddings[-1]
             # Free embedding model resources in a thread as well.
             await asyncio.to_thread(free_embedding_model, embedding_model, device)
 
             logger.info("Connecting to Qdrant")
             client = AsyncQdrantClient(host=cfg.QDRANT_HOST, port=cfg.QDRANT_PORT)
 
-            # Qdrant filter for all sources in pdfs
-            filter_ = Filter(
-                must=[FieldCondition(key="source", match=MatchAny(any=pdfs))]
-            )
-            logger.info(f"Using filter for sources: {pdfs}")
-
             logger.info("Retrieving relevant chunks from Qdrant")
 
+            # Vectors are only fetched when they will be cached for follow-ups.
             requests = [
                 QueryRequest(
                     query=embedding.tolist(),
                     limit=top_k,
                     filter=filter_,
-                    with_payload=True,
+                    with_payload=_PAYLOAD_FIELDS,
+                    with_vector=session_id is not None,
                 )
                 for embedding in query_embeddings
             ]
@@ -211,66 +420,45 @@ class Retriever:
             )
             await client.close()
 
-            chunk_texts = []
-            chunk_ids = []
-            chunk_metadata = []
-            for query_response in results:
-                for point in query_response.points:
-                    point_id = point.id
-                    text = (
-                        point.payload.get("text", "No text found")
-                        if point.payload
-                        else "No text found"
-                    )
-                    metadata = {
-                        "source": point.payload.get("source", "Unknown")
-                        if point.payload
-                        else "Unknown",
-                        "page_number": point.payload.get("page_number", None)
-                        if point.payload
-                        else None,
-                    }
-                    chunk_ids.append(point_id)
-                    chunk_texts.append(text)
-                    chunk_metadata.append(metadata)
-
-            id_to_doc = dict(zip(chunk_ids, chunk_texts))
-            id_to_metadata = dict(zip(chunk_ids, chunk_metadata))
-            logger.info(f"Retrieved len(chunk_texts): {len(chunk_texts)} chunks")
+            id_to_doc: Dict = {}
+            id_to_metadata: Dict = {}
+            id_to_vector: Dict = {}
+            self._parse_points(results, id_to_doc, id_to_metadata, id_to_vector, pdfs)
+            logger.info(f"Retrieved {len(id_to_metadata)} unique chunks")
 
             ids_per_query = [
                 [point.id for point in result.points] for result in results
             ]
 
-            # Ensure FlagReranker is initialized before performing fusion/reranking.
-            # Initialization runs synchronously but inside a background thread
-            # so it does not block the event loop.
-            await asyncio.to_thread(self._init_reranker_sync)
-
             ranked_chunk_ids = await asyncio.to_thread(
                 self.reciprocal_rank_fusion, ids_per_query, k=top_k
             )
-            filtered_chunks = [
-                id_to_doc[chunk_id]
-                for chunk_id in ranked_chunk_ids
-                if chunk_id in id_to_doc
+            ranked_chunk_ids = [
+                chunk_id for chunk_id in ranked_chunk_ids if chunk_id in id_to_metadata
             ]
+            # Texts are fetched only for the fused candidates, in one call.
+            ranked_chunk_ids = await self._load_texts(ranked_chunk_ids, id_to_doc)
+            logger.info(f"Number of chunks after rank fusion: {len(ranked_chunk_ids)}")
+
+            if session_id:
+                candidate_cache.record_turn(served_from_cache=False)
+                candidate_cache.put(
+                    session_id,
+                    CachedCandidates(
+                        query_embedding=self.last_query_embedding,
+                        pdfs=pdfs,
+                        id_to_doc={i: id_to_doc[i] for i in ranked_chunk_ids},
+                        id_to_metadata={i: id_to_metadata[i] for i in ranked_chunk_ids},
+                        id_to_vector={
+                            i: id_to_vector[i] for i in ranked_chunk_ids if i in id_to_vector
+                        },
+                    ),
+                )
 
-            logger.info(f"Number of chunks after rank fusion: {len(filtered_chunks)}")
-            logger.info("Performing reranking on filtered chunks")
-            reranked_chunks = await asyncio.to_thread(
-                self.rerank_chunks, query, filtered_chunks
+            return await self._rerank_candidates(
+                query, ranked_chunk_ids, id_to_doc, id_to_metadata
             )
 
-            # Build corresponding metadata list for reranked chunks
-            reranked_metadata = [
-                id_to_metadata[chunk_id]
-                for chunk_id in ranked_chunk_ids
-                if chunk_id in id_to_metadata
-            ][: len(reranked_chunks)]  # Match length after reranking filtering
-
-            return reranked_chunks, reranked_metadata
-
         except Exception as e:
             logger.error(f"Error retrieving data: {e}")
             return [], []
@@ -0,0 +1,178 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import cfg
+from src.logger import logger
+from src.rag.compressor import split_sentences
+from src.rag.embedding_engine import EmbeddingEngine
+
+# Defaults used by langchain's SemanticChunker for each threshold type
+_DEFAULT_THRESHOLD_AMOUNTS = {
+    "percentile": 95,
+    "standard_deviation": 3,
+    "interquartile": 1.5,
+    "gradient": 95,
+}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def breakpoint_threshold(
+    distances: np.ndarray, threshold_type: str, amount: Optional[float]
+) -> Tuple[float, np.ndarray]:
+    """
+    Return the threshold and the array it applies to, following the
+    semantics of langchain's SemanticChunker breakpoint types.
+    """
+    if amount is None:
+        amount = _DEFAULT_THRESHOLD_AMOUNTS[threshold_type]
+    if threshold_type == "percentile":
+        return float(np.percentile(distances, amount)), distances
+    if threshold_type == "standard_deviation":
+        return float(np.mean(distances) + amount * np.std(distances)), distances
+    if threshold_type == "interquartile":
+        q1, q3 = np.percentile(distances, [25, 75])
+        return float(np.mean(distances) + amount * (q3 - q1)), distances
+    if threshold_type == "gradient":
+        gradient = np.gradient(distances) if len(distances) > 1 else distances
+        return float(np.percentile(gradient, amount)), gradient
+    raise ValueError(f"Unknown breakpoint threshold type: {threshold_type}")
+
+
+class SemanticChunker:
+    """
+    Single-pass semantic chunker over a whole document.
+
+    Sentences from all pages are embedded together (each with
+    `buffer_size` neighbours on either side, as langchain does) in
+    length-bucketed batches. Breakpoints are where the cosine distance between
+    consecutive sentence windows exceeds the configured threshold, so chunks
+    may span pages; each chunk records `page_start`/`page_end` and keeps
+    `page_number` as its first page.
+
+    Chunk vectors are either the normalised mean of their sentence vectors
+    (`vector_mode="mean"`, no further model calls) or the embedding of the
+    chunk text (`vector_mode="embed"`, one more pass over the chunks only).
+    """
+
+    def __init__(
+        self,
+        embedding_model,
+        device: str = "cpu",
+        threshold_type: str = cfg.BREAKPOINT_THRESHOLD_TYPE,
+        threshold_amount: Optional[float] = cfg.BREAKPOINT_THRESHOLD_AMOUNT,
+        buffer_size: int = cfg.CHUNK_SENTENCE_BUFFER,
+        vector_mode: str = cfg.CHUNK_VECTOR_MODE,
+    ) -> None:
+        if vector_mode not in ("mean", "embed"):
+            raise ValueError("vector_mode must be 'mean' or 'embed'")
+        self.engine = EmbeddingEngine(embedding_model, device)
+        self.threshold_type = threshold_type
+        self.threshold_amount = threshold_amount
+        self.buffer_size = buffer_size
+        self.vector_mode = vector_mode
+
+    def sentences(self, docs: List[Document]) -> List[Tuple[str, int]]:
+        """Split page documents into (sentence, page_number) pairs."""
+        sentences = []
+        for doc in docs:
+            page = doc.metadata.get("page_number")
+            for start, end in split_sentences(doc.page_content):
+                sentences.append((doc.page_content[start:end].strip(), page))
+        return sentences
+
+    def _windows(self, sentences: List[str]) -> List[str]:
+        b = self.buffer_size
+        return [
+            " ".join(sentences[max(i - b, 0) : i + b + 1]) for i in range(len(sentences))
+        ]
+
+    def chunk_sentences(
+        self, sentences: List[Tuple[str, int]], base_metadata: Dict[str, Any]
+    ) -> Tuple[List[Document], List[Tuple[int, int]], Optional[np.ndarray]]:
+        """
+        Group (sentence, page_number) pairs into chunks.
+
+        Returns the chunks, the sentence index span of each chunk and the
+        normalised sentence window vectors used to find the breakpoints.
+        """
+        if not sentences:
+            return [], [], None
+        texts = [text for text, _ in sentences]
+
+        sentence_vectors = self.engine.embed(self._windows(texts))
+        if sentence_vectors is None:
+            return [], [], None
+        sentence_vectors = _normalize(sentence_vectors)
+
+        # Cosine distance between consecutive sentence windows, vectorised.
+        distances = 1.0 - np.einsum(
+            "ij,ij->i", sentence_vectors[:-1], sentence_vectors[1:]
+        )
+        if len(distances) > 0:
+            threshold, values = breakpoint_threshold(
+                distances, self.threshold_type, self.threshold_amount
+            )
+            breakpoints = np.flatnonzero(values > threshold) + 1
+        else:
+            breakpoints = np.array([], dtype=int)
+        bounds = [0, *breakpoints.tolist(), len(texts)]
+
+        chunks: List[Document] = []
+        spans: List[Tuple[int, int]] = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            pages = [page for _, page in sentences[start:end] if page is not None]
+            page_start = min(pages) if pages else None
+            page_end = max(pages) if pages else None
+            chunks.append(
+                Document(
+                    page_content=" ".join(texts[start:end]),
+                    metadata={
+                        **base_metadata,
+                        "page_number": page_start,
+                        "page_start": page_start,
+                        "page_end": page_end,
+                    },
+                )
+            )
+            spans.append((start, end))
+        return chunks, spans, sentence_vectors
+
+    @staticmethod
+    def mean_vectors(
+        sentence_vectors: np.ndarray, spans: List[Tuple[int, int]]
+    ) -> np.ndarray:
+        return _normalize(
+            np.stack([sentence_vectors[s:e].mean(axis=0) for s, e in spans])
+        ).astype(np.float32)
+
+    def split_documents(
+        self, docs: List[Document]
+    ) -> Tuple[List[Document], Optional[np.ndarray]]:
+        if not docs:
+            return [], None
+        base_metadata = {
+            k: v for k, v in docs[0].metadata.items() if k != "page_number"
+        }
+        chunks, spans, sentence_vectors = self.chunk_sentences(
+            self.sentences(docs), base_metadata
+        )
+        if not chunks:
+            return [], None
+
+        if self.vector_mode == "mean":
+            vectors = self.mean_vectors(sentence_vectors, spans)
+        else:
+            vectors = self.engine.embed([chunk.page_content for chunk in chunks])
+
+        logger.info(
+            f"Chunked {spans[-1][1]} sentences into {len(chunks)} chunks "
+            f"({self.threshold_type}, vectors: {self.vector_mode})"
+        )
+        return chunks, vectors
@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage
+
+from src.config import cfg
+from src.logger import logger
+
+# Rough per-message overhead (object headers, role, kwargs) added to content size
+_MESSAGE_OVERHEAD_BYTES = 128
+
+
+def message_size(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    chunk_ids = message.additional_kwargs.get("chunk_ids") or []
+    return (
+        len(content.encode("utf-8"))
+        + sum(len(str(chunk_id)) for chunk_id in chunk_ids)
+        + _MESSAGE_OVERHEAD_BYTES
+    )
+
+
+class CachedSession:
+    def __init__(self) -> None:
+        self.history = InMemoryChatMessageHistory()
+        self.size_bytes = 0
+        self.last_access = time.monotonic()
+        # Messages added since the last flush to Postgres
+        self.pending: List[Dict[str, Any]] = []
+        # Running summary of turns that were compacted out of `history`
+        self.summary: Optional[str] = None
+        self.summary_last_message_id: Optional[int] = None
+        self.compacting = False
+
+
+class SessionStore:
+    """
+    In-memory LRU tier for chat sessions, bounded by TTL and total bytes.
+
+    Postgres (`chat_messages`) is the source of truth; the cache only holds
+    recent messages of recently active sessions. Sessions idle for longer
+    than `ttl_seconds` are dropped, and the least recently used sessions are
+    evicted whenever the total estimated size exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = cfg.SESSION_CACHE_TTL_SECONDS,
+        max_bytes: int = cfg.SESSION_CACHE_MAX_BYTES,
+        max_messages: int = cfg.SESSION_CACHE_MAX_MESSAGES,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, CachedSession]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def get(self, session_id: str) -> Optional[CachedSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.monotonic() - session.last_access > self.ttl_seconds:
+                self._drop(session_id, reason="expired")
+                return None
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def get_or_create(self, session_id: str) -> CachedSession:
+        with self._lock:
+            session = self.get(session_id)
+            if session is None:
+                session = CachedSession()
+                self._sessions[session_id] = session
+                self._evict_expired()
+            return session
+
+    def append(
+        self, session_id: str, message: BaseMessage, record: Optional[Dict[str, Any]]
+    ) -> None:
+        """Add a message to the cached history and queue its row for persistence."""
+        with self._lock:
+            session = self.get_or_create(session_id)
+            session.history.add_message(message)
+            size = message_size(message)
+            session.size_bytes += size
+            self._total_bytes += size
+            if record is not None:
+                session.pending.append(record)
+
+            # Only the recent tail is needed for prompts; older turns live in Postgres.
+            overflow = len(session.history.messages) - self.max_messages
+            if overflow > 0:
+                # Compaction should have folded these into the summary first.
+                logger.warning(
+                    f"Session cache dropping {overflow} unsummarized messages of '{session_id}'"
+                )
+                dropped = session.history.messages[:overflow]
+                session.history.messages = session.history.messages[overflow:]
+                freed = sum(message_size(m) for m in dropped)
+                session.size_bytes -= freed
+                self._total_bytes -= freed
+            self._evict_over_budget(keep=session_id)
+
+    def compact(self, session_id: str, summary: str, last_message_id: int) -> None:
+        """
+        Replace cached messages up to and including row `last_message_id`
+        with the running summary.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            dropped = [
+                m
+                for m in session.history.messages
+                if m.id is not None and int(m.id) <= last_message_id
+            ]
+            session.history.messages = [
+                m
+                for m in session.history.messages
+                if m.id is None or int(m.id) > last_message_id
+            ]
+            freed = sum(message_size(m) for m in dropped)
+            old_summary = len((session.summary or "").encode("utf-8"))
+            new_summary = len(summary.encode("utf-8"))
+            session.summary = summary
+            session.summary_last_message_id = last_message_id
+            delta = new_summary - old_summary - freed
+            session.size_bytes += delta
+            self._total_bytes += delta
+
+    def take_pending(self, session_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            pending, session.pending = session.pending, []
+            return pending
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [
+            session_id
+            for session_id, session in self._sessions.items()
+            if now - session.last_access > self.ttl_seconds
+        ]
+        for session_id in expired:
+            self._drop(session_id, reason="expired")
+
+    def _evict_over_budget(self, keep: str) -> None:
+        while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            self._drop(session_id, reason="over byte budget")
+
+    def _drop(self, session_id: str, reason: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        self._total_bytes -= session.size_bytes
+        if session.pending:
+            logger.warning(
+                f"Evicting session '{session_id}' ({reason}) with "
+                f"{len(session.pending)} unpersisted messages"
+            )
+        else:
+            logger.debug(f"Evicted session '{session_id}' from cache ({reason})")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Shared by every ChatManager in the process so history survives across requests.
+session_store = SessionStore()
@@ -0,0 +1,212 @@
+"""
+Repair drift between the ingested_documents manifest and what is actually
+stored, e.g. after a crash between a Qdrant write and the manifest update,
+or for files uploaded before the manifest existed.
+
+    python -m src.reconcile [--dry-run] [--delete-orphans]
+
+For every PDF in DATA_DIR the number of points in Qdrant, the ingestion
+checkpoint and the stored summary are compared with its manifest entry,
+which is created or corrected to match. Entries of files no longer on disk
+are removed. Points of sources without a file are reported, and deleted
+with `--delete-orphans`.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import cfg
+from src.logger import logger
+from src.pdf_extractor import page_count
+from src.rag import PDFProcessor
+from src.rag.chunk_store import payload_sources
+from src.rag.content_ids import get_file_hash
+from src.rag.ingestion_checkpoint import IngestionCheckpoint
+from src.schema.db import AsyncSessionLocal
+from src.schema.ingested_documents import (DOC_FAILED, DOC_INDEXED,
+                                           DOC_INDEXING, DOC_PENDING,
+                                           SUMMARY_DONE, SUMMARY_FAILED,
+                                           SUMMARY_PENDING, IngestedDocument)
+from src.schema.ingested_documents_crud import (delete_documents_except,
+                                                get_documents, upsert_document)
+from src.schema.source_summaries_crud import get_summarized_source_names
+
+
+class _NoLLM:
+    """The reconciler never summarises; this keeps PDFProcessor from loading an LLM."""
+
+    llm = None
+
+
+def _list_pdfs() -> List[str]:
+    upload_dir = Path(cfg.DATA_DIR)
+    if not upload_dir.is_dir():
+        return []
+    return sorted(
+        f.name for f in upload_dir.iterdir() if f.is_file() and f.suffix.lower() == ".pdf"
+    )
+
+
+async def _indexed_sources(processor: PDFProcessor) -> Set[str]:
+    """All sources present in the collection, including those of shared points."""
+    sources: Set[str] = set()
+    async with processor._qdrant() as client:
+        if not await client.collection_exists(cfg.COLLECTION_NAME):
+            return sources
+        offset = None
+        while True:
+            points, offset = await client.scroll(
+                collection_name=cfg.COLLECTION_NAME,
+                limit=1000,
+                offset=offset,
+                with_payload=["source"],
+                with_vectors=False,
+            )
+            sources.update(
+                source for p in points if p.payload for source in payload_sources(p.payload)
+            )
+            if offset is None:
+                break
+    sources.discard(None)
+    return sources
+
+
+async def _expected_entry(
+    processor: PDFProcessor,
+    file_name: str,
+    document: Optional[IngestedDocument],
+    summarized: Set[str],
+) -> Dict[str, Any]:
+    """The manifest values that match what is stored for `file_name`."""
+    file_hash = await asyncio.to_thread(get_file_hash, file_name)
+    points = await processor.count_points(file_name)
+    if points is None:
+        raise RuntimeError(f"Could not count the points of {file_name} in Qdrant")
+    values: Dict[str, Any] = {"file_hash": file_hash, "chunk_count": points, "error": None}
+
+    if await asyncio.to_thread(IngestionCheckpoint(file_name).exists):
+        values["embedding_status"] = DOC_INDEXING
+    elif points and await processor.has_content_indexed(file_name, file_hash):
+        values["embedding_status"] = DOC_INDEXED
+    elif points:
+        values["embedding_status"] = DOC_FAILED
+        values["error"] = "Indexed points belong to a different version of the file."
+    elif document is not None and document.embedding_status == DOC_FAILED:
+        values["embedding_status"] = DOC_FAILED
+        values["error"] = document.error
+    else:
+        values["embedding_status"] = DOC_PENDING
+
+    if file_name in summarized:
+        values["summary_status"] = SUMMARY_DONE
+    elif document is not None and document.summary_status == SUMMARY_FAILED:
+        values["summary_status"] = SUMMARY_FAILED
+    else:
+        values["summary_status"] = SUMMARY_PENDING
+    return values
+
+
+def _differences(document: Optional[IngestedDocument], values: Dict[str, Any]) -> List[str]:
+    if document is None:
+        return ["missing entry"]
+    return [
+        f"{key}: {getattr(document, key)!r} -> {value!r}"
+        for key, value in values.items()
+        if getattr(document, key) != value
+    ]
+
+
+async def reconcile(
+    db: AsyncSession,
+    processor: PDFProcessor,
+    dry_run: bool = False,
+    delete_orphans: bool = False,
+) -> Dict[str, int]:
+    files = await asyncio.to_thread(_list_pdfs)
+    manifest = await get_documents(db)
+    summarized = set(await get_summarized_source_names(db))
+    counts = {"checked": len(files), "repaired": 0, "removed": 0, "orphans": 0}
+
+    for file_name in files:
+        document = manifest.get(file_name)
+        values = await _expected_entry(processor, file_name, document, summarized)
+        changes = _differences(document, values)
+        if not changes:
+            continue
+        counts["repaired"] += 1
+        print(f"{file_name}: {'; '.join(changes)}")
+        if dry_run:
+            continue
+        if values["embedding_status"] == DOC_INDEXED and (
+            document is None or document.embedding_status != DOC_INDEXED
+        ):
+            file_path = os.path.join(cfg.DATA_DIR, file_name)
+            values["page_count"] = await asyncio.to_thread(page_count, file_path)
+            values["embedding_model"] = (
+                document.embedding_model if document else None
+            ) or cfg.EMBEDDING_MODEL_NAME
+        await upsert_document(db, file_name, **values)
+
+    stale = sorted(set(manifest) - set(files))
+    for file_name in stale:
+        print(f"{file_name}: file not found, removing manifest entry")
+    if stale and not dry_run:
+        await delete_documents_except(db, files)
+    counts["removed"] = len(stale)
+
+    orphans = sorted(await _indexed_sources(processor) - set(files))
+    counts["orphans"] = len(orphans)
+    for source in orphans:
+        print(f"{source}: points in Qdrant without a file")
+        if delete_orphans and not dry_run:
+            await processor.delete_embeddings(source)
+    return counts
+
+
+async def run(args: argparse.Namespace) -> int:
+    processor = PDFProcessor(interface=_NoLLM())
+    async with processor._qdrant() as client:
+        processor.qdrant_client = client
+        async with AsyncSessionLocal() as db:
+            counts = await reconcile(
+                db, processor, dry_run=args.dry_run, delete_orphans=args.delete_orphans
+            )
+    action = "would be repaired" if args.dry_run else "repaired"
+    print(
+        f"\n{counts['checked']} files checked, {counts['repaired']} entries {action}, "
+        f"{counts['removed']} stale entries {'found' if args.dry_run else 'removed'}, "
+        f"{counts['orphans']} orphaned sources in Qdrant"
+        + (" (deleted)" if args.delete_orphans and not args.dry_run and counts["orphans"] else "")
+    )
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Repair the ingested_documents manifest from Qdrant and the database."
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report what would be changed"
+    )
+    parser.add_argument(
+        "--delete-orphans",
+        action="store_true",
+        help="Delete Qdrant points of sources that have no file in DATA_DIR",
+    )
+    args = parser.parse_args(argv)
+    try:
+        return asyncio.run(run(args))
+    except Exception as e:
+        logger.error(f"Reconcile failed: {e}")
+        print(f"Reconcile failed: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,9 @@
+import asyncio
 import os
-from typing import List, Optional
+import time
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from langchain_core.documents import Document
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,7 +11,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.config import cfg
 from src.logger import logger
 from src.rag import ChatManager, LLM_Interface, Retriever
-from src.schema.db import get_db
+from src.rag.candidate_cache import candidate_cache
+from src.rag.compressor import ExtractiveCompressor
+from src.rag.context_packer import ContextPacker
+from src.rag.hedging import hedge_stats
+from src.rag.query_router import QueryRouter, routing_stats
+from src.schema.db import AsyncSessionLocal, get_db
 from src.schema.overall_summaries_crud import add_overall_summary, get_overall_summary
 from src.schema.source_summaries_crud import get_all_source_summaries
 
@@ -23,12 +30,50 @@ class QueryRequest(BaseModel):
     model_name: Optional[str] = None
 
 
+def _chunks_with_metadata(
+    context_chunks: List[str], chunk_metadata: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Merge chunks with their metadata for citations in the response."""
+    merged = []
+    for chunk, metadata in zip(context_chunks, chunk_metadata):
+        item = {
+            # Citations always show the full chunk, even when the prompt used
+            # a compressed version of it.
+            "text": metadata.get("original_text", chunk),
+            "source": metadata["source"],
+            "page_number": metadata["page_number"],
+        }
+        if "compressed_spans" in metadata:
+            item["compressed_spans"] = metadata["compressed_spans"]
+        merged.append(item)
+    return merged
+
+
+async def _compact_session_history(session_id: str) -> None:
+    """Background task: fold older turns of a long session into its summary."""
+    try:
+        # Summaries are generated with the default model, independent of routing.
+        llm_interface = LLM_Interface()
+        async with AsyncSessionLocal() as db:
+            await ChatManager().compact_history(
+                session_id, llm_interface.summarize_history, db
+            )
+    except Exception as e:
+        logger.error(f"Background history compaction failed for {session_id}: {e}")
+
+
 @router.post("/query")
-async def query_endpoint(request: QueryRequest, db: AsyncSession = Depends(get_db)):
+async def query_endpoint(
+    request: QueryRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+):
     """
     Query endpoint with per-request model selection.
 
-    - request.model_name omitted/None: Uses backend default cfg.MODEL_NAME (regular users)
+    - request.model_name omitted/None: Uses backend default cfg.MODEL_NAME for
+      query rewriting and lets the query router pick the generation model
+      when cfg.ROUTER_ENABLED (regular users)
     - request.model_name provided: Uses specified model (admin users)
     """
     # Resolve model: use provided model_name or default
@@ -55,41 +100,76 @@ async def query_endpoint(request: QueryRequest, db: AsyncSession = Depends(get_d
 
     # Pass DB session into retriever so it can load source summaries when available.
     context_chunks, chunk_metadata = await retriever.retrieve(
-        query=request.query, pdfs=valid_pdfs, db=db
+        query=request.query, pdfs=valid_pdfs, db=db, session_id=session_id
     )
     logger.info(f"Retrieved {len(context_chunks)} chunks for the query in chat.py")
+    if cfg.COMPRESSION_ENABLED:
+        context_chunks, chunk_metadata = await asyncio.to_thread(
+            ExtractiveCompressor().compress,
+            retriever.last_query_embedding,
+            context_chunks,
+            chunk_metadata,
+        )
+    # Drop near-duplicates and keep the prompt within cfg.CONTEXT_TOKEN_BUDGET.
+    context_chunks, chunk_metadata = ContextPacker().pack(context_chunks, chunk_metadata)
     logger.info(f"Returning {len(context_chunks)} context chunks in response.")
 
+    routing = None
+    if request.model_name is None and cfg.ROUTER_ENABLED:
+        try:
+            routing = await asyncio.to_thread(
+                QueryRouter().route,
+                request.query,
+                len(valid_pdfs),
+                retriever.last_rerank_scores,
+                retriever.last_query_embedding,
+            )
+            if routing["model"] != llm_interface.model_name:
+                llm_interface.set_model(routing["model"])
+        except Exception as e:
+            logger.error(f"Query routing failed, keeping {resolved_model}: {e}")
+
+    await chat_manager.load_session(session_id, db)
+
     try:
         # Use the async LLM API to avoid blocking the event loop.
+        started = time.perf_counter()
         response = await llm_interface.agenerate_response(
             session_id, chat_manager, context_chunks, request.query
         )
-        logger.info("Generated full response for query.")
+        latency = time.perf_counter() - started
+        routing_stats.record(llm_interface.model_name, latency)
+        logger.info(
+            f"Generated full response for query with {llm_interface.model_name} "
+            f"in {latency:.2f}s (routing: {routing['label'] if routing else 'none'}, "
+            f"complexity: {routing['complexity'] if routing else 'n/a'})"
+        )
+
+        # Record the turn; cited chunks are stored by point id, not by text.
+        chat_manager.add_message(session_id, "user", request.query)
+        chat_manager.add_message(
+            session_id,
+            "assistant",
+            str(response),
+            chunk_ids=[m["point_id"] for m in chunk_metadata if m.get("point_id")],
+        )
+        await chat_manager.persist(session_id, db)
+        # Runs after the response is sent; a no-op until the session is long.
+        background_tasks.add_task(_compact_session_history, session_id)
 
         # Merge chunks with their metadata for the response
-        chunks_with_metadata = [
-            {
-                "text": context_chunks[i],
-                "source": chunk_metadata[i]["source"],
-                "page_number": chunk_metadata[i]["page_number"],
-            }
-            for i in range(len(context_chunks))
-        ]
-
-        return {"response": response, "context_chunks": chunks_with_metadata}
+        chunks_with_metadata = _chunks_with_metadata(context_chunks, chunk_metadata)
+
+        return {
+            "response": response,
+            "context_chunks": chunks_with_metadata,
+            "model_name": llm_interface.model_name,
+        }
     except Exception as e:
         logger.error(f"Error generating response: {e}")
 
         # Merge chunks with their metadata for error response too
-        chunks_with_metadata = [
-            {
-                "text": context_chunks[i],
-                "source": chunk_metadata[i]["source"],
-                "page_number": chunk_metadata[i]["page_number"],
-            }
-            for i in range(len(context_chunks))
-        ]
+        chunks_with_metadata = _chunks_with_metadata(context_chunks, chunk_metadata)
 
         return {
             "error": "Failed to generate response.",
@@ -180,3 +260,24 @@ def get_default_model():
         "provider": cfg.LLM_PROVIDER,
         "supported_models": cfg.SUPPORTED_MODELS,  # Returns full list with id and name
     }
+
+
+@router.get("/stats")
+def get_generation_stats():
+    """
+    Returns in-process generation statistics.
+
+    `hedging` is keyed by model id and reports how often the model's first
+    token missed cfg.HEDGE_FIRST_TOKEN_TIMEOUT (hedge_rate) and how often the
+    fallback model won the race once hedged (fallback_win_rate); `failed`
+    counts requests where every stream failed.
+    `routing` reports, per generation model, how many queries it served and
+    their average generation latency.
+    `candidate_cache` reports the fraction of retrieval turns served from the
+    previous turn's cached candidates (cached_turn_rate).
+    """
+    return {
+        "hedging": hedge_stats.snapshot(),
+        "routing": routing_stats.snapshot(),
+        "candidate_cache": candidate_cache.stats(),
+    }
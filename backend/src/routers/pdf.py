@@ -1,16 +1,38 @@
 import asyncio
+import hashlib
 import os
+import uuid
 from pathlib import Path
+from typing import AsyncIterator, Callable, Optional, Tuple
 
 import aiofiles
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import (APIRouter, Depends, File, HTTPException, Query, Request,
+                     Response, UploadFile)
 from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.config import cfg
 from src.logger import logger
+from src.page_renderer import (IMAGE_MEDIA_TYPES, page_cache, page_text,
+                               render_page, webp_available)
+from src.page_text_cache import page_text_cache
+from src.pdf_catalog import pdf_catalog, processing_state
+from src.pdf_extractor import page_count
 from src.rag import PDFProcessor
-from src.schema.db import get_db
+from src.rag.candidate_cache import candidate_cache
+from src.rag.content_ids import (clear_file_hash, get_file_hash,
+                                 record_file_hash)
+from src.rag.ingestion_checkpoint import IngestionCheckpoint
+from src.schema.db import AsyncSessionLocal, get_db
+from src.schema.ingested_documents import DOC_PENDING, SUMMARY_PENDING
+from src.schema.ingested_documents_crud import (count_documents_with_hash,
+                                                delete_document, get_document,
+                                                upsert_document)
+from src.schema.ingestion_jobs import (JOB_FAILED, JOB_KIND_REINDEX,
+                                       JOB_SUCCEEDED)
+from src.schema.ingestion_jobs_crud import (enqueue_job, get_active_job,
+                                            get_job, get_job_events)
 from src.schema.overall_summaries_crud import \
     delete_overall_summaries_containing_file
 from src.schema.source_summaries_crud import (delete_source_summary,
@@ -19,58 +41,187 @@ from src.schema.source_summaries_crud import (delete_source_summary,
 router = APIRouter()
 
 
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
 @router.get("/list")
-async def list_pdfs():
+async def list_pdfs(
+    request: Request,
+    limit: int = Query(cfg.PDF_LIST_PAGE_SIZE, ge=1, le=cfg.PDF_LIST_MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    state: Optional[str] = None,
+    has_summary: Optional[bool] = None,
+    q: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    List uploaded PDFs with their size, page count, processing state,
+    summary availability and indexing time, sorted by file name.
+
+    Pages are `limit` files long; pass the returned `next_cursor` as `after`
+    to get the next one. `state`, `has_summary` and `q` (substring of the
+    file name) filter the list. Responses carry an ETag; a request with a
+    matching If-None-Match gets 304 Not Modified.
+    """
     try:
-        upload_dir = Path(cfg.DATA_DIR)
-        # mkdir and iterdir are blocking filesystem ops; run them in a thread.
-        await asyncio.to_thread(upload_dir.mkdir, exist_ok=True)
-
-        def _list_pdfs():
-            return [
-                f.name
-                for f in upload_dir.iterdir()
-                if f.is_file() and f.suffix.lower() == ".pdf"
-            ]
-
-        pdf_files = await asyncio.to_thread(_list_pdfs)
-        return JSONResponse(content={"pdfs": pdf_files}, status_code=200)
+        snapshot = await pdf_catalog.snapshot(db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list PDFs: {str(e)}")
 
+    etag = pdf_catalog.etag(snapshot, str(request.query_params))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    page = pdf_catalog.page(
+        snapshot, limit, after=after, state=state, has_summary=has_summary, q=q
+    )
+    return JSONResponse(content=page, status_code=200, headers=headers)
+
 
 async def _check_file_processing_state(
     filename: str, file_path: Path, db: AsyncSession
 ) -> str:
-    """Check the processing state of a file through three layers of validation."""
+    """Check the processing state of a file from the ingested_documents manifest."""
     logger.info(f"Checking processing state for file: {filename}")
 
-    # Layer 1: Check if file exists on disk
     file_exists = await asyncio.to_thread(file_path.exists)
     logger.debug(f"File exists on disk: {file_exists} for {filename}")
     if not file_exists:
         logger.info(f"File {filename} is new - not found on disk")
         return "new"
 
-    # Layer 2: Check if embeddings exist
+    document = await get_document(db, filename)
+    if document is None:
+        # Uploaded before the manifest existed and not reconciled yet.
+        logger.info(f"No manifest entry for {filename}; probing Qdrant and summaries")
+        return await _probe_processing_state(filename, db)
+
+    state = processing_state(document)
+    logger.info(f"Processing state of {filename} from manifest: {state}")
+    return state
+
+
+async def _probe_processing_state(filename: str, db: AsyncSession) -> str:
+    """Derive the state of a file without a manifest entry from Qdrant and the summaries."""
     pdf_processor = PDFProcessor()
     has_embeddings = await pdf_processor._check_existing_embeddings(filename)
-    logger.debug(f"Embeddings exist: {has_embeddings} for {filename}")
-    if not has_embeddings:
-        logger.info(f"File {filename} exists but missing embeddings - partial state")
+    # An ingestion checkpoint means indexing stopped part-way through.
+    indexing_incomplete = await asyncio.to_thread(
+        IngestionCheckpoint(filename).exists
+    )
+    if not has_embeddings or indexing_incomplete:
         return "partial_embeddings_missing"
+    if not await get_summary_by_source_name(db, filename):
+        return "partial_summary_missing"
+    return "complete"
 
-    # Layer 3: Check if summary exists in database
-    existing_summary = await get_summary_by_source_name(db, filename)
-    logger.debug(f"Summary exists: {existing_summary is not None} for {filename}")
-    if not existing_summary:
-        logger.info(
-            f"File {filename} exists with embeddings but missing summary - partial state"
+
+async def _record_upload(db: AsyncSession, filename: str, file_hash: str) -> None:
+    """Start a fresh manifest entry for a newly stored upload."""
+    try:
+        await upsert_document(
+            db,
+            filename,
+            file_hash=file_hash,
+            page_count=None,
+            chunk_count=0,
+            embedding_model=None,
+            index_version=None,
+            embedding_status=DOC_PENDING,
+            summary_status=SUMMARY_PENDING,
+            error=None,
+            indexed_at=None,
+            summarized_at=None,
         )
-        return "partial_summary_missing"
+    except Exception as e:
+        # Processing records the entry again, so the upload still succeeds.
+        logger.error(f"Failed to record manifest entry for {filename}: {e}")
+        await db.rollback()
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. The maximum size is {cfg.MAX_UPLOAD_BYTES // (1024 * 1024)} MB.",
+    )
+
+
+async def _receive_upload(
+    chunks: AsyncIterator[bytes],
+    file_name: str,
+    declared_size: Optional[int] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> Tuple[Path, str]:
+    """
+    Stream an upload into UPLOAD_TMP_DIR chunk by chunk, hashing it on the
+    way, so memory use does not depend on the file size. Rejects files
+    without a PDF header (415) or larger than MAX_UPLOAD_BYTES (413).
+    `on_progress` is called with the number of bytes received so far.
+    Returns the temporary path and the SHA-256; the caller moves the file.
+    """
+    if declared_size is not None and declared_size > cfg.MAX_UPLOAD_BYTES:
+        raise _too_large()
+
+    tmp_dir = Path(cfg.UPLOAD_TMP_DIR)
+    await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+    tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+    # Readers accept the header anywhere in the first 1024 bytes.
+    head = b""
+    try:
+        async with aiofiles.open(tmp_path, "wb") as buffer:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if len(head) < 1024:
+                    head += chunk[: 1024 - len(head)]
+                    if len(head) == 1024 and b"%PDF-" not in head:
+                        raise HTTPException(
+                            status_code=415, detail="The uploaded file is not a PDF."
+                        )
+                size += len(chunk)
+                if size > cfg.MAX_UPLOAD_BYTES:
+                    raise _too_large()
+                digest.update(chunk)
+                await buffer.write(chunk)
+                if on_progress is not None:
+                    on_progress(size)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="The uploaded file is empty.")
+        if b"%PDF-" not in head:
+            raise HTTPException(status_code=415, detail="The uploaded file is not a PDF.")
+    except HTTPException:
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        raise
+    except Exception as e:
+        logger.error(f"Failed to receive upload {file_name}: {str(e)}")
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
+    except asyncio.CancelledError:
+        # Client went away mid-upload.
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        raise
+    logger.info(f"Received {file_name}: {size} bytes, sha256 {digest.hexdigest()}")
+    return tmp_path, digest.hexdigest()
+
+
+async def _stream_upload(file: UploadFile) -> Tuple[Path, str]:
+    """Receive a multipart upload with _receive_upload, UPLOAD_CHUNK_SIZE at a time."""
+
+    async def chunks() -> AsyncIterator[bytes]:
+        while chunk := await file.read(cfg.UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+    return await _receive_upload(chunks(), file.filename or "", declared_size=file.size)
 
-    logger.info(f"File {filename} is fully processed - complete state")
-    return "complete"
 
 @router.post("/upload")
 async def upload_pdf(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
@@ -138,18 +289,27 @@ async def upload_pdf(file: UploadFile = File(...), db: AsyncSession = Depends(ge
 
     # New file - proceed with upload
     logger.info(f"Proceeding with new file upload: {file.filename}")
+    tmp_path, file_hash = await _stream_upload(file)
     try:
-        async with aiofiles.open(file_path, "wb") as buffer:
-            content = await file.read()
-            await buffer.write(content)
+        # Atomic rename: the file appears in DATA_DIR only once it is complete.
+        await asyncio.to_thread(os.replace, tmp_path, file_path)
+        # Content hash drives deterministic point ids and duplicate detection.
+        await asyncio.to_thread(record_file_hash, file.filename, file_hash)
+        await _record_upload(db, file.filename, file_hash)
+        pdf_catalog.invalidate()
 
         logger.info(f"Successfully uploaded new file: {file.filename}")
         return JSONResponse(
             status_code=201,
-            content={"filename": file.filename, "processing_state": "new"},
+            content={
+                "filename": file.filename,
+                "processing_state": "new",
+                "file_hash": file_hash,
+            },
         )
     except Exception as e:
         logger.error(f"Failed to upload file {file.filename}: {str(e)}")
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
         raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
 
 
@@ -178,6 +338,7 @@ async def delete_pdf(filename: str, db: AsyncSession = Depends(get_db)):
     """
     Delete a PDF and all associated data (file, embeddings, summaries).
     Runs all deletion operations in parallel for efficiency.
+    Returns 409 while an ingestion job for the file is queued or running.
     """
     logger.info(f"Received delete request for PDF: {filename}")
 
@@ -193,11 +354,26 @@ async def delete_pdf(filename: str, db: AsyncSession = Depends(get_db)):
     if not exists:
         logger.warning(f"Delete request for non-existent file: {filename}")
         raise HTTPException(status_code=404, detail="File not found.")
+    # A worker would keep writing points and the manifest row for the file.
+    if await get_active_job(db, filename) is not None:
+        logger.warning(f"Delete request for {filename} while it is being processed")
+        raise HTTPException(
+            status_code=409, detail="File is being processed. Try again when it is done."
+        )
 
     try:
         logger.info(f"Starting parallel deletion operations for: {filename}")
         pdf_processor = PDFProcessor()
 
+        await asyncio.to_thread(IngestionCheckpoint(filename).clear)
+        try:
+            file_hash = await asyncio.to_thread(get_file_hash, filename)
+            await asyncio.to_thread(page_cache.discard, file_hash)
+        except Exception as e:
+            file_hash = None
+            logger.warning(f"Failed to drop cached pages of {filename}: {e}")
+        await asyncio.to_thread(clear_file_hash, filename)
+
         # Run non-DB operations in parallel
         file_deleted, embeddings_deleted = await asyncio.gather(
             _delete_pdf_file(filename),
@@ -206,6 +382,11 @@ async def delete_pdf(filename: str, db: AsyncSession = Depends(get_db)):
         )
 
         # Run DB operations sequentially on the same session to avoid concurrent use
+        await delete_document(db, filename)
+        pdf_catalog.invalidate()
+        # Identical files share the extracted text; keep it while one is left.
+        if file_hash and await count_documents_with_hash(db, file_hash) == 0:
+            await asyncio.to_thread(page_text_cache.discard, file_hash)
         summary_result = await delete_source_summary(db, filename)
 
         try:
@@ -301,21 +482,247 @@ async def delete_pdf(filename: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
 
 
+async def _stream_job(job_id: int):
+    """
+    Stream a job's status messages from the ingestion_jobs tables as
+    server-sent events, ending with "done" once the job has finished.
+    The job keeps running if the client disconnects.
+    """
+    last_event_id = 0
+    error_sent = False
+    while True:
+        # Short-lived sessions so an open stream does not pin a connection.
+        async with AsyncSessionLocal() as db:
+            # Read the status before the events: every event of a finished
+            # job is committed before its final status.
+            job = await get_job(db, job_id)
+            events = await get_job_events(db, job_id, after_id=last_event_id)
+        for event in events:
+            last_event_id = event.id
+            error_sent = error_sent or event.message.startswith("Error:")
+            yield f"data: {event.message}\n\n"
+        if job is None:
+            yield "data: Error: Ingestion job not found.\n\n"
+            break
+        if job.status in (JOB_SUCCEEDED, JOB_FAILED) and not events:
+            if job.kind == JOB_KIND_REINDEX:
+                # The worker re-indexed in its own process; drop this one's
+                # cached candidates of the old version.
+                candidate_cache.invalidate_source(job.file_name)
+            if job.status == JOB_FAILED and not error_sent:
+                # e.g. failed by the stale-job reaper, which records no event
+                yield f"data: Error: {job.error or 'Processing failed.'}\n\n"
+            break
+        if not events:
+            await asyncio.sleep(cfg.JOB_STATUS_POLL_SECONDS)
+    yield "data: done\n\n"
+
+
 @router.get("/process/{filename}")
 async def process_uploaded_pdf(filename: str, db: AsyncSession = Depends(get_db)):
-    pdf_processor = PDFProcessor()
+    """
+    Queue a processing job for an uploaded PDF (or attach to the one already
+    queued or running) and stream its status. The work is done by
+    `src.worker` processes, not by the API.
+    """
     file_path = Path(cfg.DATA_DIR) / filename
     if not await asyncio.to_thread(file_path.exists):
         raise HTTPException(status_code=404, detail="File not found.")
 
+    job, created = await enqueue_job(
+        db, filename, max_attempts=cfg.INGEST_JOB_MAX_ATTEMPTS
+    )
+    logger.info(
+        f"{'Queued' if created else 'Attached to'} ingestion job {job.id} for {filename}"
+    )
+    return StreamingResponse(
+        _stream_job(job.id),
+        media_type="text/event-stream",
+        headers={"X-Job-Id": str(job.id)},
+    )
+
+
+class _BodyReadingEventStream(StreamingResponse):
+    """
+    Event stream whose generator is still reading the request body. The
+    default StreamingResponse may read `receive` to watch for disconnects,
+    which would swallow body chunks; here a disconnect surfaces through the
+    body reader or a failed send instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+@router.post("/upload-and-process/{filename}")
+async def upload_and_process_pdf(
+    filename: str, request: Request, db: AsyncSession = Depends(get_db)
+):
+    """
+    Upload a PDF as the raw request body (e.g. Content-Type: application/pdf)
+    and stream upload and processing progress as one server-sent event stream.
+
+    The body is hashed while it is written to disk, so the file is handed to
+    the ingestion workers the moment it is durable: the job is queued and the
+    workers are notified right away, without a separate /process call or a
+    second pass over the file.
+    """
+    if not filename.lower().endswith(".pdf") or Path(filename).name != filename:
+        raise HTTPException(
+            status_code=400, detail="Invalid file format. Please upload a PDF."
+        )
+    content_length = request.headers.get("content-length")
+    declared_size = int(content_length) if content_length and content_length.isdigit() else None
+    if declared_size is not None and declared_size > cfg.MAX_UPLOAD_BYTES:
+        raise _too_large()
+
+    upload_dir = Path(cfg.DATA_DIR)
+    await asyncio.to_thread(upload_dir.mkdir, exist_ok=True)
+    file_path = upload_dir / filename
+    processing_state = await _check_file_processing_state(filename, file_path, db)
+    logger.info(f"Processing state for {filename}: {processing_state}")
+    if processing_state == "complete":
+        return JSONResponse(
+            status_code=409,
+            content={
+                "detail": "File already exists and is fully processed.",
+                "filename": filename,
+                "processing_state": "complete",
+            },
+        )
+
     async def generate():
-        logger.info(f"Starting processing for {file_path}")
-        # Pass the async DB session into the processor so it can persist summaries
-        async for update in pdf_processor.process_pdf(filename, db=db):
-            yield f"data: {update}\n\n"
-        yield "data: done\n\n"
+        if processing_state == "new":
+            received: asyncio.Queue = asyncio.Queue()
+            receive = asyncio.create_task(
+                _receive_upload(
+                    request.stream(), filename, declared_size, on_progress=received.put_nowait
+                )
+            )
+            # One message per ~5% of the file (or per 8 MB if the size is unknown)
+            step = max(declared_size // 20, 1024 * 1024) if declared_size else 8 * 1024 * 1024
+            reported = 0
+            yield "data: Uploading...\n\n"
+            try:
+                while not receive.done():
+                    get = asyncio.ensure_future(received.get())
+                    await asyncio.wait({get, receive}, return_when=asyncio.FIRST_COMPLETED)
+                    if not get.done():
+                        get.cancel()
+                        continue
+                    size = get.result()
+                    while not received.empty():
+                        size = received.get_nowait()
+                    if size - reported >= step:
+                        reported = size
+                        total = f"/{declared_size / 2**20:.1f}" if declared_size else ""
+                        yield f"data: Uploading: {size / 2**20:.1f}{total} MB received\n\n"
+                tmp_path, file_hash = receive.result()
+            except HTTPException as e:
+                yield f"data: Error: {e.detail}\n\n"
+                yield "data: done\n\n"
+                return
+            finally:
+                receive.cancel()
+            try:
+                await asyncio.to_thread(os.replace, tmp_path, file_path)
+                await asyncio.to_thread(record_file_hash, filename, file_hash)
+                async with AsyncSessionLocal() as session:
+                    await _record_upload(session, filename, file_hash)
+                pdf_catalog.invalidate()
+            except Exception as e:
+                logger.error(f"Failed to store upload {filename}: {str(e)}")
+                await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+                yield f"data: Error: Failed to upload file: {str(e)}\n\n"
+                yield "data: done\n\n"
+                return
+            yield "data: Upload complete. Starting processing...\n\n"
+        else:
+            # Same as /upload for partially processed files: keep the stored
+            # copy and continue where processing stopped.
+            yield "data: File already uploaded. Resuming processing...\n\n"
 
-    return StreamingResponse(generate(), media_type="text/event-stream")
+        async with AsyncSessionLocal() as session:
+            job, created = await enqueue_job(
+                session, filename, max_attempts=cfg.INGEST_JOB_MAX_ATTEMPTS
+            )
+        logger.info(
+            f"{'Queued' if created else 'Attached to'} ingestion job {job.id} for {filename}"
+        )
+        async for event in _stream_job(job.id):
+            yield event
+
+    return _BodyReadingEventStream(generate(), media_type="text/event-stream")
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "id": job.id,
+        "file_name": job.file_name,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "worker_id": job.worker_id,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@router.put("/replace/{filename}")
+async def replace_pdf(
+    filename: str, file: UploadFile = File(...), db: AsyncSession = Depends(get_db)
+):
+    """
+    Replace an existing PDF with a new version and re-index it incrementally.
+    The re-index runs as an ingestion job; its status is streamed as
+    server-sent events, like /process.
+    """
+    if not filename.lower().endswith(".pdf"):
+        raise HTTPException(
+            status_code=400, detail="Invalid file format. Please upload a PDF."
+        )
+    file_path = Path(cfg.DATA_DIR) / filename
+    if not await asyncio.to_thread(file_path.exists):
+        raise HTTPException(status_code=404, detail="File not found.")
+    if await get_active_job(db, filename) is not None:
+        raise HTTPException(
+            status_code=409, detail="File is already being processed."
+        )
+
+    staged_path, _ = await _stream_upload(file)
+
+    # The staged upload is consumed by the first attempt, so it is not retried.
+    job, created = await enqueue_job(
+        db,
+        filename,
+        max_attempts=1,
+        kind=JOB_KIND_REINDEX,
+        staged_path=str(staged_path),
+    )
+    if not created:
+        await asyncio.to_thread(staged_path.unlink, missing_ok=True)
+        raise HTTPException(
+            status_code=409, detail="File is already being processed."
+        )
+    logger.info(f"Queued re-index job {job.id} for {filename}")
+    return StreamingResponse(
+        _stream_job(job.id),
+        media_type="text/event-stream",
+        headers={"X-Job-Id": str(job.id)},
+    )
 
 
 @router.get("/view/{filename}")
@@ -328,6 +735,75 @@ async def view_pdf(filename: str):
     return FileResponse(str(file_path), media_type="application/pdf", filename=filename)
 
 
+@router.get("/page/{filename}/{page_number}")
+async def get_pdf_page(
+    filename: str,
+    page_number: int,
+    request: Request,
+    format: str = Query("png", pattern="^(png|jpeg|webp|text)$"),
+    dpi: int = Query(
+        cfg.PAGE_RENDER_DEFAULT_DPI, ge=cfg.PAGE_RENDER_MIN_DPI, le=cfg.PAGE_RENDER_MAX_DPI
+    ),
+    highlight: Optional[str] = Query(None, max_length=8000),
+):
+    """
+    One page (1-based) of a PDF, for citation previews: rendered to an image
+    at `dpi`, or with `format=text` the page text plus the character ranges
+    and rectangles (PDF points) of `highlight`, e.g. the cited chunk.
+    Rendered pages are cached on disk; responses carry strong ETags.
+    """
+    file_path = Path(cfg.DATA_DIR) / filename
+    if not filename.lower().endswith(".pdf") or not await asyncio.to_thread(
+        file_path.exists
+    ):
+        raise HTTPException(status_code=404, detail="PDF not found")
+    if format == "webp" and not webp_available():
+        raise HTTPException(
+            status_code=400, detail="WebP output is not available; use png or jpeg."
+        )
+    try:
+        file_hash = await asyncio.to_thread(get_file_hash, filename)
+        total_pages = await asyncio.to_thread(page_count, str(file_path))
+    except Exception as e:
+        logger.error(f"Failed to open {filename}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to open PDF: {str(e)}")
+    if not 1 <= page_number <= total_pages:
+        raise HTTPException(status_code=404, detail="Page not found")
+
+    if format == "text":
+        tag = hashlib.sha1(
+            f"{file_hash}:{page_number}:text:{highlight or ''}".encode()
+        ).hexdigest()
+    else:
+        key = page_cache.key(file_hash, page_number, dpi, format)
+        tag = hashlib.sha1(key.encode()).hexdigest()
+    etag = f'"{tag}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        if format == "text":
+            content = await asyncio.to_thread(
+                page_text, str(file_path), page_number, highlight, file_hash
+            )
+            return JSONResponse(
+                content={"file_name": filename, **content}, headers=headers
+            )
+        image = await asyncio.to_thread(page_cache.get, key)
+        if image is None:
+            image = await asyncio.to_thread(
+                render_page, str(file_path), page_number, dpi, format
+            )
+            await asyncio.to_thread(page_cache.put, key, image)
+    except Exception as e:
+        logger.error(f"Failed to render page {page_number} of {filename}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to render page: {str(e)}")
+    return Response(
+        content=image, media_type=IMAGE_MEDIA_TYPES[format], headers=headers
+    )
+
+
 @router.get("/summary/{filename}")
 async def get_summary(filename: str, db: AsyncSession = Depends(get_db)):
     logger.info(f"Fetching summary for filename: {filename}")
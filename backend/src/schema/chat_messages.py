@@ -0,0 +1,20 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, String, Text, func
+
+from src.schema.db import Base
+
+
+class ChatHistoryMessage(Base):
+    """Append-only chat message rows; one row per message in a session."""
+
+    __tablename__ = "chat_messages"
+    id = Column(BigInteger, primary_key=True)
+    session_id = Column(String, nullable=False)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    # JSON list of Qdrant point ids cited by an assistant message
+    chunk_ids = Column(Text, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    __table_args__ = (Index("ix_chat_messages_session_id_id", "session_id", "id"),)
@@ -0,0 +1,69 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.schema.chat_messages import ChatHistoryMessage
+
+
+async def add_chat_messages(
+    db: AsyncSession, session_id: str, messages: List[Dict[str, Any]]
+) -> List[int]:
+    """
+    Append messages to a session in a single bulk INSERT.
+
+    Each message is a dict with `role`, `content` and optional `chunk_ids`.
+    Returns the ids of the new rows, in input order.
+    """
+    if not messages:
+        return []
+    rows = [
+        {
+            "session_id": session_id,
+            "role": message["role"],
+            "content": message["content"],
+            "chunk_ids": json.dumps(message["chunk_ids"])
+            if message.get("chunk_ids")
+            else None,
+        }
+        for message in messages
+    ]
+    res = await db.execute(
+        insert(ChatHistoryMessage).returning(
+            ChatHistoryMessage.id, sort_by_parameter_order=True
+        ),
+        rows,
+    )
+    ids = [row.id for row in res]
+    await db.commit()
+    return ids
+
+
+async def get_recent_chat_messages(
+    db: AsyncSession, session_id: str, limit: int, after_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Return the last `limit` messages of a session, oldest first.
+
+    When `after_id` is given, only messages newer than that row are considered
+    (e.g. messages not yet folded into the session summary).
+    """
+    stmt = select(ChatHistoryMessage).where(
+        ChatHistoryMessage.session_id == session_id
+    )
+    if after_id is not None:
+        stmt = stmt.where(ChatHistoryMessage.id > after_id)
+    stmt = stmt.order_by(ChatHistoryMessage.id.desc()).limit(limit)
+    res = await db.execute(stmt)
+    rows = list(res.scalars().all())
+    rows.reverse()
+    return [
+        {
+            "id": row.id,
+            "role": row.role,
+            "content": row.content,
+            "chunk_ids": json.loads(row.chunk_ids) if row.chunk_ids else [],
+        }
+        for row in rows
+    ]
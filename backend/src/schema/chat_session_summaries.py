@@ -0,0 +1,17 @@
+from sqlalchemy import BigInteger, Column, DateTime, String, Text, func
+
+from src.schema.db import Base
+
+
+class ChatSessionSummary(Base):
+    __tablename__ = "chat_session_summaries"
+    session_id = Column(String, primary_key=True)
+    summary = Column(Text, nullable=False)
+    # Id of the last chat_messages row folded into the summary
+    last_message_id = Column(BigInteger, nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.schema.chat_session_summaries import ChatSessionSummary
+
+
+async def get_session_summary(
+    db: AsyncSession, session_id: str
+) -> Optional[ChatSessionSummary]:
+    stmt = select(ChatSessionSummary).where(
+        ChatSessionSummary.session_id == session_id
+    )
+    res = await db.execute(stmt)
+    return res.scalars().first()
+
+
+async def upsert_session_summary(
+    db: AsyncSession, session_id: str, summary: str, last_message_id: int
+) -> None:
+    stmt = insert(ChatSessionSummary).values(
+        session_id=session_id, summary=summary, last_message_id=last_message_id
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ChatSessionSummary.session_id],
+        set_={
+            "summary": stmt.excluded.summary,
+            "last_message_id": stmt.excluded.last_message_id,
+            "updated_at": func.now(),
+        },
+    )
+    await db.execute(stmt)
+    await db.commit()
@@ -0,0 +1,55 @@
+from sqlalchemy import (BigInteger, Column, ForeignKey, Index, Integer,
+                        LargeBinary, SmallInteger, String, Text)
+
+from src.schema.db import Base
+
+
+class ChunkText(Base):
+    """Text of an indexed chunk, keyed by its Qdrant point id."""
+
+    __tablename__ = "chunk_texts"
+    point_id = Column(String, primary_key=True)
+    # The document the point was indexed for (its owner)
+    source = Column(String, nullable=False)
+    text = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=True)
+    # MinHash signature (little-endian uint64s) for near-duplicate detection
+    minhash = Column(LargeBinary, nullable=True)
+
+    __table_args__ = (Index("ix_chunk_texts_source", "source"),)
+
+
+class ChunkBand(Base):
+    """LSH bucket of one band of a chunk's MinHash signature."""
+
+    __tablename__ = "chunk_lsh_bands"
+    band = Column(SmallInteger, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    point_id = Column(
+        String,
+        ForeignKey("chunk_texts.point_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    __table_args__ = (Index("ix_chunk_lsh_bands_point_id", "point_id"),)
+
+
+class ChunkRef(Base):
+    """
+    A chunk of another document that is a near-duplicate of this point and
+    is served by it, with where the chunk lies in that document.
+    """
+
+    __tablename__ = "chunk_refs"
+    point_id = Column(
+        String,
+        ForeignKey("chunk_texts.point_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    source = Column(String, primary_key=True)
+    file_hash = Column(String, nullable=True)
+    page_number = Column(Integer, nullable=True)
+    page_start = Column(Integer, nullable=True)
+    page_end = Column(Integer, nullable=True)
+
+    __table_args__ = (Index("ix_chunk_refs_source", "source"),)
@@ -0,0 +1,166 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.schema.chunk_texts import ChunkBand, ChunkRef, ChunkText
+
+
+async def upsert_chunk_texts(
+    db: AsyncSession,
+    rows: List[Dict[str, Any]],
+    bands: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    """
+    Insert or overwrite chunk texts; each row has point_id, source, text,
+    token_count and minhash. `bands` rows (band, bucket, point_id) are
+    added in the same transaction.
+    """
+    if not rows:
+        return
+    stmt = insert(ChunkText).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ChunkText.point_id],
+        set_={
+            "source": stmt.excluded.source,
+            "text": stmt.excluded.text,
+            "token_count": stmt.excluded.token_count,
+            "minhash": stmt.excluded.minhash,
+        },
+    )
+    await db.execute(stmt)
+    if bands:
+        await db.execute(insert(ChunkBand).values(bands).on_conflict_do_nothing())
+    await db.commit()
+
+
+async def get_chunk_texts(db: AsyncSession, point_ids: Iterable[str]) -> Dict[str, str]:
+    """Texts by point id; ids without a stored text are left out."""
+    ids = list(point_ids)
+    if not ids:
+        return {}
+    res = await db.execute(
+        select(ChunkText.point_id, ChunkText.text).where(ChunkText.point_id.in_(ids))
+    )
+    return {point_id: text for point_id, text in res.all()}
+
+
+async def get_band_candidates(
+    db: AsyncSession, buckets: Iterable[Tuple[int, int]]
+) -> Dict[Tuple[int, int], List[str]]:
+    """Point ids in each of the given (band, bucket) pairs."""
+    pairs = list(buckets)
+    if not pairs:
+        return {}
+    res = await db.execute(
+        select(ChunkBand.band, ChunkBand.bucket, ChunkBand.point_id).where(
+            tuple_(ChunkBand.band, ChunkBand.bucket).in_(pairs)
+        )
+    )
+    candidates: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+    for band, bucket, point_id in res.all():
+        candidates[(band, bucket)].append(point_id)
+    return candidates
+
+
+async def get_chunk_signatures(
+    db: AsyncSession, point_ids: Iterable[str]
+) -> Dict[str, Tuple[str, bytes]]:
+    """(owner source, MinHash signature) by point id, for points that have one."""
+    ids = list(point_ids)
+    if not ids:
+        return {}
+    res = await db.execute(
+        select(ChunkText.point_id, ChunkText.source, ChunkText.minhash).where(
+            ChunkText.point_id.in_(ids), ChunkText.minhash.is_not(None)
+        )
+    )
+    return {point_id: (source, minhash) for point_id, source, minhash in res.all()}
+
+
+async def lock_chunk_texts(
+    db: AsyncSession,
+    point_ids: Optional[Iterable[str]] = None,
+    source: Optional[str] = None,
+) -> Dict[str, ChunkText]:
+    """
+    Rows of the given points and/or owned by `source`, locked until the
+    transaction ends (in id order, so concurrent callers cannot deadlock).
+    Does not commit.
+    """
+    stmt = select(ChunkText).order_by(ChunkText.point_id).with_for_update()
+    if point_ids is not None:
+        stmt = stmt.where(ChunkText.point_id.in_(list(point_ids)))
+    if source is not None:
+        stmt = stmt.where(ChunkText.source == source)
+    res = await db.execute(stmt)
+    return {row.point_id: row for row in res.scalars().all()}
+
+
+async def upsert_chunk_refs(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Add or update references (point_id, source and pages). Does not commit."""
+    if not rows:
+        return
+    stmt = insert(ChunkRef).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ChunkRef.point_id, ChunkRef.source],
+        set_={
+            "file_hash": stmt.excluded.file_hash,
+            "page_number": stmt.excluded.page_number,
+            "page_start": stmt.excluded.page_start,
+            "page_end": stmt.excluded.page_end,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def get_chunk_refs(
+    db: AsyncSession, point_ids: Iterable[str]
+) -> Dict[str, List[ChunkRef]]:
+    """References of each point, ordered by source."""
+    ids = list(point_ids)
+    if not ids:
+        return {}
+    res = await db.execute(
+        select(ChunkRef)
+        .where(ChunkRef.point_id.in_(ids))
+        .order_by(ChunkRef.point_id, ChunkRef.source)
+    )
+    refs: Dict[str, List[ChunkRef]] = defaultdict(list)
+    for ref in res.scalars().all():
+        refs[ref.point_id].append(ref)
+    return refs
+
+
+async def get_refs_of_source(
+    db: AsyncSession, source: str, point_ids: Optional[Iterable[str]] = None
+) -> List[ChunkRef]:
+    """References of `source`, optionally only those to `point_ids`."""
+    stmt = select(ChunkRef).where(ChunkRef.source == source)
+    if point_ids is not None:
+        stmt = stmt.where(ChunkRef.point_id.in_(list(point_ids)))
+    res = await db.execute(stmt.order_by(ChunkRef.point_id))
+    return list(res.scalars().all())
+
+
+async def delete_chunk_refs(
+    db: AsyncSession, source: str, point_ids: Optional[Iterable[str]] = None
+) -> int:
+    """Delete the references of `source`, optionally only those to `point_ids`. Does not commit."""
+    stmt = delete(ChunkRef).where(ChunkRef.source == source)
+    if point_ids is not None:
+        stmt = stmt.where(ChunkRef.point_id.in_(list(point_ids)))
+    res = await db.execute(stmt)
+    return res.rowcount
+
+
+async def delete_chunk_texts(db: AsyncSession, point_ids: Iterable[str]) -> int:
+    ids = list(point_ids)
+    if not ids:
+        return 0
+    res = await db.execute(delete(ChunkText).where(ChunkText.point_id.in_(ids)))
+    await db.commit()
+    return res.rowcount
+
@@ -0,0 +1,47 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text, func
+
+from src.schema.db import Base
+
+# Embedding status of a document
+DOC_PENDING = "pending"  # uploaded, not indexed yet
+DOC_INDEXING = "indexing"  # ingestion started; may have stopped part-way
+DOC_INDEXED = "indexed"
+DOC_FAILED = "failed"
+
+# Summary status of a document
+SUMMARY_PENDING = "pending"
+SUMMARY_DONE = "done"
+SUMMARY_FAILED = "failed"
+
+
+class IngestedDocument(Base):
+    """Manifest row per uploaded PDF: what is indexed, with which model, and when."""
+
+    __tablename__ = "ingested_documents"
+    file_name = Column(String, primary_key=True)
+    file_hash = Column(String, nullable=True)
+    page_count = Column(Integer, nullable=True)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    embedding_model = Column(String, nullable=True)
+    # cfg.INDEX_VERSION the points were written with
+    index_version = Column(Integer, nullable=True)
+    embedding_status = Column(String, nullable=False, default=DOC_PENDING)
+    summary_status = Column(String, nullable=False, default=SUMMARY_PENDING)
+    error = Column(Text, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+    indexed_at = Column(DateTime(timezone=True), nullable=True)
+    summarized_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_ingested_documents_file_hash", "file_hash"),
+        # max(updated_at) tells the PDF list cache that something changed
+        Index("ix_ingested_documents_updated_at", "updated_at"),
+    )
@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.logger import logger
+from src.schema.ingested_documents import IngestedDocument
+
+
+async def upsert_document(
+    db: AsyncSession, file_name: str, **values: Any
+) -> Optional[IngestedDocument]:
+    """
+    Insert or update the manifest row of `file_name` in one statement,
+    setting only the given columns; columns not passed keep their values.
+    """
+    stmt = insert(IngestedDocument).values(file_name=file_name, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IngestedDocument.file_name],
+        set_={**values, "updated_at": func.now()},
+    ).returning(IngestedDocument)
+    res = await db.execute(
+        stmt, execution_options={"populate_existing": True}
+    )
+    document = res.scalars().first()
+    await db.commit()
+    return document
+
+
+async def get_document(db: AsyncSession, file_name: str) -> Optional[IngestedDocument]:
+    stmt = (
+        select(IngestedDocument)
+        .where(IngestedDocument.file_name == file_name)
+        .execution_options(populate_existing=True)
+    )
+    res = await db.execute(stmt)
+    return res.scalars().first()
+
+
+async def get_documents(
+    db: AsyncSession, file_names: Optional[Iterable[str]] = None
+) -> Dict[str, IngestedDocument]:
+    """Manifest rows by file name: all of them, or those of `file_names`."""
+    stmt = select(IngestedDocument).execution_options(populate_existing=True)
+    if file_names is not None:
+        stmt = stmt.where(IngestedDocument.file_name.in_(list(file_names)))
+    res = await db.execute(stmt)
+    return {document.file_name: document for document in res.scalars().all()}
+
+
+async def count_documents_with_hash(db: AsyncSession, file_hash: str) -> int:
+    res = await db.execute(
+        select(func.count())
+        .select_from(IngestedDocument)
+        .where(IngestedDocument.file_hash == file_hash)
+    )
+    return res.scalar_one()
+
+
+async def get_manifest_version(db: AsyncSession) -> Tuple[int, Optional[datetime]]:
+    """Row count and latest update time; changes whenever the manifest does."""
+    res = await db.execute(
+        select(func.count(), func.max(IngestedDocument.updated_at)).select_from(
+            IngestedDocument
+        )
+    )
+    count, updated_at = res.one()
+    return count, updated_at
+
+
+async def delete_document(db: AsyncSession, file_name: str) -> bool:
+    res = await db.execute(
+        delete(IngestedDocument).where(IngestedDocument.file_name == file_name)
+    )
+    await db.commit()
+    if res.rowcount:
+        logger.info(f"Deleted manifest entry for {file_name}")
+    return bool(res.rowcount)
+
+
+async def delete_documents_except(db: AsyncSession, file_names: List[str]) -> List[str]:
+    """Delete the manifest rows of files not in `file_names`; returns their names."""
+    res = await db.execute(
+        delete(IngestedDocument)
+        .where(IngestedDocument.file_name.not_in(file_names))
+        .returning(IngestedDocument.file_name)
+    )
+    deleted = [row[0] for row in res.all()]
+    await db.commit()
+    return deleted
@@ -0,0 +1,74 @@
+from sqlalchemy import (BigInteger, Column, DateTime, ForeignKey, Index,
+                        Integer, String, Text, func, text)
+
+from src.schema.db import Base
+
+# Job statuses; a file has at most one queued or running job at a time.
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+ACTIVE_JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+ACTIVE_JOB_PREDICATE = "status IN ('queued', 'running')"
+
+# Job kinds: full processing of an uploaded file, or incremental re-index of
+# a file from a replacement staged at `staged_path`.
+JOB_KIND_PROCESS = "process"
+JOB_KIND_REINDEX = "reindex"
+
+# Postgres NOTIFY channel signalled whenever a job becomes claimable, so
+# idle workers wake up at once instead of on their next poll.
+JOB_NOTIFY_CHANNEL = "ingestion_jobs"
+
+
+class IngestionJob(Base):
+    """A PDF ingestion request, claimed and run by a worker process."""
+
+    __tablename__ = "ingestion_jobs"
+    id = Column(BigInteger, primary_key=True)
+    file_name = Column(String, nullable=False)
+    kind = Column(String, nullable=False, default=JOB_KIND_PROCESS)
+    staged_path = Column(String, nullable=True)
+    status = Column(String, nullable=False, default=JOB_QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    # Latest status message, and the error of the last failed attempt
+    progress = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    # Queued jobs are not claimed before this time (retry backoff)
+    available_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_ingestion_jobs_status_available_at", "status", "available_at", "id"),
+        Index(
+            "ux_ingestion_jobs_active_file_name",
+            "file_name",
+            unique=True,
+            postgresql_where=text(ACTIVE_JOB_PREDICATE),
+        ),
+    )
+
+
+class IngestionJobEvent(Base):
+    """Append-only status messages of a job, streamed to clients by the API."""
+
+    __tablename__ = "ingestion_job_events"
+    id = Column(BigInteger, primary_key=True)
+    job_id = Column(
+        BigInteger, ForeignKey("ingestion_jobs.id", ondelete="CASCADE"), nullable=False
+    )
+    message = Column(Text, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    __table_args__ = (Index("ix_ingestion_job_events_job_id_id", "job_id", "id"),)
@@ -0,0 +1,238 @@
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import case, func, insert, select, text, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.schema.ingestion_jobs import (ACTIVE_JOB_PREDICATE,
+                                       ACTIVE_JOB_STATUSES, JOB_FAILED,
+                                       JOB_KIND_PROCESS, JOB_NOTIFY_CHANNEL,
+                                       JOB_QUEUED,
+                                       JOB_RUNNING, JOB_SUCCEEDED,
+                                       IngestionJob, IngestionJobEvent)
+
+
+async def enqueue_job(
+    db: AsyncSession,
+    file_name: str,
+    max_attempts: int,
+    kind: str = JOB_KIND_PROCESS,
+    staged_path: Optional[str] = None,
+) -> Tuple[IngestionJob, bool]:
+    """
+    Queue a job for `file_name` unless one is already queued or running.
+    Returns the file's active job and whether it was created by this call.
+    """
+    stmt = (
+        pg_insert(IngestionJob)
+        .values(
+            file_name=file_name,
+            kind=kind,
+            staged_path=staged_path,
+            status=JOB_QUEUED,
+            attempts=0,
+            max_attempts=max_attempts,
+            progress="Queued for processing...",
+        )
+        .on_conflict_do_nothing(
+            index_elements=[IngestionJob.file_name],
+            # Must match the partial unique index's predicate literally.
+            index_where=text(ACTIVE_JOB_PREDICATE),
+        )
+        .returning(IngestionJob.id)
+    )
+    res = await db.execute(stmt)
+    job_id = res.scalar()
+    if job_id is not None:
+        await _notify_workers(db, job_id)
+    await db.commit()
+    if job_id is not None:
+        return await get_job(db, job_id), True
+    return await get_active_job(db, file_name), False
+
+
+async def _notify_workers(db: AsyncSession, job_id: int) -> None:
+    """Wake listening workers; delivered when the transaction commits."""
+    await db.execute(select(func.pg_notify(JOB_NOTIFY_CHANNEL, str(job_id))))
+
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[IngestionJob]:
+    res = await db.execute(
+        select(IngestionJob)
+        .where(IngestionJob.id == job_id)
+        .execution_options(populate_existing=True)
+    )
+    return res.scalars().first()
+
+
+async def get_active_job(db: AsyncSession, file_name: str) -> Optional[IngestionJob]:
+    res = await db.execute(
+        select(IngestionJob).where(
+            IngestionJob.file_name == file_name,
+            IngestionJob.status.in_(ACTIVE_JOB_STATUSES),
+        )
+    )
+    return res.scalars().first()
+
+
+async def claim_job(db: AsyncSession, worker_id: str) -> Optional[IngestionJob]:
+    """
+    Atomically claim the oldest runnable job. Rows locked by other workers'
+    claims are skipped, so any number of workers can poll concurrently.
+    """
+    candidate = (
+        select(IngestionJob.id)
+        .where(
+            IngestionJob.status == JOB_QUEUED,
+            IngestionJob.available_at <= func.now(),
+        )
+        .order_by(IngestionJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(IngestionJob)
+        .where(IngestionJob.id == candidate)
+        .values(
+            status=JOB_RUNNING,
+            worker_id=worker_id,
+            attempts=IngestionJob.attempts + 1,
+            heartbeat_at=func.now(),
+            started_at=func.now(),
+            error=None,
+        )
+        .returning(IngestionJob)
+        .execution_options(synchronize_session=False)
+    )
+    res = await db.execute(stmt)
+    job = res.scalars().first()
+    await db.commit()
+    return job
+
+
+async def heartbeat_job(db: AsyncSession, job_id: int, worker_id: str) -> bool:
+    """Refresh a running job's heartbeat; False if the worker no longer owns it."""
+    res = await db.execute(
+        update(IngestionJob)
+        .where(
+            IngestionJob.id == job_id,
+            IngestionJob.worker_id == worker_id,
+            IngestionJob.status == JOB_RUNNING,
+        )
+        .values(heartbeat_at=func.now())
+    )
+    await db.commit()
+    return res.rowcount > 0
+
+
+async def add_job_event(db: AsyncSession, job_id: int, message: str) -> int:
+    """Append a status message to a job and make it the job's progress."""
+    res = await db.execute(
+        insert(IngestionJobEvent)
+        .values(job_id=job_id, message=message)
+        .returning(IngestionJobEvent.id)
+    )
+    event_id = res.scalar_one()
+    await db.execute(
+        update(IngestionJob).where(IngestionJob.id == job_id).values(progress=message)
+    )
+    await db.commit()
+    return event_id
+
+
+async def get_job_events(
+    db: AsyncSession, job_id: int, after_id: int = 0, limit: int = 500
+) -> List[IngestionJobEvent]:
+    res = await db.execute(
+        select(IngestionJobEvent)
+        .where(IngestionJobEvent.job_id == job_id, IngestionJobEvent.id > after_id)
+        .order_by(IngestionJobEvent.id)
+        .limit(limit)
+    )
+    return list(res.scalars().all())
+
+
+async def complete_job(db: AsyncSession, job_id: int, worker_id: str) -> None:
+    await db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == job_id, IngestionJob.worker_id == worker_id)
+        .values(status=JOB_SUCCEEDED, finished_at=func.now(), error=None)
+    )
+    await db.commit()
+
+
+async def fail_job(
+    db: AsyncSession,
+    job_id: int,
+    worker_id: str,
+    error: str,
+    retry_delay_seconds: float,
+    retry: bool = True,
+) -> Optional[str]:
+    """
+    Record a failed attempt. The job is requeued after `retry_delay_seconds`
+    while it has attempts left (and `retry` is set), and marked failed
+    otherwise. Returns the job's new status.
+    """
+    exhausted = IngestionJob.attempts >= IngestionJob.max_attempts if retry else true()
+    res = await db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == job_id, IngestionJob.worker_id == worker_id)
+        .values(
+            status=case((exhausted, JOB_FAILED), else_=JOB_QUEUED),
+            finished_at=case((exhausted, func.now()), else_=None),
+            available_at=func.now() + timedelta(seconds=retry_delay_seconds),
+            worker_id=None,
+            error=error,
+        )
+        .returning(IngestionJob.status)
+    )
+    status = res.scalar()
+    await db.commit()
+    return status
+
+
+async def release_job(db: AsyncSession, job_id: int, worker_id: str) -> None:
+    """Hand a job back to the queue without counting the attempt (worker shutdown)."""
+    await db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == job_id, IngestionJob.worker_id == worker_id)
+        .values(
+            status=JOB_QUEUED,
+            attempts=IngestionJob.attempts - 1,
+            worker_id=None,
+            available_at=func.now(),
+        )
+    )
+    await _notify_workers(db, job_id)
+    await db.commit()
+
+
+async def requeue_stale_jobs(
+    db: AsyncSession, stale_after_seconds: float
+) -> List[Tuple[int, str, str]]:
+    """
+    Requeue running jobs whose worker stopped heartbeating, or fail them if
+    they have no attempts left. Returns (id, file_name, new status) per job.
+    """
+    exhausted = IngestionJob.attempts >= IngestionJob.max_attempts
+    res = await db.execute(
+        update(IngestionJob)
+        .where(
+            IngestionJob.status == JOB_RUNNING,
+            IngestionJob.heartbeat_at < func.now() - timedelta(seconds=stale_after_seconds),
+        )
+        .values(
+            status=case((exhausted, JOB_FAILED), else_=JOB_QUEUED),
+            finished_at=case((exhausted, func.now()), else_=None),
+            available_at=func.now(),
+            worker_id=None,
+            error="Worker stopped responding.",
+        )
+        .returning(IngestionJob.id, IngestionJob.file_name, IngestionJob.status)
+    )
+    rows = [(row.id, row.file_name, row.status) for row in res]
+    await db.commit()
+    return rows
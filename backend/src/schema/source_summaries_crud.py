@@ -53,3 +53,8 @@ async def get_all_source_summaries(db: AsyncSession) -> List[SourceSummary]:
     stmt = select(SourceSummary)
     res = await db.execute(stmt)
     return list(res.scalars().all())
+
+
+async def get_summarized_source_names(db: AsyncSession) -> List[str]:
+    res = await db.execute(select(SourceSummary.source_name))
+    return [row[0] for row in res.all()]
@@ -0,0 +1,290 @@
+"""
+Ingestion worker: claims jobs from the ingestion_jobs table and runs them.
+
+Run one or more instances with `python -m src.worker`, on any node that can
+reach Postgres, Qdrant and the shared data directory. Workers coordinate only
+through the table (SELECT ... FOR UPDATE SKIP LOCKED), so they can be added
+or removed at any time; a job whose worker dies is requeued once its
+heartbeat goes stale. Idle workers LISTEN for new jobs and only fall back to
+polling when notifications are unavailable.
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from typing import Dict, List, Optional, Set
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from src.config import cfg
+from src.logger import logger
+from src.pdf_extractor import shutdown_extraction_pool
+from src.rag import PDFProcessor
+from src.schema.db import DATABASE_URL, AsyncSessionLocal
+from src.schema.ingestion_jobs import (JOB_KIND_REINDEX, JOB_NOTIFY_CHANNEL,
+                                       IngestionJob)
+from src.schema.ingestion_jobs_crud import (add_job_event, claim_job,
+                                            complete_job, fail_job,
+                                            heartbeat_job, release_job,
+                                            requeue_stale_jobs)
+
+
+class IngestionWorker:
+    def __init__(
+        self, concurrency: int = cfg.WORKER_CONCURRENCY, worker_id: Optional[str] = None
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.worker_id = (
+            worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Jobs reclaimed by another worker; they are cancelled without touching the row.
+        self._lost: Set[int] = set()
+        self._stopping = asyncio.Event()
+        # Set by job notifications; cleared before every claim attempt.
+        self._wakeup = asyncio.Event()
+
+    def stop(self) -> None:
+        logger.info(f"Worker {self.worker_id} stopping")
+        self._stopping.set()
+
+    async def run(self) -> None:
+        logger.info(
+            f"Worker {self.worker_id} started (concurrency={self.concurrency})"
+        )
+        reaper = asyncio.create_task(self._reap_stale_jobs())
+        listener = asyncio.create_task(self._listen())
+        try:
+            while not self._stopping.is_set():
+                if len(self._tasks) >= self.concurrency:
+                    await self._wait_for_slot()
+                    continue
+                self._wakeup.clear()
+                job = await self._claim()
+                if job is None:
+                    await self._sleep(cfg.WORKER_POLL_INTERVAL_SECONDS)
+                    continue
+                logger.info(
+                    f"Worker {self.worker_id} claimed job {job.id} ({job.kind} {job.file_name}, "
+                    f"attempt {job.attempts}/{job.max_attempts})"
+                )
+                task = asyncio.create_task(self._run_job(job))
+                self._tasks[job.id] = task
+                task.add_done_callback(lambda _, job_id=job.id: self._tasks.pop(job_id, None))
+        finally:
+            reaper.cancel()
+            listener.cancel()
+            await self._shutdown()
+
+    async def _sleep(self, seconds: float) -> None:
+        """Wait until a job is announced, the worker stops, or `seconds` pass."""
+        waiters = [
+            asyncio.create_task(self._stopping.wait()),
+            asyncio.create_task(self._wakeup.wait()),
+        ]
+        try:
+            await asyncio.wait(waiters, timeout=seconds, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def _listen(self) -> None:
+        """Keep a LISTEN connection open, reconnecting when it drops."""
+        dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                await conn.add_listener(
+                    JOB_NOTIFY_CHANNEL, lambda *_: self._wakeup.set()
+                )
+                logger.info(f"Worker {self.worker_id} listening for new jobs")
+                while not conn.is_closed():
+                    await asyncio.sleep(cfg.WORKER_HEARTBEAT_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job notifications unavailable, polling instead: {e}")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(cfg.WORKER_HEARTBEAT_SECONDS)
+
+    async def _wait_for_slot(self) -> None:
+        stop = asyncio.create_task(self._stopping.wait())
+        try:
+            await asyncio.wait(
+                [stop, *self._tasks.values()], return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            stop.cancel()
+
+    async def _claim(self) -> Optional[IngestionJob]:
+        try:
+            async with AsyncSessionLocal() as db:
+                return await claim_job(db, self.worker_id)
+        except Exception as e:
+            logger.error(f"Worker {self.worker_id} failed to claim a job: {e}")
+            return None
+
+    async def _reap_stale_jobs(self) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    reaped = await requeue_stale_jobs(db, cfg.WORKER_STALE_AFTER_SECONDS)
+                for job_id, file_name, status in reaped:
+                    logger.warning(
+                        f"Job {job_id} ({file_name}) lost its worker; now {status}"
+                    )
+            except Exception as e:
+                logger.error(f"Failed to requeue stale jobs: {e}")
+            await asyncio.sleep(cfg.WORKER_HEARTBEAT_SECONDS)
+
+    async def _heartbeat(self, job_id: int, task: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(cfg.WORKER_HEARTBEAT_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db:
+                    owned = await heartbeat_job(db, job_id, self.worker_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+                continue
+            if not owned:
+                logger.warning(
+                    f"Job {job_id} is no longer owned by worker {self.worker_id}; cancelling"
+                )
+                self._lost.add(job_id)
+                task.cancel()
+                return
+
+    async def _run_job(self, job: IngestionJob) -> None:
+        heartbeat = asyncio.create_task(
+            self._heartbeat(job.id, asyncio.current_task())
+        )
+        try:
+            async with AsyncSessionLocal() as events_db:
+                error, retry = await self._process(job, events_db)
+                heartbeat.cancel()
+                if error is None:
+                    await complete_job(events_db, job.id, self.worker_id)
+                    logger.info(f"Job {job.id} ({job.file_name}) succeeded")
+                    return
+                # Record the outcome before the status, so a client that sees
+                # the job finished has already been sent all of its events.
+                final = not retry or job.attempts >= job.max_attempts
+                if final:
+                    logger.error(f"Job {job.id} ({job.file_name}) failed: {error}")
+                    await add_job_event(events_db, job.id, f"Error: {error}")
+                else:
+                    logger.warning(
+                        f"Job {job.id} ({job.file_name}) attempt {job.attempts} failed, "
+                        f"will retry: {error}"
+                    )
+                    await add_job_event(
+                        events_db,
+                        job.id,
+                        f"Attempt {job.attempts} of {job.max_attempts} failed ({error}). "
+                        f"Retrying in {int(cfg.INGEST_JOB_RETRY_DELAY_SECONDS)}s...",
+                    )
+                await fail_job(
+                    events_db,
+                    job.id,
+                    self.worker_id,
+                    error,
+                    cfg.INGEST_JOB_RETRY_DELAY_SECONDS,
+                    retry=retry,
+                )
+        except asyncio.CancelledError:
+            if job.id in self._lost:
+                self._lost.discard(job.id)
+            else:
+                await self._release(job)
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.file_name}) crashed: {e}", exc_info=True)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await fail_job(
+                        db, job.id, self.worker_id, str(e), cfg.INGEST_JOB_RETRY_DELAY_SECONDS
+                    )
+            except Exception as fail_error:
+                logger.error(f"Failed to record failure of job {job.id}: {fail_error}")
+        finally:
+            heartbeat.cancel()
+
+    async def _process(self, job: IngestionJob, events_db) -> tuple[Optional[str], bool]:
+        """
+        Run the job, recording its status messages. Returns the error (None
+        on success) and whether a failed attempt is worth retrying.
+        """
+        file_path = os.path.join(cfg.DATA_DIR, job.file_name)
+        if job.kind == JOB_KIND_REINDEX:
+            if not job.staged_path or not os.path.exists(job.staged_path):
+                return "Replacement upload is no longer available.", False
+        elif not os.path.exists(file_path):
+            return "File not found.", False
+
+        processor = PDFProcessor()
+        async with AsyncSessionLocal() as db:
+            if job.kind == JOB_KIND_REINDEX:
+                updates = processor.reindex_pdf(job.file_name, job.staged_path, db=db)
+            else:
+                updates = processor.process_pdf(job.file_name, db=db)
+            # Errors are held back until the outcome is known: clients stop
+            # listening at the first "Error:" message, which must not happen
+            # for an attempt that is going to be retried.
+            errors: List[str] = []
+            finished = False
+            async for update in updates:
+                if update == "done":
+                    finished = True
+                elif update.startswith("Error:"):
+                    errors.append(update)
+                else:
+                    await add_job_event(events_db, job.id, update)
+
+        if finished:
+            # Non-fatal errors (e.g. the summary) do not fail the job.
+            for error in errors:
+                await add_job_event(events_db, job.id, error)
+            return None, True
+        if errors:
+            return errors[0][len("Error:"):].strip(), True
+        return "Processing stopped before completion.", True
+
+    async def _release(self, job: IngestionJob) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await release_job(db, job.id, self.worker_id)
+            logger.info(f"Released job {job.id} ({job.file_name}) back to the queue")
+        except Exception as e:
+            # Its heartbeat will go stale and another worker will pick it up.
+            logger.error(f"Failed to release job {job.id}: {e}")
+
+    async def _shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+
+async def run_worker() -> None:
+    worker = IngestionWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        shutdown_extraction_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
@@ -2,6 +2,7 @@
 import React, { useState } from "react";
 import MarkdownRenderer from "../common/Markdown";
 import { FiFile, FiFileText } from "react-icons/fi";
+import { withBase } from "@/lib/url";
 
 interface SourceChunk {
   text: string;
@@ -78,7 +79,20 @@ const AIMessage: React.FC<AIMessageProps> = ({ content, sourceChunks }) => {
                     {chunk.page_number !== null && chunk.page_number !== undefined && (
                       <div className="flex items-center gap-2 mb-3 text-sm text-text-muted">
                         <FiFileText className="w-4 h-4" />
-                        <span>Page: {chunk.page_number}</span>
+                        {chunk.source ? (
+                          <a
+                            href={withBase(
+                              `/api/pdf/page/${encodeURIComponent(chunk.source)}/${chunk.page_number}`,
+                            )}
+                            target="_blank"
+                            rel="noopener noreferrer"
+                            className="underline hover:text-text"
+                          >
+                            Page: {chunk.page_number}
+                          </a>
+                        ) : (
+                          <span>Page: {chunk.page_number}</span>
+                        )}
                       </div>
                     )}
 
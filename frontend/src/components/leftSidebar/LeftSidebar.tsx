@@ -42,19 +42,29 @@ const LeftSidebar: React.FC<SidebarProps> = ({
   useEffect(() => {
     const fetchPdfs = async () => {
       try {
-        const response = await fetch(withBase("/api/pdf/list"));
-        if (response.ok) {
-          const data = await response.json();
-          const names = data.pdfs.map((filename: string) => ({
-            name: filename,
-          }));
-          setSources(names);
-          if (!initializedRef.current) {
-            setCheckedPdfs(names.map((n: SidebarItem) => n.name));
-            initializedRef.current = true;
+        // The list is paginated; follow next_cursor until all pages are read.
+        const filenames: string[] = [];
+        let cursor: string | null = null;
+        do {
+          const query: string = cursor
+            ? `?after=${encodeURIComponent(cursor)}`
+            : "";
+          const response = await fetch(withBase(`/api/pdf/list${query}`));
+          if (!response.ok) {
+            console.error("Failed to fetch PDFs");
+            return;
           }
-        } else {
-          console.error("Failed to fetch PDFs");
+          const data = await response.json();
+          filenames.push(...data.pdfs);
+          cursor = data.next_cursor ?? null;
+        } while (cursor);
+        const names = filenames.map((filename: string) => ({
+          name: filename,
+        }));
+        setSources(names);
+        if (!initializedRef.current) {
+          setCheckedPdfs(names.map((n: SidebarItem) => n.name));
+          initializedRef.current = true;
         }
       } catch (error) {
         console.error("Error fetching PDFs:", error);